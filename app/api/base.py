@@ -1,10 +1,10 @@
-import time
 from abc import ABC, abstractmethod
 from decimal import Decimal
 from typing import Optional
 
 import requests
 
+from app.common.clock import get_clock
 from app.config.config import Config
 from app.models.balance import Balance
 from app.models.enums import MarketOrderType, OrderType
@@ -38,7 +38,7 @@ def retry_request(func, retries=3, backoff_factor=1, *args, **kwargs):
             print(
                 f"Intento {attempt}/{retries} fallido. Error: {e}. Reintentando en {backoff_factor ** attempt} segundos..."
             )
-            time.sleep(backoff_factor**attempt)  # Exponencial
+            get_clock().sleep(backoff_factor**attempt)  # Exponencial
 
 
 def with_retries(retries=3, backoff_factor=1):
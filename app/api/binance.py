@@ -1,16 +1,19 @@
-import datetime
 from decimal import Decimal
 from typing import Optional
 
 from app.api.base import BaseApi
 from app.api.client.binance import BinanceClient
+from app.common.clock import get_clock
 from app.models.balance import Balance
 from app.models.enums import MarketOrderType, OrderType
 from app.models.filled import Fill
 from app.models.order import Order
 from app.models.price import Price
 
-NullPrice = Price(date=datetime.datetime.now(datetime.timezone.utc), price=0)
+
+def null_price() -> Price:
+    # read the clock at every call, a module level price would keep the date of the import
+    return Price(date=get_clock().now(), price=0)
 
 
 class BinanceApi(BaseApi):
@@ -22,7 +25,7 @@ class BinanceApi(BaseApi):
         return None
 
     def fetch_price(self) -> Price:
-        return NullPrice
+        return null_price()
 
     def fetch_currency_price(self, currency) -> Decimal:
         return Decimal(0)
@@ -2,11 +2,11 @@ import collections
 import hashlib
 import hmac
 import json
-import time
 
 import requests
 
 from app.api.client.errors import raiseError
+from app.common.clock import get_clock
 
 
 class CoinexApiError(Exception):
@@ -22,10 +22,12 @@ class CoinexClient:
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/60.0.3112.90 Safari/537.36",
     }
 
-    def __init__(self, access_id=None, secret=None):
+    def __init__(self, access_id=None, secret=None, transport=None):
         self._access_id = access_id
         self._secret = secret
         self._log = None
+        # callable(method, path, params) -> response dict, replaces the HTTP request (in-process backtests)
+        self.transport = transport
 
     @property
     def base_url(self):
@@ -49,10 +51,22 @@ class CoinexClient:
         return {bal.get("ccy"): bal for bal in _balances}
 
     def order_pending(self, market, page=1, limit=100, **params):
-        data, more_pages = self._v2(
-            "spot/pending-order", method="get", auth=True, market=market, market_type="SPOT", limit=100, **params
-        )
-        return data
+        more_pages = True
+        all_data = []
+        while more_pages:
+            data, more_pages = self._v2(
+                "spot/pending-order",
+                method="get",
+                auth=True,
+                market=market,
+                market_type="SPOT",
+                page=page,
+                limit=limit,
+                **params,
+            )
+            page += 1
+            all_data += data
+        return all_data
 
     def order_limit(self, market, side, amount, price, **params):
         data, _ = self._v2(
@@ -83,7 +97,7 @@ class CoinexClient:
         )
         return data
 
-    def order_user_deals(self, market, page=1, limit=100, start_time=None, **params):
+    def order_user_deals(self, market, page=1, limit=1000, start_time=None, **params):
         more_pages = True
         all_data = []
         while more_pages:
@@ -94,7 +108,8 @@ class CoinexClient:
                 market=market,
                 market_type="SPOT",
                 start_time=start_time,
-                limit=1000,
+                page=page,
+                limit=limit,
                 **params,
             )
             page += 1
@@ -145,8 +160,9 @@ class CoinexClient:
 
     def _process_response(self, resp, path, params):
         resp.raise_for_status()
+        return self._process_data(resp.json(), path, params)
 
-        data = resp.json()
+    def _process_data(self, data, path, params):
         if data["code"] != 0:
             raiseError(data, data, path, params)
 
@@ -194,9 +210,12 @@ class CoinexClient:
         if params.get("timeout"):
             del params["timeout"]
 
+        if self.transport is not None:
+            return self._process_data(self.transport(method, path, params), path, params)
+
         headers = self._headers
         if auth:
-            timestamp = int(time.time() * 1000)
+            timestamp = int(get_clock().time() * 1000)
             if method == "post":
                 signed = self._sign_v2(method=method.upper(), url=path, timestamp=timestamp, body=params)
             else:
@@ -4,11 +4,15 @@ from typing import Optional
 
 from app.api.base import BaseApi
 from app.api.client.coinex import CoinexClient
+from app.common.clock import get_clock
 from app.config.config import Config
+from app.config.market import MarketSpec
 from app.models.balance import Balance
 from app.models.enums import MarketOrderType, OrderType
 from app.models.filled import DbFill, Fill
-from app.models.order import Executed, Order, OrderTypeError
+from app.models.ledger import BalanceLedger
+from app.models.order import Order, OrderTypeError, get_executed_cache
+from app.models.order_book import OpenOrderBook
 from app.models.price import Price
 
 
@@ -19,17 +23,23 @@ class FetchBalanceException(RuntimeError):
 
 
 class CoinexApi(BaseApi):
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, transport=None):
         super().__init__(config)
-        self.client = CoinexClient(config)
+        self.client = CoinexClient(config, transport=transport)
         self.previous_price: Decimal | None = None
         self.config = config
         self.last_fill = DbFill.get(self.bot_name, self.bot_name)
+        self.ledger = BalanceLedger(config, self.fetch_balances)
+        self.open_orders = OpenOrderBook()
 
     @property
     def bot_name(self):
         return self.config.label
 
+    @property
+    def spec(self) -> MarketSpec:
+        return self.config.spec
+
     def get_client(self):
         return CoinexClient(self.config.client.key, self.config.client.secret)
 
@@ -38,19 +48,22 @@ class CoinexApi(BaseApi):
         while price == self.previous_price:
             deals = self._execute(self.client.market_deals, self.config.market, limit=1, rate=Decimal(1))
             if deals:
-                price = self.config.rnd_price(Decimal(deals[0].get("price")))
+                price = self.spec.round_price(Decimal(deals[0].get("price")))
         self.previous_price = price
-        new_price = Price(date=datetime.datetime.now(datetime.timezone.utc), price=price)
+        new_price = Price(date=get_clock().now(), price=price)
         return new_price
 
     def fetch_currency_price(self, currency) -> Decimal:
         deals = self._execute(self.client.market_deals, f"{currency}USDT", limit=1, rate=Decimal(1))
         if deals:
-            return self.config.rnd_price(Decimal(deals[0].get("price")))
+            return self.spec.round_price(Decimal(deals[0].get("price")))
         else:
             return Decimal("0")
 
     def get_balances(self) -> dict[str, Balance]:
+        return self.ledger.balances()
+
+    def fetch_balances(self) -> dict[str, Balance]:
         return_balances = {}
         balances = self._execute(self.client.balance_info)
         if balances is None:
@@ -67,6 +80,11 @@ class CoinexApi(BaseApi):
         return return_balances
 
     def order_pending(self, market: str, page: int = 1, limit: int = 100, **params):
+        if self.open_orders.due:
+            self.sync_open_orders()
+        return self.open_orders.orders()
+
+    def sync_open_orders(self) -> list[Order]:
         exchange_orders = self._execute(self.client.order_pending, self.config.market)
         if exchange_orders is None:
             return []
@@ -74,23 +92,34 @@ class CoinexApi(BaseApi):
         orders = []
         for order in exchange_orders:
             new_order = Order.create_from_coinex(self.config, order)
+            known = self.open_orders.get(new_order.order_id)
+            if known is not None:
+                # the book already has the order as we saved it
+                orders.append(known)
+                continue
             try:
                 found = Order.get(self.bot_name, new_order.order_id)
                 orders.append(found)
             except Order.NotFoundError:
                 Order.save(self.bot_name, new_order)
                 orders.append(new_order)
+        self.open_orders.replace(orders)
         return orders
 
+    def orders_near(self, side: OrderType, price: Decimal, count: int = 1) -> list[Order]:
+        if self.open_orders.due:
+            self.sync_open_orders()
+        return self.open_orders.nearest(side, price, count)
+
     def _create_order(
         self, market: str, amount: Decimal, buy_price: Decimal, side: OrderType, sell_price: Optional[Decimal] = None
     ) -> Order:
-        am = self.config.rnd_amount(amount, cls=float)
+        am = self.spec.round_amount(amount, cls=float)
         match side:
             case side.BUY:
-                pr = self.config.rnd_price(buy_price, cls=float)
+                pr = self.spec.round_price(buy_price)
             case side.SELL:
-                pr = self.config.rnd_price(sell_price, cls=float)
+                pr = self.spec.round_price(sell_price)
             case _:
                 raise OrderTypeError(side)
 
@@ -99,6 +128,8 @@ class CoinexApi(BaseApi):
         if side == OrderType.SELL:
             new_order.buy_price = Decimal(buy_price)
         Order.save(self.bot_name, new_order)
+        self.ledger.order_placed(new_order)
+        self.open_orders.add(new_order)
         return new_order
 
     def create_buy_order(self, market: str, amount: Decimal, price: Decimal) -> Order:
@@ -110,18 +141,19 @@ class CoinexApi(BaseApi):
         )
 
     def create_market_order(self, market: str, amount: Decimal, order_type: MarketOrderType) -> Order:
-        am = self.config.rnd_amount(amount, cls=float)
+        am = self.spec.round_amount(amount, cls=float)
         created = self._execute(self.client.order_market, market, order_type.side.value, am)
         new_order = Order.create_from_coinex(self.config, created)
-        executed = Executed.load_day(bot=self.bot_name, day=new_order.executed_day())
-        executed.add_executed_order(new_order, order_type)
-        executed.save()
+        get_executed_cache(self.bot_name).add_executed_order(new_order, order_type)
+        self.ledger.market_order(new_order)
         return new_order
 
     def cancel_order(self, market: str, order_id: str) -> Order:
         cancelled = self._execute(self.client.order_pending_cancel, market=market, id=order_id)
         if cancelled:
             Order.delete(self.bot_name, order_id)
+            self.ledger.order_cancelled(order_id)
+            self.open_orders.remove(order_id)
         else:
             raise Exception(f"Error cancelling order: {order_id}")
         return cancelled
@@ -135,8 +167,10 @@ class CoinexApi(BaseApi):
 
         start_time = int(date_from.timestamp())
         fills = self._execute(self.client.order_user_deals, self.config.market, start_time=start_time)
-        _fills = [Fill.from_coinex(fill) for fill in fills if fill.get("side") == side.value]
-        return _fills
+        all_fills = [Fill.from_coinex(fill) for fill in fills]
+        self.ledger.apply_fills(all_fills)
+        self.open_orders.apply_fills(all_fills)
+        return [fill for fill in all_fills if fill.side == side]
 
     def join_orders(self, market: str, price: Price, order1: Order, order2: Order) -> Order:
         self.cancel_order(market, order1.order_id)
@@ -146,10 +180,10 @@ class CoinexApi(BaseApi):
         order1.sell_price = order1.sell_price or price.price
         order2.sell_price = order2.sell_price or price.price
         new_amount = order1.amount + order2.amount
-        new_buy_price = self.config.rnd_price(
+        new_buy_price = self.spec.round_price(
             (order1.amount * order1.buy_price + order2.amount * order2.buy_price) / new_amount
         )
-        new_sell_price = self.config.rnd_price(
+        new_sell_price = self.spec.round_price(
             (order1.amount * order1.sell_price + order2.amount * order2.sell_price) / new_amount
         )
 
@@ -1,11 +1,43 @@
+import threading
+from typing import Optional
+
+from app.common.clock import get_clock
 from app.config.config import Config
+from app.config.watcher import ConfigDiff, ConfigWatcher
 
 
 class Bot:
-    def __init__(self, label: str, exchange: str):
+    def __init__(self, label: str, exchange: str, watcher: Optional[ConfigWatcher] = None):
         self.label = label
         self.exchange = exchange
         self.config = Config.load_config_from_db_config(label)
+        self._pending_config: Optional[Config] = None
+        self._config_lock = threading.Lock()
+        if watcher is not None:
+            watcher.register(label, self.on_config_change, config=self.config)
+
+    def on_config_change(self, config: Config, diff: ConfigDiff) -> None:
+        # called from the watcher thread, the config is swapped by the bot between two ticks
+        print(f"Bot {self.label}: config changed {list(diff.changed)}")
+        with self._config_lock:
+            self._pending_config = config
+
+    def apply_pending_config(self) -> bool:
+        with self._config_lock:
+            config, self._pending_config = self._pending_config, None
+        if config is None:
+            return False
+        self.config = config
+        return True
 
     def run(self):
         print(f"Bot {self.label}/{self.exchange}")
+
+    def loop(self, interval: float = 5, iterations: Optional[int] = None):
+        iteration = 0
+        while iterations is None or iteration < iterations:
+            # the config swapped in by the watcher is applied between two iterations
+            self.apply_pending_config()
+            self.run()
+            get_clock().sleep(interval)
+            iteration += 1
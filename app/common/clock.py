@@ -0,0 +1,114 @@
+"""
+The clock read by the bot, `get_clock()` instead of `datetime.now`, `time.time` or `time.sleep`.
+"""
+
+import datetime
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def _utc(date: datetime.datetime) -> datetime.datetime:
+    # naive dates (the tick files) are UTC
+    return date.replace(tzinfo=datetime.timezone.utc) if date.tzinfo is None else date
+
+
+class Clock(ABC):
+    @abstractmethod
+    def now(self) -> datetime.datetime:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def time(self) -> float:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def monotonic(self) -> float:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def sleep(self, seconds: float) -> None:
+        raise NotImplementedError()
+
+
+class SystemClock(Clock):
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class SimulatedClock(Clock):
+    """
+    Virtual time, it never goes backwards. `monotonic` is the virtual epoch time.
+    """
+
+    def __init__(self, start: datetime.datetime):
+        self._now = _utc(start)
+        self._lock = threading.Lock()
+        self.slept = 0.0
+
+    def now(self) -> datetime.datetime:
+        return self._now
+
+    def time(self) -> float:
+        return self._now.timestamp()
+
+    def monotonic(self) -> float:
+        return self._now.timestamp()
+
+    def sleep(self, seconds: float) -> None:
+        # moves the clock forward and returns at once
+        with self._lock:
+            self.slept += max(seconds, 0)
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        if seconds > 0:
+            with self._lock:
+                self._now += datetime.timedelta(seconds=seconds)
+
+    def advance_to(self, date: datetime.datetime) -> None:
+        date = _utc(date)
+        with self._lock:
+            if date > self._now:
+                self._now = date
+
+
+_clock: Clock = SystemClock()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock) -> Clock:
+    """
+    Install `clock` for the whole process, returns the previous one.
+    """
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+@contextmanager
+def use_clock(clock: Clock) -> Iterator[Clock]:
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
+
+
+def monotonic() -> float:
+    # default `clock` of the caches that take one, reads the installed clock at every call
+    return get_clock().monotonic()
@@ -0,0 +1,36 @@
+"""
+Fixed-point helpers, a value with `decimals` decimals is the integer `value * 10**decimals`.
+"""
+
+from decimal import ROUND_UP, Decimal
+
+
+def round_up_div(numerator: int, denominator: int) -> int:
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    if remainder:
+        quotient += 1
+    return quotient if (numerator < 0) == (denominator < 0) else -quotient
+
+
+def to_fixed(value, decimals: int, rounding: str = ROUND_UP) -> int:
+    # rounds up (away from zero) like `common.rnd` unless told otherwise
+    value = value if value.__class__ is Decimal else Decimal(str(value))
+    return int(value.scaleb(decimals).to_integral_value(rounding=rounding))
+
+
+def exact_fixed(value: Decimal) -> tuple[int, int]:
+    """
+    The value as `(integer, decimals)` with the fewest decimals holding it exactly, e.g. `(35005, 5)` for 0.350050.
+    """
+    decimals = max(-int(value.normalize().as_tuple().exponent), 0)
+    return to_fixed(value, decimals), decimals
+
+
+def from_fixed(value: int, decimals: int) -> Decimal:
+    return Decimal(value).scaleb(-decimals)
+
+
+def rescale(value: int, from_decimals: int, to_decimals: int) -> int:
+    if to_decimals >= from_decimals:
+        return value * 10 ** (to_decimals - from_decimals)
+    return round_up_div(value, 10 ** (from_decimals - to_decimals))
@@ -0,0 +1,213 @@
+"""
+Binary tick files: int64 epoch-microsecond timestamps and int64 prices scaled by `10**decimals`.
+"""
+
+import datetime
+import os
+import struct
+from decimal import Decimal
+from typing import Iterator, Optional
+
+import numpy as np
+
+from app.common.fixed import from_fixed
+
+MAGIC = b"SBTICK1\x00"
+# `MAGIC`, the price decimals and 4 reserved bytes, then the timestamps column and the prices column
+HEADER = struct.Struct("<8sii")
+EXTENSION = ".ticks"
+CHANGES_MAGIC = b"SBCHG1\x00\x00"
+# the positions where the price changes, next to the tick file: `CHANGES_MAGIC` and the number of ticks, then int64s
+CHANGES_HEADER = struct.Struct("<8sq")
+CHANGES_EXTENSION = ".changes"
+EPOCH = datetime.datetime(1970, 1, 1)
+CHUNK_SIZE = 1 << 20
+
+
+class TickFileError(RuntimeError):
+    pass
+
+
+def to_micros(date: datetime.datetime) -> int:
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (date - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=int(value))
+
+
+def scale_price(text: str, decimals: int) -> int:
+    integer, _, fraction = text.strip().partition(".")
+    fraction = fraction.rstrip("0")
+    if len(fraction) > decimals:
+        raise TickFileError(f"{text} has more than {decimals} decimals")
+    sign = -1 if integer.startswith("-") else 1
+    return int(integer or "0") * 10**decimals + sign * int((fraction or "0").ljust(decimals, "0"))
+
+
+def price_decimals(text: str) -> int:
+    return len(text.strip().partition(".")[2].rstrip("0"))
+
+
+def changes_path(path: str) -> str:
+    return os.path.splitext(path)[0] + CHANGES_EXTENSION
+
+
+def _changes(prices: np.ndarray, start: int, previous: Optional[int]) -> np.ndarray:
+    # change points of a chunk of prices starting at `start`, `previous` is the price before the chunk
+    changed = np.empty(len(prices), dtype=bool)
+    changed[0] = previous is None or prices[0] != previous
+    changed[1:] = prices[1:] != prices[:-1]
+    return (start + np.flatnonzero(changed)).astype("<i8")
+
+
+def change_points(prices: np.ndarray) -> np.ndarray:
+    """
+    Positions of the ticks with a price different from the previous tick, the first tick included.
+    """
+    if len(prices) == 0:
+        return np.empty(0, dtype="<i8")
+    return _changes(np.asarray(prices), 0, None)
+
+
+class TickFile:
+    def __init__(self, path: str):
+        self.path = path
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            magic, decimals, _ = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or (size - HEADER.size) % 16:
+            raise TickFileError(f"{path} is not a tick file")
+        self.decimals = decimals
+        count = (size - HEADER.size) // 16
+        self.timestamps: np.ndarray
+        self.prices: np.ndarray
+        if count:
+            self.timestamps = np.memmap(path, dtype="<i8", mode="r", offset=HEADER.size, shape=(count,))
+            self.prices = np.memmap(path, dtype="<i8", mode="r", offset=HEADER.size + 8 * count, shape=(count,))
+        else:
+            self.timestamps = self.prices = np.empty(0, dtype="<i8")
+        self._changes: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def price(self, index: int) -> Decimal:
+        return from_fixed(int(self.prices[index]), self.decimals)
+
+    def date(self, index: int) -> datetime.datetime:
+        return from_micros(int(self.timestamps[index]))
+
+    def search(self, date: datetime.datetime) -> int:
+        """
+        Index of the first tick at or after `date`.
+        """
+        return int(np.searchsorted(self.timestamps, to_micros(date), side="left"))
+
+    @property
+    def changes(self) -> np.ndarray:
+        """
+        Change points of the prices, from the `.changes` file when it's up to date.
+        """
+        if self._changes is None:
+            self._changes = self._load_changes()
+        return self._changes
+
+    def _load_changes(self) -> np.ndarray:
+        path = changes_path(self.path)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(self.path):
+            size = os.path.getsize(path) - CHANGES_HEADER.size
+            with open(path, "rb") as file:
+                magic, count = CHANGES_HEADER.unpack(file.read(CHANGES_HEADER.size))
+            if magic == CHANGES_MAGIC and count == len(self) and size % 8 == 0:
+                if size == 0:
+                    return np.empty(0, dtype="<i8")
+                return np.memmap(path, dtype="<i8", mode="r", offset=CHANGES_HEADER.size, shape=(size // 8,))
+        return change_points(self.prices)
+
+    def next_change(self, index: int) -> Optional[int]:
+        """
+        Position of the first change point after `index`, None if the price doesn't change again.
+        """
+        changes = self.changes
+        position = int(np.searchsorted(changes, index, side="right"))
+        return int(changes[position]) if position < len(changes) else None
+
+
+def write_tick_file(path: str, timestamps: np.ndarray, prices: np.ndarray, decimals: int) -> None:
+    if len(timestamps) != len(prices):
+        raise TickFileError("timestamps and prices must have the same length")
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, decimals, 0))
+        file.write(np.ascontiguousarray(timestamps, dtype="<i8").tobytes())
+        file.write(np.ascontiguousarray(prices, dtype="<i8").tobytes())
+    write_change_index(path)
+
+
+def write_change_index(path: str) -> str:
+    """
+    Write the `.changes` file of a tick file, returns its path. The prices are read in chunks.
+    """
+    ticks = TickFile(path)
+    output = changes_path(path)
+    with open(output, "wb") as file:
+        file.write(CHANGES_HEADER.pack(CHANGES_MAGIC, len(ticks)))
+        previous = None
+        for start in range(0, len(ticks), CHUNK_SIZE):
+            prices = np.asarray(ticks.prices[start : start + CHUNK_SIZE])
+            file.write(_changes(prices, start, previous).tobytes())
+            previous = prices[-1]
+    return output
+
+
+def _read_lines(path: str) -> Iterator[tuple[str, str]]:
+    with open(path, "r") as file:
+        for line in file:
+            date, _, price = line.partition(",")
+            if price:
+                yield date.strip(), price.strip()
+
+
+def convert_text_file(path: str, output: Optional[str] = None, decimals: Optional[int] = None) -> str:
+    """
+    Convert a `{timestamp},{price}` text file (naive UTC timestamps) to a tick file, returns its path.
+    """
+    output = output or os.path.splitext(path)[0] + EXTENSION
+    # read twice (count and decimals, then values), the ticks are never all held as Python objects
+    count, found_decimals = 0, 0
+    for _, price in _read_lines(path):
+        count += 1
+        found_decimals = max(found_decimals, price_decimals(price))
+    decimals = found_decimals if decimals is None else decimals
+
+    with open(output, "wb") as file:
+        file.write(HEADER.pack(MAGIC, decimals, 0))
+        file.truncate(HEADER.size + 16 * count)
+    if count == 0:
+        write_change_index(output)
+        return output
+    timestamps = np.memmap(output, dtype="<i8", mode="r+", offset=HEADER.size, shape=(count,))
+    prices = np.memmap(output, dtype="<i8", mode="r+", offset=HEADER.size + 8 * count, shape=(count,))
+
+    position = 0
+    dates, values = [], []
+    for date, price in _read_lines(path):
+        dates.append(date)
+        values.append(scale_price(price, decimals))
+        if len(dates) == CHUNK_SIZE:
+            position = _flush(timestamps, prices, position, dates, values)
+            dates, values = [], []
+    _flush(timestamps, prices, position, dates, values)
+    timestamps.flush()
+    prices.flush()
+    write_change_index(output)
+    return output
+
+
+def _flush(timestamps: np.ndarray, prices: np.ndarray, position: int, dates: list, values: list) -> int:
+    end = position + len(dates)
+    timestamps[position:end] = np.array(dates, dtype="datetime64[us]").astype("<i8")
+    prices[position:end] = values
+    return end
@@ -0,0 +1,21 @@
+"""
+Lazy `Key` and `Attr` of `boto3.dynamodb.conditions`, boto3 is imported when the first condition is built.
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from boto3.dynamodb.conditions import Attr as _Attr
+    from boto3.dynamodb.conditions import Key as _Key
+
+
+def Key(name: str) -> "_Key":
+    from boto3.dynamodb.conditions import Key as _Key
+
+    return _Key(name)
+
+
+def Attr(name: str) -> "_Attr":
+    from boto3.dynamodb.conditions import Attr as _Attr
+
+    return _Attr(name)
@@ -1,20 +1,26 @@
-import json
 import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from decimal import Decimal
-from typing import Any
+from typing import Any, Iterator
 
 import yaml
 from pydantic import BaseModel, PrivateAttr
 
-from app.common.common import rnd
-from app.config.dynamodb import get_dynamodb
+from app.common.clock import get_clock
+from app.config.conditions import Attr, Key
+from app.config.env import load_env
 from app.config.exchange_decimals import (
     ExchangeDecimals,
     MarketDecimals,
     MarketDecimalsUndefined,
 )
-from app.models.common import Record
+from app.config.market import MarketSpec, currency_exponent, quantize
+from app.config.storage import batch_get_items, get_storage
+from app.models.common import Index, IndexField, Record
 from app.models.price import Price
+from app.models.schema import get_schema_manager
 
 
 class ClientCredentials(BaseModel):
@@ -35,33 +41,32 @@ class Config(BaseModel):
         super().__init__(*args, **kwargs)
         self._currency_from, self._currency_to = self.pair.split("/")
         self._currencies = set([self._currency_from, self._currency_to, "BTC", "USDT", "USDC"])
+        self._market = self.pair.replace("/", "").upper()
+        self._spec = None
+
+    @property
+    def spec(self) -> MarketSpec:
+        if self._spec is None:
+            pair_decimals = self.decimals.pairs[self.market]
+            self._spec = MarketSpec.create(self.pair, pair_decimals.price, pair_decimals.amount)
+        return self._spec
 
     def rnd_price(self, price: Decimal, cls: type = Decimal) -> Decimal:
-        price_decimals = self.decimals.pairs[self.market].price
-        return rnd(price, price_decimals)
+        # prices are always returned as Decimal, whatever `cls` is
+        return self.spec.round_price(price)
 
     def rnd_amount(self, amount: Decimal, cls: type = Decimal) -> Decimal:
-        amount_decimals = self.decimals.pairs[self.market].amount
-        return rnd(amount, amount_decimals, cls=cls)
+        return self.spec.round_amount(amount, cls)
 
     def get_min_buy_amount(self, price: Price):
         return self.rnd_amount(self.min_buy_amount_usdt / price.price)
 
     def rnd_amount_by_ccy(self, amount: Decimal, currency: str, cls: type = Decimal) -> Decimal:
-        match currency:
-            case "BTC":
-                amount_decimals = 8
-            case "USDT":
-                amount_decimals = 2
-            case "USDC":
-                amount_decimals = 2
-            case _:
-                amount_decimals = 8
-        return rnd(amount, amount_decimals, cls=cls)
+        return quantize(amount, currency_exponent(currency), cls)
 
     @property
     def market(self) -> str:
-        return self.pair.replace("/", "").upper()
+        return self._market
 
     @property
     def currencies(self):
@@ -77,11 +82,18 @@ class Config(BaseModel):
 
     @classmethod
     def load_config_from_db_config(cls, label: str) -> "Config":
-        db_config = DbConfig.from_db(f"bot_{label}")
+        return get_config_loader().load(label)
+
+    @classmethod
+    def load_configs_from_db_config(cls, labels: list[str]) -> dict[str, "Config"]:
+        return get_config_loader().load_many(labels)
+
+    @classmethod
+    def create_from_db_configs(
+        cls, label: str, db_config: "DbConfig", decimals_config: "DbConfig", secrets: "DbConfig"
+    ) -> "Config":
         exchange = db_config.exchange
-        decimals_config = DbConfig.from_db(f"decimals_{exchange}")
         decimals = read_decimals_from_db_config(decimals_config)
-        secrets = DbConfig.from_db("secrets")
         client = get_client_credentials_from_db(secrets, label, exchange)
         config = cls(
             label=label,
@@ -124,6 +136,7 @@ def read_decimals_from_db_config(db_config: "DbConfig") -> ExchangeDecimals:
 
 
 def get_decimals_file(data: dict) -> str:
+    load_env()
     if "decimals_file_path" in data:
         return data["decimals_file_path"]
     else:
@@ -131,6 +144,7 @@ def get_decimals_file(data: dict) -> str:
 
 
 def get_client_credentials(exchange: str, label: str) -> ClientCredentials:
+    load_env()
     access_key_str = f"P_{exchange.upper()}_{label.upper()}_V2_ACCESS_KEY"
     try:
         key = os.environ[access_key_str]
@@ -171,17 +185,28 @@ class DbConfigNotFound(RuntimeError):
 class DbConfig(Record):
     _KEY_FIELD = PrivateAttr(default="key")
     _TABLE_NAME = PrivateAttr(default="config")
+    # bot configs are tagged with kind="bot" so they can be listed with a query instead of a scan
+    _indexes: list[Index] = PrivateAttr(
+        default=[
+            Index(
+                partition_key=IndexField(field_name="kind", key_type="HASH"),
+                sort_key=IndexField(field_name="key", key_type="RANGE"),
+            )
+        ]
+    )
 
     key: str
     values: list[ConfigValue]
+    # incremented on every save, watched by `ConfigWatcher` to detect changes
+    version: int = 0
 
     _dvalues: dict[str, Any] = PrivateAttr(default={})
 
     def add_private_attribute(self, name: str, value: Any):
         object.__setattr__(self, name, value)
 
-    def __init__(self, key: str, values: list[ConfigValue]):
-        super().__init__(key=key, values=values)
+    def __init__(self, key: str, values: list[ConfigValue], version: int = 0):
+        super().__init__(key=key, values=values, version=version)
         for value in self.values:
             self._dvalues[value.name] = value.value
             if value.name in self.__dict__:
@@ -192,28 +217,121 @@ class DbConfig(Record):
                 self.add_private_attribute(value.name, value.value)
 
     @classmethod
-    def from_db(cls, key: str, fail_if_not_found: bool = False) -> "DbConfig":
-        config = get_dynamodb().Table(cls._TABLE_NAME.get_default()).get_item(Key={"key": key}).get("Item")
-        if config:
-            values = [ConfigValue(**value) for value in config.get("values", [])]
+    def from_item(cls, key: str, item: dict | None, fail_if_not_found: bool = False) -> "DbConfig":
+        if item:
+            values = [ConfigValue(**value) for value in item.get("values", [])]
         else:
             if fail_if_not_found:
                 raise DbConfigNotFound(f"can't find config for {key}")
             values = []
-        return cls(key=key, values=values)
+        return cls(key=key, values=values, version=int(item.get("version", 0)) if item else 0)
 
     @classmethod
-    def get_all_bots(cls):
-        bots = []
-        table = get_dynamodb().Table(cls._TABLE_NAME.get_default())
-        response = table.scan(
-            FilterExpression="begins_with(#key, :prefix)",
-            ExpressionAttributeNames={"#key": "key"},
-            ExpressionAttributeValues={":prefix": "bot_"},
-        )
-        for item in response["Items"]:
-            bots.append(cls.from_db(item["key"]))
-        return bots
+    def from_db(cls, key: str, fail_if_not_found: bool = False) -> "DbConfig":
+        config = get_storage().Table(cls._TABLE_NAME.get_default()).get_item(Key={"key": key}).get("Item")
+        return cls.from_item(key, config, fail_if_not_found)
+
+    @classmethod
+    def batch_from_db(cls, keys: list[str]) -> dict[str, "DbConfig"]:
+        """
+        Read many configs with `BatchGetItem`, the missing keys get an empty config (as `from_db`).
+        """
+        table_name = cls._TABLE_NAME.get_default()
+        items = batch_get_items(get_storage(), table_name, [{"key": key} for key in dict.fromkeys(keys)])
+        found = {item["key"]: item for item in items}
+        return {key: cls.from_item(key, found.get(key)) for key in keys}
+
+    @classmethod
+    def save(cls, bot: str, record: "DbConfig") -> None:
+        record.version += 1
+        super().save(bot, record)
+
+    @classmethod
+    def derived_attributes(cls, record: "DbConfig") -> dict:
+        return {"kind": "bot"} if record.key.startswith("bot_") else {}
+
+    @classmethod
+    def has_kind_index(cls) -> bool:
+        return not get_schema_manager().diff_indexes(cls).to_create
+
+    @classmethod
+    def _query_bots(cls) -> Iterator["DbConfig"]:
+        table = get_storage().Table(cls._TABLE_NAME.get_default())
+        query_params = {"IndexName": "kind_key_index", "KeyConditionExpression": Key("kind").eq("bot")}
+        while True:
+            response = table.query(**query_params)
+            for item in response.get("Items", []):
+                yield cls.from_item(item["key"], item)
+            if "LastEvaluatedKey" not in response:
+                return
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    @classmethod
+    def _scan_bots(cls, total_segments: int) -> Iterator["DbConfig"]:
+        table_name = cls._TABLE_NAME.get_default()
+        pages: queue.Queue = queue.Queue()
+
+        def scan_segment(segment: int) -> None:
+            try:
+                table = get_storage().Table(table_name)
+                scan_params: dict = {"FilterExpression": Attr("key").begins_with("bot_")}
+                if total_segments > 1:
+                    scan_params.update(Segment=segment, TotalSegments=total_segments)
+                while True:
+                    response = table.scan(**scan_params)
+                    pages.put(response.get("Items", []))
+                    if "LastEvaluatedKey" not in response:
+                        break
+                    scan_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+            except Exception as e:
+                pages.put(e)
+            finally:
+                pages.put(None)
+
+        with ThreadPoolExecutor(max_workers=total_segments) as executor:
+            for segment in range(total_segments):
+                executor.submit(scan_segment, segment)
+            running = total_segments
+            while running:
+                page = pages.get()
+                if page is None:
+                    running -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    for item in page:
+                        yield cls.from_item(item["key"], item)
+
+    @classmethod
+    def iter_bots(cls, total_segments: int = 4) -> Iterator["DbConfig"]:
+        """
+        Stream the bot configs as the pages arrive, from the `kind` index or a parallel scan without it.
+        """
+        if cls.has_kind_index():
+            yield from cls._query_bots()
+        else:
+            yield from cls._scan_bots(total_segments)
+
+    @classmethod
+    def get_all_bots(cls, total_segments: int = 4) -> list["DbConfig"]:
+        return list(cls.iter_bots(total_segments))
+
+    @classmethod
+    def backfill_kind(cls) -> int:
+        """
+        Tag the bot configs saved before the `kind` index existed, returns how many were updated.
+        """
+        table = get_storage().Table(cls._TABLE_NAME.get_default())
+        updated = 0
+        for config in cls._scan_bots(total_segments=1):
+            table.update_item(
+                Key={"key": config.key},
+                UpdateExpression="SET #kind = :kind",
+                ExpressionAttributeNames={"#kind": "kind"},
+                ExpressionAttributeValues={":kind": "bot"},
+            )
+            updated += 1
+        return updated
 
     @classmethod
     def get_full_table_name(cls, bot):
@@ -288,6 +406,9 @@ class DbConfig(Record):
     def get_secret(self, key: str):
         return self._dvalues.get(key, None)
 
+    def get_value(self, name: str, default: Any = None) -> Any:
+        return self._dvalues.get(name, default)
+
     @classmethod
     def delete_secret(cls, key: str):
         config = cls.from_db("secrets")
@@ -296,10 +417,107 @@ class DbConfig(Record):
 
     @classmethod
     def update_config(cls, config: "DbConfig"):
-        table = get_dynamodb().Table(cls._TABLE_NAME.get_default())
-        item = json.loads(config.model_dump_json())
+        table = get_storage().Table(cls._TABLE_NAME.get_default())
+        config.version += 1
+        item = cls.to_db_item(config)
         try:
             table.put_item(Item=item)
             print(f"{cls.__name__} {config.get_id()} updated successfully in DynamoDB.")
         except Exception as e:
             raise RuntimeError(f"Failed to update {cls.__name__} {config.get_id()} in DynamoDB: {e}")
+
+
+# decimals of every exchange are requested with the bot configs, so a bot usually needs a single BatchGetItem
+EXCHANGES = ["coinex", "binance"]
+
+
+class ConfigLoader:
+    """
+    Builds the `Config` of the bots from the config table, with one `BatchGetItem` for all the items they need.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        # the shared items (`decimals_{exchange}`, `secrets`), kept for `ttl` seconds
+        self._cache: dict[str, tuple[float, DbConfig]] = {}
+        # keys being read by another thread, waited for instead of read again
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_shared(key: str) -> bool:
+        return not key.startswith("bot_")
+
+    def invalidate(self, key: str | None = None) -> None:
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def get_many(self, keys: list[str]) -> dict[str, DbConfig]:
+        configs: dict[str, DbConfig] = {}
+        waiting: dict[str, Future] = {}
+        to_read: dict[str, Future] = {}
+        now = get_clock().monotonic()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                cached = self._cache.get(key)
+                if cached is not None and now - cached[0] < self.ttl:
+                    configs[key] = cached[1]
+                elif key in self._in_flight:
+                    waiting[key] = self._in_flight[key]
+                else:
+                    to_read[key] = self._in_flight[key] = Future()
+
+        if to_read:
+            try:
+                read = DbConfig.batch_from_db(list(to_read))
+            except Exception as e:
+                with self._lock:
+                    for key, future in to_read.items():
+                        self._in_flight.pop(key, None)
+                        future.set_exception(e)
+                raise
+            read_at = get_clock().monotonic()
+            with self._lock:
+                for key, future in to_read.items():
+                    if self.is_shared(key):
+                        self._cache[key] = (read_at, read[key])
+                    self._in_flight.pop(key, None)
+                    future.set_result(read[key])
+            configs.update(read)
+
+        for key, future in waiting.items():
+            configs[key] = future.result()
+        return configs
+
+    def load_many(self, labels: list[str]) -> dict[str, Config]:
+        keys = [f"bot_{label}" for label in labels] + [f"decimals_{exchange}" for exchange in EXCHANGES] + ["secrets"]
+        configs = self.get_many(keys)
+        # a bot on an exchange outside EXCHANGES needs a second read for its decimals
+        missing = [f"decimals_{configs[f'bot_{label}'].exchange}" for label in labels]
+        configs.update(self.get_many([key for key in missing if key not in configs]))
+
+        loaded = {}
+        for label in labels:
+            db_config = configs[f"bot_{label}"]
+            loaded[label] = Config.create_from_db_configs(
+                label, db_config, configs[f"decimals_{db_config.exchange}"], configs["secrets"]
+            )
+        return loaded
+
+    def load(self, label: str) -> Config:
+        return self.load_many([label])[label]
+
+
+_config_loader: ConfigLoader | None = None
+_config_loader_lock = threading.Lock()
+
+
+def get_config_loader() -> ConfigLoader:
+    global _config_loader
+    with _config_loader_lock:
+        if _config_loader is None:
+            _config_loader = ConfigLoader()
+        return _config_loader
@@ -1,31 +1,55 @@
 import os
+import threading
 
-import boto3
-from dotenv import load_dotenv
+from app.config.env import load_env
 
-env_file = os.environ.get("ENV_FILE_PATH", ".env")
+_dynamodb = None
+_lock = threading.Lock()
 
-load_dotenv(env_file, override=True)
 
-DYNAMODB_env = os.environ.get("DYNAMODB_ENV", "local")
-DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL", "http://localhost:8000")
-DYNAMODB_REGION = os.environ.get("DYNAMODB_REGION", "us-west-2")
+def get_client_config():
+    """
+    The botocore configuration of the DynamoDB client, tunable with DYNAMODB_* environment variables.
+    """
+    from botocore.config import Config as BotoConfig
 
-AWS_SECRET_KEY = os.environ.get("AWS_SECRET_KEY", "")
-AWS_ACCESS_KEY = os.environ.get("AWS_ACCESS_KEY", "")
-
-if DYNAMODB_env == "local":
-    dynamodb = boto3.resource(
-        "dynamodb",
-        endpoint_url=DYNAMODB_ENDPOINT_URL,
-        region_name=DYNAMODB_REGION,
-        aws_access_key_id="anything",
-        aws_secret_access_key="anything",
+    return BotoConfig(
+        max_pool_connections=int(os.environ.get("DYNAMODB_MAX_POOL_CONNECTIONS", "50")),
+        tcp_keepalive=os.environ.get("DYNAMODB_TCP_KEEPALIVE", "true").lower() == "true",
+        connect_timeout=float(os.environ.get("DYNAMODB_CONNECT_TIMEOUT", "3")),
+        read_timeout=float(os.environ.get("DYNAMODB_READ_TIMEOUT", "10")),
+        retries={
+            "mode": os.environ.get("DYNAMODB_RETRY_MODE", "standard"),
+            "max_attempts": int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", "5")),
+        },
     )
-else:
-    dynamodb = boto3.resource("dynamodb", region_name=DYNAMODB_REGION)
+
+
+def create_dynamodb():
+    import boto3
+
+    load_env()
+    dynamodb_env = os.environ.get("DYNAMODB_ENV", "local")
+    endpoint_url = os.environ.get("DYNAMODB_ENDPOINT_URL", "http://localhost:8000")
+    region = os.environ.get("DYNAMODB_REGION", "us-west-2")
+
+    if dynamodb_env == "local":
+        return boto3.resource(
+            "dynamodb",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id="anything",
+            aws_secret_access_key="anything",
+            config=get_client_config(),
+        )
+    return boto3.resource("dynamodb", region_name=region, config=get_client_config())
 
 
 def get_dynamodb():
-    global dynamodb
-    return dynamodb
+    # built on first use: importing the models (e.g. for rounding or backtests) doesn't pay for boto3
+    global _dynamodb
+    if _dynamodb is None:
+        with _lock:
+            if _dynamodb is None:
+                _dynamodb = create_dynamodb()
+    return _dynamodb
@@ -0,0 +1,31 @@
+import os
+import threading
+from typing import Optional
+
+# the dotenv file loaded and the names of its variables
+_loaded: Optional[tuple[str, list[str]]] = None
+_lock = threading.Lock()
+
+
+def _is_loaded(path: str) -> bool:
+    # read again when one of its variables is missing, e.g. after `mock.patch.dict` restored the environment
+    return _loaded is not None and _loaded[0] == path and all(name in os.environ for name in _loaded[1])
+
+
+def load_env() -> None:
+    """
+    Load the dotenv file (ENV_FILE_PATH, `.env` by default) the first time the environment is needed.
+    """
+    global _loaded
+    path = os.environ.get("ENV_FILE_PATH", ".env")
+    if _is_loaded(path):
+        return
+    with _lock:
+        if not _is_loaded(path):
+            from dotenv import dotenv_values
+
+            values = {name: value for name, value in dotenv_values(path).items() if value is not None}
+            for name, value in values.items():
+                # the variables already set in the process win over the file
+                os.environ.setdefault(name, value)
+            _loaded = (path, list(values))
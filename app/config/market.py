@@ -0,0 +1,129 @@
+from decimal import ROUND_UP, Decimal
+from typing import Iterable, Optional
+
+from app.common.fixed import from_fixed, rescale, to_fixed
+from app.config.exchange_decimals import MarketDecimalsUndefined
+
+# decimals used for the balances of a currency, 8 for the ones not listed
+CURRENCY_DECIMALS = {"BTC": 8, "USDT": 2, "USDC": 2}
+DEFAULT_CURRENCY_DECIMALS = 8
+
+
+def exponent(decimals: int) -> Decimal:
+    return Decimal(1).scaleb(-decimals)
+
+
+_CURRENCY_EXPONENTS = {currency: exponent(decimals) for currency, decimals in CURRENCY_DECIMALS.items()}
+_DEFAULT_CURRENCY_EXPONENT = exponent(DEFAULT_CURRENCY_DECIMALS)
+
+
+def currency_exponent(currency: str) -> Decimal:
+    return _CURRENCY_EXPONENTS.get(currency, _DEFAULT_CURRENCY_EXPONENT)
+
+
+def currency_decimals(currency: str) -> int:
+    return CURRENCY_DECIMALS.get(currency, DEFAULT_CURRENCY_DECIMALS)
+
+
+def to_decimal(value) -> Decimal:
+    # floats go through str() to round like their repr, decimals are used as they are
+    return value if value.__class__ is Decimal else Decimal(str(value))
+
+
+def quantize(value, exp: Decimal, cls: type = Decimal, rounding: str = ROUND_UP):
+    try:
+        rounded = to_decimal(value).quantize(exp, rounding=rounding)
+    except Exception as exc:
+        raise RuntimeError(f"Error rounding {value} to {exp}: {exc}")
+    return rounded if cls is Decimal else cls(rounded)
+
+
+class MarketSpec:
+    """
+    Precision of a market, built once per market.
+    """
+
+    __slots__ = (
+        "market",
+        "base",
+        "quote",
+        "price_decimals",
+        "amount_decimals",
+        "tick_size",
+        "step_size",
+        "base_exp",
+        "quote_exp",
+        "base_decimals",
+        "quote_decimals",
+    )
+
+    def __init__(self, base: str, quote: str, price_decimals: Optional[int], amount_decimals: Optional[int]):
+        self.base = base.upper()
+        self.quote = quote.upper()
+        self.market = f"{self.base}{self.quote}"
+        if price_decimals is None or amount_decimals is None:
+            raise MarketDecimalsUndefined(f"Price and amount decimals of {self.market} are not defined")
+        self.price_decimals = price_decimals
+        self.amount_decimals = amount_decimals
+        # computed up front, rounding is a single `quantize` (rounding up, as `common.rnd`)
+        self.tick_size = exponent(price_decimals)
+        self.step_size = exponent(amount_decimals)
+        self.base_exp = currency_exponent(self.base)
+        self.quote_exp = currency_exponent(self.quote)
+        self.base_decimals = currency_decimals(self.base)
+        self.quote_decimals = currency_decimals(self.quote)
+
+    @classmethod
+    def create(cls, pair: str, price_decimals: Optional[int], amount_decimals: Optional[int]) -> "MarketSpec":
+        base, quote = pair.split("/")
+        return cls(base, quote, price_decimals, amount_decimals)
+
+    def __repr__(self) -> str:
+        return f"MarketSpec({self.market}, tick_size={self.tick_size}, step_size={self.step_size})"
+
+    def round_price(self, price) -> Decimal:
+        return quantize(price, self.tick_size)
+
+    def round_amount(self, amount, cls: type = Decimal):
+        return quantize(amount, self.step_size, cls)
+
+    def round_base(self, amount, cls: type = Decimal):
+        return quantize(amount, self.base_exp, cls)
+
+    def round_quote(self, amount, cls: type = Decimal):
+        return quantize(amount, self.quote_exp, cls)
+
+    def round_prices(self, prices: Iterable) -> list[Decimal]:
+        tick_size = self.tick_size
+        return [quantize(price, tick_size) for price in prices]
+
+    def round_amounts(self, amounts: Iterable, cls: type = Decimal) -> list:
+        step_size = self.step_size
+        return [quantize(amount, step_size, cls) for amount in amounts]
+
+    # Fixed-point mode: prices and amounts as integers scaled by the market decimals, balances scaled by the
+    # decimals of their currency (see app.common.fixed).
+
+    def price_to_fixed(self, price) -> int:
+        return to_fixed(price, self.price_decimals)
+
+    def fixed_to_price(self, price: int) -> Decimal:
+        return from_fixed(price, self.price_decimals)
+
+    def amount_to_fixed(self, amount) -> int:
+        return to_fixed(amount, self.amount_decimals)
+
+    def fixed_to_amount(self, amount: int) -> Decimal:
+        return from_fixed(amount, self.amount_decimals)
+
+    def fixed_base(self, amount: int) -> int:
+        """
+        A fixed amount in units of the base currency, `round_base(amount)` in fixed point.
+        """
+        return rescale(amount, self.amount_decimals, self.base_decimals)
+
+    def fixed_quote(self, amount: int, price: int) -> int:
+        """
+        `round_quote(amount * price)` in fixed point, for a fixed amount and price.
+        """
+        return rescale(amount * price, self.amount_decimals + self.price_decimals, self.quote_decimals)
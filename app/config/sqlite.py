@@ -0,0 +1,587 @@
+"""
+SQLite storage with the subset of the boto3 DynamoDB resource API used by the models (`STORAGE_BACKEND=sqlite`).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from decimal import Context, Decimal
+from typing import Any, Collection, Optional
+
+SCHEMA_TABLE = "__tables__"
+# items are JSON documents, decimals are stored as {"$decimal": "<text>"} to keep every digit
+DECIMAL_TAG = "$decimal"
+# the precision of the DynamoDB numbers
+NUMBER_CONTEXT = Context(prec=38)
+
+
+class SqliteStorageError(RuntimeError):
+    pass
+
+
+class SqliteTableNotFound(SqliteStorageError):
+    pass
+
+
+class SqliteConditionalCheckFailed(SqliteStorageError):
+    pass
+
+
+def _json_default(value: Any) -> Any:
+    match value:
+        case Decimal():
+            return {DECIMAL_TAG: str(value)}
+        case set():
+            return sorted(value)
+        case _:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(item: dict) -> str:
+    return json.dumps(item, default=_json_default, separators=(",", ":"))
+
+
+def _object_hook(obj: dict) -> Any:
+    if len(obj) == 1 and DECIMAL_TAG in obj:
+        return Decimal(obj[DECIMAL_TAG])
+    return obj
+
+
+def loads(data: str) -> dict:
+    # DynamoDB returns every number as Decimal, keep the same contract
+    return json.loads(data, parse_float=Decimal, parse_int=Decimal, object_hook=_object_hook)
+
+
+def _param(value: Any) -> Any:
+    # compared with the text of the stored decimals
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _json_path(name: str) -> str:
+    return "$." + '"' + name.replace('"', '\\"') + '"'
+
+
+def _attribute(name: str) -> str:
+    # the SQL expression reading an attribute of the document, the text of a decimal
+    path = _json_path(name)
+    return f"COALESCE(json_extract(item, '{path}.\"{DECIMAL_TAG}\"'), json_extract(item, '{path}'))"
+
+
+def _generated_column(name: str, attribute_type: str) -> str:
+    # with NUMERIC affinity the number attributes are indexed and compared as numbers
+    column_type = "NUMERIC" if attribute_type == "N" else "TEXT"
+    return f"{_quote(name)} {column_type} GENERATED ALWAYS AS ({_attribute(name)}) VIRTUAL"
+
+
+def _compare(column: str, operator: str, value: Any, numeric: bool = False) -> tuple[str, list]:
+    if isinstance(value, (Decimal, int, float)) and not isinstance(value, bool):
+        if numeric:
+            # the parameter takes the affinity of the column, so the comparison can use its index
+            return f"{column} {operator} ?", [str(value)]
+        # numbers are stored as text (decimals) or as JSON numbers (plain ints), compare them numerically
+        return f"CAST({column} AS NUMERIC) {operator} CAST(? AS NUMERIC)", [str(value)]
+    return f"{column} {operator} ?", [_param(value)]
+
+
+def translate_condition(condition: Any, column, numeric: Collection[str] = ()) -> tuple[str, list]:
+    """
+    Translate a boto3 condition (`Key(...)` / `Attr(...)`) into a SQL expression and its parameters.
+    """
+    expression = condition.get_expression()
+    operator = expression["operator"]
+    values = expression["values"]
+    match operator:
+        case "AND" | "OR":
+            left, left_params = translate_condition(values[0], column, numeric)
+            right, right_params = translate_condition(values[1], column, numeric)
+            return f"({left} {operator} {right})", left_params + right_params
+        case "NOT":
+            inner, params = translate_condition(values[0], column, numeric)
+            return f"(NOT {inner})", params
+        case "=" | "<>" | "<" | "<=" | ">" | ">=":
+            name = values[0].name
+            return _compare(column(name), operator, values[1], name in numeric)
+        case "BETWEEN":
+            name = values[0].name
+            low, low_params = _compare(column(name), ">=", values[1], name in numeric)
+            high, high_params = _compare(column(name), "<=", values[2], name in numeric)
+            return f"({low} AND {high})", low_params + high_params
+        case "begins_with":
+            prefix = values[1]
+            return f"substr({column(values[0].name)}, 1, ?) = ?", [len(prefix), prefix]
+        case "contains":
+            # only the membership in a set (stored as a JSON array) is supported
+            attribute = column(values[0].name)
+            return (
+                f"EXISTS (SELECT 1 FROM json_each(CASE WHEN json_valid({attribute}) THEN "
+                f"CASE WHEN json_type({attribute}) = 'array' THEN {attribute} END END) WHERE value = ?)",
+                [_param(values[1])],
+            )
+        case "attribute_exists":
+            return f"{column(values[0].name)} IS NOT NULL", []
+        case "attribute_not_exists":
+            return f"{column(values[0].name)} IS NULL", []
+        case _:
+            raise SqliteStorageError(f"Unsupported condition operator: {operator}")
+
+
+_CLAUSE_RE = re.compile(r"\b(SET|REMOVE|ADD)\b")
+
+
+def _resolve(name: str, names: dict[str, str]) -> str:
+    name = name.strip()
+    resolved = names.get(name, name) if name.startswith("#") else name
+    if "." in resolved or "[" in resolved:
+        raise SqliteStorageError(f"Nested attribute paths are not supported: {name}")
+    return resolved
+
+
+def apply_update_expression(item: dict, expression: str, values: dict[str, Any], names: dict[str, str]) -> dict:
+    """
+    Apply the `SET`, `REMOVE` and `ADD` clauses of a DynamoDB update expression to an item, in place.
+    """
+    parts = _CLAUSE_RE.split(expression)
+    for clause, body in zip(parts[1::2], parts[2::2]):
+        for action in filter(None, (action.strip() for action in body.split(","))):
+            match clause:
+                case "SET":
+                    name, value = action.split("=", 1)
+                    item[_resolve(name, names)] = values[value.strip()]
+                case "REMOVE":
+                    item.pop(_resolve(action, names), None)
+                case "ADD":
+                    name, value = action.split()
+                    name = _resolve(name, names)
+                    increment = values[value]
+                    if isinstance(increment, set):
+                        item[name] = set(item.get(name, set())) | increment
+                    else:
+                        item[name] = NUMBER_CONTEXT.add(Decimal(item.get(name, 0)), Decimal(increment))
+    return item
+
+
+class _NoopWaiter:
+    def wait(self, **kwargs) -> None:
+        # SQLite DDL is synchronous, tables are ready as soon as the statement returns
+        return None
+
+
+class _ListTablesPaginator:
+    def __init__(self, client: "SqliteClient"):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        yield self.client.list_tables()
+
+
+class SqliteClient:
+    def __init__(self, resource: "SqliteResource"):
+        self.resource = resource
+
+    def list_tables(self, **kwargs) -> dict:
+        rows = self.resource.connection().execute(f"SELECT name FROM {SCHEMA_TABLE} ORDER BY name").fetchall()
+        return {"TableNames": [row[0] for row in rows]}
+
+    def get_paginator(self, operation_name: str):
+        if operation_name != "list_tables":
+            raise SqliteStorageError(f"Unsupported paginator: {operation_name}")
+        return _ListTablesPaginator(self)
+
+    def get_waiter(self, waiter_name: str) -> _NoopWaiter:
+        return _NoopWaiter()
+
+    def describe_table(self, TableName: str) -> dict:
+        definition = self.resource.Table(TableName).definition
+        indexes = [{**index, "IndexStatus": "ACTIVE"} for index in definition.get("GlobalSecondaryIndexes", [])]
+        return {
+            "Table": {
+                "TableName": TableName,
+                "TableStatus": "ACTIVE",
+                "KeySchema": definition["KeySchema"],
+                "GlobalSecondaryIndexes": indexes,
+            }
+        }
+
+    def update_table(
+        self,
+        TableName: str,
+        GlobalSecondaryIndexUpdates: Optional[list] = None,
+        AttributeDefinitions: Optional[list] = None,
+        **kwargs,
+    ) -> dict:
+        self.resource.update_indexes(TableName, GlobalSecondaryIndexUpdates or [], AttributeDefinitions or [])
+        return self.describe_table(TableName=TableName)
+
+
+class _Meta:
+    def __init__(self, client: SqliteClient):
+        self.client = client
+
+
+class _BatchWriter:
+    def __init__(self, table: "SqliteTable"):
+        self.table = table
+
+    def __enter__(self) -> "_BatchWriter":
+        self.table.resource.connection().execute("BEGIN")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        connection = self.table.resource.connection()
+        connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def put_item(self, Item: dict) -> None:
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key: dict) -> None:
+        self.table.delete_item(Key=Key)
+
+
+class SqliteTable:
+    def __init__(self, resource: "SqliteResource", name: str):
+        self.resource = resource
+        self.name = name
+        self.meta = resource.meta
+        self._definition: Optional[dict] = None
+
+    @property
+    def definition(self) -> dict:
+        definition = self._definition
+        if definition is None:
+            row = (
+                self.resource.connection()
+                .execute(f"SELECT definition FROM {SCHEMA_TABLE} WHERE name = ?", (self.name,))
+                .fetchone()
+            )
+            if row is None:
+                raise SqliteTableNotFound(f"Table {self.name} does not exist")
+            definition = json.loads(row[0])
+            self._prepare(definition)
+            self._definition = definition
+        return definition
+
+    def _prepare(self, definition: dict) -> None:
+        # The statements are built once per table, sqlite3 keeps them compiled in its statement cache
+        table = _quote(self.name)
+        self._key_field = next(key["AttributeName"] for key in definition["KeySchema"] if key["KeyType"] == "HASH")
+        self._columns = set(definition.get("Columns", []))
+        # tables created before the columns were typed compare their numbers with CAST
+        self._numeric_columns = set(definition.get("NumericColumns", []))
+        self._index_keys = {
+            index["IndexName"]: [key["AttributeName"] for key in index["KeySchema"]]
+            for index in definition.get("GlobalSecondaryIndexes", [])
+        }
+        self._get_sql = f"SELECT item FROM {table} WHERE pk = ?"
+        self._put_sql = f"INSERT OR REPLACE INTO {table} (pk, item) VALUES (?, ?)"
+        self._delete_sql = f"DELETE FROM {table} WHERE pk = ?"
+
+    @property
+    def key_field(self) -> str:
+        self.definition
+        return self._key_field
+
+    def _column(self, name: str) -> str:
+        if name == self.key_field:
+            return "pk"
+        if name in self._columns:
+            return _quote(name)
+        return _attribute(name)
+
+    def _key(self, Key: dict) -> str:
+        return str(Key[self.key_field])
+
+    def get_item(self, Key: dict, **kwargs) -> dict:
+        self.definition
+        row = self.resource.connection().execute(self._get_sql, (self._key(Key),)).fetchone()
+        return {"Item": loads(row[0])} if row else {}
+
+    def get_items(self, Keys: list[dict]) -> list[dict]:
+        self.definition
+        placeholders = ", ".join("?" for _ in Keys)
+        rows = self.resource.connection().execute(
+            f"SELECT item FROM {_quote(self.name)} WHERE pk IN ({placeholders})", [self._key(key) for key in Keys]
+        )
+        return [loads(row[0]) for row in rows]
+
+    def put_item(self, Item: dict, **kwargs) -> dict:
+        self.definition
+        self.resource.connection().execute(self._put_sql, (self._key(Item), dumps(Item)))
+        return {}
+
+    def delete_item(self, Key: dict, **kwargs) -> dict:
+        self.definition
+        self.resource.connection().execute(self._delete_sql, (self._key(Key),))
+        return {}
+
+    def update_item(
+        self,
+        Key: dict,
+        UpdateExpression: str,
+        ExpressionAttributeValues: Optional[dict] = None,
+        ExpressionAttributeNames: Optional[dict] = None,
+        ConditionExpression: Any = None,
+        ReturnValues: str = "NONE",
+        **kwargs,
+    ) -> dict:
+        self.definition
+        connection = self.resource.connection()
+        # inside a batch writer the update joins its transaction
+        owns_transaction = not connection.in_transaction
+        if owns_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(self._get_sql, (self._key(Key),)).fetchone()
+            if ConditionExpression is not None:
+                # evaluated against the stored document, a missing item behaves as an empty one
+                where, params = translate_condition(ConditionExpression, _attribute)
+                sql = f"SELECT 1 FROM (SELECT ? AS item) WHERE {where}"
+                if connection.execute(sql, [row[0] if row else "{}"] + params).fetchone() is None:
+                    raise SqliteConditionalCheckFailed(f"The conditional request failed for {Key} in {self.name}")
+            item = loads(row[0]) if row else dict(Key)
+            apply_update_expression(
+                item, UpdateExpression, ExpressionAttributeValues or {}, ExpressionAttributeNames or {}
+            )
+            connection.execute(self._put_sql, (self._key(Key), dumps(item)))
+        except BaseException:
+            if owns_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        if owns_transaction:
+            connection.execute("COMMIT")
+        return {"Attributes": item} if ReturnValues == "ALL_NEW" else {}
+
+    def query(
+        self,
+        KeyConditionExpression: Any,
+        IndexName: Optional[str] = None,
+        ScanIndexForward: bool = True,
+        Limit: Optional[int] = None,
+        FilterExpression: Any = None,
+        ExclusiveStartKey: Optional[dict] = None,
+        **kwargs,
+    ) -> dict:
+        self.definition
+        if IndexName is None:
+            key_names = [self.key_field]
+        elif IndexName in self._index_keys:
+            key_names = self._index_keys[IndexName] + [self.key_field]
+        else:
+            raise SqliteStorageError(f"Index {IndexName} does not exist in {self.name}")
+        # the items come in the order of the sort key, the table key breaks the ties so the pages can resume
+        sort_name = key_names[-2] if len(key_names) > 2 else None
+
+        where, params = translate_condition(KeyConditionExpression, self._column, self._numeric_columns)
+        if FilterExpression is not None:
+            filter_where, filter_params = translate_condition(FilterExpression, self._column, self._numeric_columns)
+            where, params = f"{where} AND {filter_where}", params + filter_params
+        if ExclusiveStartKey is not None:
+            start_where, start_params = self._after(ExclusiveStartKey, sort_name, ScanIndexForward)
+            where, params = f"{where} AND {start_where}", params + start_params
+        direction = "ASC" if ScanIndexForward else "DESC"
+        order_by = f"pk {direction}" if sort_name is None else f"{self._column(sort_name)} {direction}, pk {direction}"
+        sql = f"SELECT item FROM {_quote(self.name)} WHERE {where} ORDER BY {order_by}"
+        if Limit is not None:
+            sql += " LIMIT ?"
+            params.append(Limit)
+        items = [loads(row[0]) for row in self.resource.connection().execute(sql, params)]
+        response: dict[str, Any] = {"Items": items, "Count": len(items)}
+        if Limit is not None and len(items) == Limit:
+            # like DynamoDB, the table key and the index keys of the last item
+            response["LastEvaluatedKey"] = {name: items[-1][name] for name in key_names if name in items[-1]}
+        return response
+
+    def _after(self, start_key: dict, sort_name: Optional[str], forward: bool) -> tuple[str, list]:
+        # the items following `start_key` in the order of the query
+        operator = ">" if forward else "<"
+        pk = self._key(start_key)
+        if sort_name is None:
+            return f"pk {operator} ?", [pk]
+        column, numeric = self._column(sort_name), sort_name in self._numeric_columns
+        after, after_params = _compare(column, operator, start_key[sort_name], numeric)
+        same, same_params = _compare(column, "=", start_key[sort_name], numeric)
+        return f"({after} OR ({same} AND pk {operator} ?))", after_params + same_params + [pk]
+
+    def scan(
+        self,
+        FilterExpression: Any = None,
+        Limit: Optional[int] = None,
+        ExclusiveStartKey: Optional[dict] = None,
+        Segment: Optional[int] = None,
+        TotalSegments: Optional[int] = None,
+        **kwargs,
+    ) -> dict:
+        self.definition
+        conditions: list[str] = []
+        params: list = []
+        if FilterExpression is not None:
+            where, params = translate_condition(FilterExpression, self._column, self._numeric_columns)
+            conditions.append(where)
+        if TotalSegments is not None:
+            conditions.append("rowid % ? = ?")
+            params += [TotalSegments, Segment]
+        if ExclusiveStartKey is not None:
+            conditions.append("pk > ?")
+            params.append(self._key(ExclusiveStartKey))
+        sql = f"SELECT pk, item FROM {_quote(self.name)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY pk"
+        if Limit is not None:
+            sql += " LIMIT ?"
+            params.append(Limit)
+        rows = self.resource.connection().execute(sql, params).fetchall()
+        response: dict[str, Any] = {"Items": [loads(row[1]) for row in rows], "Count": len(rows)}
+        if Limit is not None and len(rows) == Limit:
+            response["LastEvaluatedKey"] = {self.key_field: rows[-1][0]}
+        return response
+
+    def batch_writer(self) -> _BatchWriter:
+        self.definition
+        return _BatchWriter(self)
+
+    def delete(self) -> dict:
+        connection = self.resource.connection()
+        connection.execute(f"DROP TABLE IF EXISTS {_quote(self.name)}")
+        connection.execute(f"DELETE FROM {SCHEMA_TABLE} WHERE name = ?", (self.name,))
+        self._definition = None
+        return {}
+
+
+class SqliteResource:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._tables: dict[str, SqliteTable] = {}
+        self.meta = _Meta(SqliteClient(self))
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=30, cached_statements=256)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (name TEXT PRIMARY KEY, definition TEXT NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def Table(self, name: str) -> SqliteTable:
+        # shared instances, so a schema change is seen by every holder of the table
+        if name not in self._tables:
+            self._tables[name] = SqliteTable(self, name)
+        return self._tables[name]
+
+    def batch_get_item(self, RequestItems: dict, **kwargs) -> dict:
+        responses = {}
+        for table_name, request in RequestItems.items():
+            responses[table_name] = self.Table(table_name).get_items(request["Keys"])
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _add_indexes(self, table_name: str, indexes: list, definition: dict, attribute_definitions: list) -> None:
+        table = _quote(table_name)
+        connection = self.connection()
+        attribute_types = {
+            attribute["AttributeName"]: attribute["AttributeType"] for attribute in attribute_definitions
+        }
+        columns = definition["Columns"]
+        numeric_columns = definition.setdefault("NumericColumns", [])
+        for index in indexes:
+            for key in index["KeySchema"]:
+                name = key["AttributeName"]
+                if name not in columns:
+                    attribute_type = attribute_types.get(name, "S")
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {_generated_column(name, attribute_type)}")
+                    columns.append(name)
+                    if attribute_type == "N":
+                        numeric_columns.append(name)
+            index_columns = ", ".join(_quote(key["AttributeName"]) for key in index["KeySchema"])
+            connection.execute(
+                f"CREATE INDEX {_quote(table_name + '.' + index['IndexName'])} ON {table} ({index_columns})"
+            )
+
+    def _save_definition(self, definition: dict) -> None:
+        self.connection().execute(
+            f"INSERT OR REPLACE INTO {SCHEMA_TABLE} (name, definition) VALUES (?, ?)",
+            (definition["TableName"], json.dumps(definition)),
+        )
+
+    def create_table(
+        self,
+        TableName: str,
+        KeySchema: list,
+        GlobalSecondaryIndexes: Optional[list] = None,
+        AttributeDefinitions: Optional[list] = None,
+        **kwargs,
+    ) -> SqliteTable:
+        if TableName in self.meta.client.list_tables()["TableNames"]:
+            raise SqliteStorageError(f"Table {TableName} already exists")
+
+        indexes = GlobalSecondaryIndexes or []
+        definition: dict[str, Any] = {
+            "TableName": TableName,
+            "KeySchema": KeySchema,
+            "GlobalSecondaryIndexes": indexes,
+            "Columns": [],
+            "NumericColumns": [],
+        }
+        connection = self.connection()
+        connection.execute("BEGIN")
+        try:
+            connection.execute(f"CREATE TABLE {_quote(TableName)} (pk TEXT PRIMARY KEY, item TEXT NOT NULL)")
+            self._add_indexes(TableName, indexes, definition, AttributeDefinitions or [])
+            self._save_definition(definition)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return self.Table(TableName)
+
+    def update_indexes(self, table_name: str, updates: list, attribute_definitions: list) -> None:
+        definition = self.Table(table_name).definition
+        connection = self.connection()
+        connection.execute("BEGIN")
+        try:
+            for update in updates:
+                if "Create" in update:
+                    self._add_indexes(table_name, [update["Create"]], definition, attribute_definitions)
+                    definition["GlobalSecondaryIndexes"].append(update["Create"])
+                elif "Delete" in update:
+                    index_name = update["Delete"]["IndexName"]
+                    connection.execute(f"DROP INDEX IF EXISTS {_quote(table_name + '.' + index_name)}")
+                    definition["GlobalSecondaryIndexes"] = [
+                        index for index in definition["GlobalSecondaryIndexes"] if index["IndexName"] != index_name
+                    ]
+            self._save_definition(definition)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self.Table(table_name)._definition = None
+
+
+sqlite: Optional[SqliteResource] = None
+_sqlite_lock = threading.Lock()
+
+
+def get_sqlite() -> SqliteResource:
+    global sqlite
+    if sqlite is None:
+        with _sqlite_lock:
+            if sqlite is None:
+                sqlite = SqliteResource(os.environ.get("SQLITE_PATH", "sbot.db"))
+    return sqlite
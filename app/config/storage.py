@@ -0,0 +1,73 @@
+import os
+import time
+
+from app.config.dynamodb import get_dynamodb
+from app.config.env import load_env
+from app.config.sqlite import SqliteConditionalCheckFailed, get_sqlite
+
+
+def get_storage():
+    load_env()
+    match os.environ.get("STORAGE_BACKEND", "dynamodb"):
+        case "sqlite":
+            return get_sqlite()
+        case _:
+            return get_dynamodb()
+
+
+def is_conditional_check_failed(exc: Exception) -> bool:
+    if isinstance(exc, SqliteConditionalCheckFailed):
+        return True
+    response = getattr(exc, "response", None) or {}
+    return response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def list_table_names(storage) -> list[str]:
+    paginator = storage.meta.client.get_paginator("list_tables")
+    names = []
+    for page in paginator.paginate():
+        names.extend(page.get("TableNames", []))
+    return names
+
+
+def batch_get_items(storage, table_name: str, keys: list[dict], max_attempts: int = 5) -> list[dict]:
+    """
+    Read many items of a table with `BatchGetItem` (100 keys per request), retrying the unprocessed keys.
+    """
+    items = []
+    for start in range(0, len(keys), 100):
+        request = {table_name: {"Keys": keys[start : start + 100]}}
+        for attempt in range(max_attempts):
+            response = storage.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(0.05 * 2**attempt)
+        if request:
+            raise RuntimeError(f"Failed to read {len(request[table_name]['Keys'])} items from {table_name}")
+    return items
+
+
+def copy_table(source, target, table_name: str, create_table_arguments: dict) -> int:
+    """
+    Copy every item of a table between two storages (DynamoDB <-> SQLite), returns the number of items copied.
+    """
+    if table_name not in list_table_names(target):
+        table = target.create_table(**create_table_arguments)
+        table.meta.client.get_waiter("table_exists").wait(TableName=table_name)
+
+    source_table = source.Table(table_name)
+    target_table = target.Table(table_name)
+    copied = 0
+    scan_arguments: dict = {}
+    with target_table.batch_writer() as batch:
+        while True:
+            response = source_table.scan(**scan_arguments)
+            for item in response.get("Items", []):
+                batch.put_item(Item=item)
+                copied += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_arguments["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return copied
@@ -0,0 +1,132 @@
+import threading
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+from app.config.config import Config, ConfigLoader, DbConfig, get_config_loader
+
+
+class ConfigDiff(BaseModel):
+    label: str
+    # field -> (old value, new value), the credentials are reported without their values
+    changed: dict[str, tuple[Any, Any]]
+
+    @classmethod
+    def compare(cls, old: Config, new: Config) -> "ConfigDiff":
+        old_values, new_values = old.model_dump(), new.model_dump()
+        changed = {}
+        for field, value in new_values.items():
+            if old_values.get(field) != value:
+                changed[field] = ("***", "***") if field == "client" else (old_values.get(field), value)
+        return cls(label=new.label, changed=changed)
+
+    @property
+    def empty(self) -> bool:
+        return not self.changed
+
+
+ConfigListener = Callable[[Config, ConfigDiff], None]
+
+
+class ConfigWatcher:
+    """
+    Detects the changes of the bot configs made while the bots run (e.g. with `scripts/update_config.py`).
+    """
+
+    def __init__(self, loader: Optional[ConfigLoader] = None, interval: float = 30):
+        self.loader = loader if loader is not None else get_config_loader()
+        self.interval = interval
+        self._configs: dict[str, Config] = {}
+        self._listeners: dict[str, list[ConfigListener]] = {}
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def keys_of(config: Config) -> list[str]:
+        return [f"bot_{config.label}", f"decimals_{config.exchange}", "secrets"]
+
+    def register(self, label: str, listener: ConfigListener, config: Optional[Config] = None) -> Config:
+        config = config if config is not None else self.loader.load(label)
+        with self._lock:
+            self._configs[label] = config
+            self._listeners.setdefault(label, []).append(listener)
+        return config
+
+    def unregister(self, label: str) -> None:
+        with self._lock:
+            self._configs.pop(label, None)
+            self._listeners.pop(label, None)
+
+    def poll(self) -> list[ConfigDiff]:
+        with self._lock:
+            configs = dict(self._configs)
+        if not configs:
+            return []
+        # the versions of the bots, the decimals of their exchanges and the secrets, in one read
+        keys = list(dict.fromkeys(key for config in configs.values() for key in self.keys_of(config)))
+        items = DbConfig.batch_from_db(keys)
+
+        # a key seen for the first time is compared too, the config may have changed since the bot loaded it
+        changed_keys = {key for key in keys if self._versions.get(key) != items[key].version}
+        for key in changed_keys:
+            self.loader.invalidate(key)
+
+        diffs = []
+        failed_keys: set[str] = set()
+        for label, config in configs.items():
+            if changed_keys.isdisjoint(self.keys_of(config)):
+                continue
+            # one bad config doesn't stop the reload of the others
+            try:
+                diff = self._reload(label, config, items)
+            except Exception as e:
+                print(f"Error reloading the config of {label}: {e}")
+                failed_keys.update(self.keys_of(config))
+                continue
+            if diff is not None:
+                diffs.append(diff)
+        # the versions are recorded once applied, a failed reload is retried on the next poll
+        self._versions.update({key: items[key].version for key in keys if key not in failed_keys})
+        return diffs
+
+    def _reload(self, label: str, config: Config, items: dict[str, DbConfig]) -> Optional[ConfigDiff]:
+        db_config = items[f"bot_{label}"]
+        if not db_config.values:
+            # the bot item was deleted, the bot keeps its config until it's unregistered or the item comes back
+            print(f"Config of {label} not found, keeping the current one")
+            return None
+        decimals_key = f"decimals_{db_config.get_value('exchange')}"
+        decimals = items[decimals_key] if decimals_key in items else DbConfig.from_db(decimals_key)
+        new_config = Config.create_from_db_configs(label, db_config, decimals, items["secrets"])
+        diff = ConfigDiff.compare(config, new_config)
+        if diff.empty:
+            return None
+        with self._lock:
+            if label not in self._configs:
+                return None
+            self._configs[label] = new_config
+            listeners = list(self._listeners.get(label, []))
+        for listener in listeners:
+            listener(new_config, diff)
+        return diff
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error polling the config versions: {e}")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
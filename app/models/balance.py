@@ -2,7 +2,9 @@ from decimal import Decimal
 
 from pydantic import BaseModel
 
+from app.common.fixed import from_fixed, round_up_div
 from app.config.config import Config
+from app.config.market import currency_decimals
 from app.models.price import Price
 
 
@@ -50,11 +52,11 @@ class Balance(BaseModel):
     @classmethod
     def create_from_coinex(cls, currency: str, data: dict, config: Config) -> "Balance":
         rinconcito_usdt = Decimal(0)
-        if currency == config.currency_from:
+        if currency == config.spec.base:
             rinconcito_usdt = config.min_buy_amount_usdt
         return cls(
             currency=currency,
-            available=Decimal(data.get("available", "0")) + Decimal(data.get("frozen", "0")),
+            available=Decimal(data.get("available", "0")),
             locked_amount=Decimal(
                 data.get("frozen", "0"),
             ),
@@ -64,6 +66,90 @@ class Balance(BaseModel):
     @classmethod
     def create_basic_balance(cls, currency: str, config: Config) -> "Balance":
         rinconcito_usdt = Decimal(0)
-        if currency == config.currency_from:
+        if currency == config.spec.base:
             rinconcito_usdt = config.min_buy_amount_usdt
         return cls(currency=currency, available=Decimal(0), locked_amount=Decimal(0), rinconcito_usdt=rinconcito_usdt)
+
+
+class FixedBalance:
+    """
+    `Balance` of the simulations in fixed-point, the amounts are integers scaled by `decimals`.
+    """
+
+    __slots__ = (
+        "currency",
+        "decimals",
+        "available",
+        "locked_amount",
+        "rinconcito_usdt",
+        "_rinconcito_ratio",
+        "_currency_decimals",
+    )
+
+    def __init__(self, currency: str, decimals: int, available: int = 0, locked_amount: int = 0, rinconcito_usdt=0):
+        self.currency = currency
+        self.decimals = decimals
+        self._currency_decimals = min(currency_decimals(currency), decimals)
+        self.available = available
+        self.locked_amount = locked_amount
+        self.rinconcito_usdt = Decimal(rinconcito_usdt)
+        self._rinconcito_ratio = self.rinconcito_usdt.as_integer_ratio()
+
+    @property
+    def total(self) -> int:
+        return self.available + self.locked_amount
+
+    def inc(self, amount: int):
+        self.available += amount
+
+    def lock(self, amount: int):
+        self.locked_amount += amount
+        self.available -= amount
+
+    def unlock(self, amount: int):
+        self.locked_amount -= amount
+        self.available += amount
+
+    def dec(self, amount: int):
+        self.available -= amount
+
+    def widen(self, decimals: int):
+        # more decimals than the currency, to hold unrounded amounts (e.g. the proceeds of a sell) exactly
+        if decimals > self.decimals:
+            factor = 10 ** (decimals - self.decimals)
+            self.available *= factor
+            self.locked_amount *= factor
+            self.decimals = decimals
+
+    def rinconcito_amount(self, price: int, price_decimals: int) -> int:
+        # rounded up, `available_amount(...) < x` gives the same answer as the exact Decimal comparison
+        numerator, denominator = self._rinconcito_ratio
+        if numerator == 0:
+            return 0
+        return round_up_div(numerator * 10 ** (self.decimals + price_decimals), denominator * price)
+
+    def available_amount(self, price: int, price_decimals: int) -> int:
+        return self.available - self.rinconcito_amount(price, price_decimals)
+
+    def _to_decimal(self, value: int) -> Decimal:
+        # with the decimals of the currency when they are enough
+        extra = 10 ** (self.decimals - self._currency_decimals)
+        if value % extra == 0:
+            return from_fixed(value // extra, self._currency_decimals)
+        return from_fixed(value, self.decimals)
+
+    def to_balance(self) -> Balance:
+        return Balance(
+            currency=self.currency,
+            available=self._to_decimal(self.available),
+            locked_amount=self._to_decimal(self.locked_amount),
+            rinconcito_usdt=self.rinconcito_usdt,
+        )
+
+    def get_coinex_data(self):
+        return self.to_balance().get_coinex_data()
+
+    @classmethod
+    def create_basic_balance(cls, currency: str, config: Config) -> "FixedBalance":
+        rinconcito_usdt = config.min_buy_amount_usdt if currency == config.spec.base else Decimal(0)
+        return cls(currency=currency, decimals=currency_decimals(currency), rinconcito_usdt=rinconcito_usdt)
@@ -1,13 +1,14 @@
 import datetime
 import decimal
 import json
-from typing import Any, Literal, Optional
+from typing import Any, Literal, Optional, Self
 
-from boto3.dynamodb.table import TableResource as Table
 from pydantic import BaseModel, PrivateAttr
 
-from app.config.dynamodb import get_dynamodb
+from app.config.conditions import Attr
+from app.config.storage import get_storage, is_conditional_check_failed
 from app.models.enums import PyEnum
+from app.models.schema import get_schema_manager
 
 
 def parse_value(db_record: dict, key: str, cls: Any = str, default: Any = None) -> Any:
@@ -87,16 +88,55 @@ class Record(DbBaseModel):
     class ParsingError(Exception):
         pass
 
+    class ConflictError(Exception):
+        pass
+
     _KEY_FIELD: str = PrivateAttr(default="id")
     _TABLE_NAME: str = PrivateAttr(default="table")
+    _VERSION_FIELD: Optional[str] = PrivateAttr(default=None)
 
-    _table: Optional[Table] = PrivateAttr(default=None)
+    # a DynamoDB table or a `SqliteTable`, depending on the storage backend
+    _table: Optional[Any] = PrivateAttr(default=None)
     _indexes: list[Index] = PrivateAttr(default=[])
 
+    # fields modified since the record was loaded, None when the record doesn't come from the database
+    _dirty: Optional[set[str]] = PrivateAttr(default=None)
+    # the loaded values of the container fields, which can change in place without going through __setattr__
+    _clean_containers: dict[str, Any] = PrivateAttr(default={})
+
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls._table = None
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if self._dirty is not None and name in type(self).model_fields:
+            self._dirty.add(name)
+
+    def mark_clean(self) -> None:
+        self._dirty = set()
+        containers = {name for name, value in self if isinstance(value, (list, dict, set))}
+        self._clean_containers = self._dump_fields(containers) if containers else {}
+
+    def _dump_fields(self, fields: set[str]) -> dict:
+        return BaseModel.model_dump(self, include=fields)
+
+    def dirty_fields(self) -> Optional[set[str]]:
+        if self._dirty is None:
+            return None
+        dirty = set(self._dirty)
+        if self._clean_containers:
+            # e.g. `order.fills.append(...)`
+            current = self._dump_fields(set(self._clean_containers))
+            dirty.update(name for name, value in self._clean_containers.items() if current[name] != value)
+        return dirty
+
+    @classmethod
+    def from_db_item(cls, item: dict) -> Self:
+        record = cls.create_from_db(item)
+        record.mark_clean()
+        return record
+
     @classmethod
     def key_field(cls):
         return cls._KEY_FIELD.get_default()
@@ -113,6 +153,10 @@ class Record(DbBaseModel):
     def indexes(cls):
         return cls._indexes.get_default()
 
+    @classmethod
+    def version_field(cls) -> Optional[str]:
+        return cls._VERSION_FIELD.get_default()
+
     def get_id(self) -> str:
         return getattr(self, self._KEY_FIELD)
 
@@ -127,6 +171,19 @@ class Record(DbBaseModel):
     def get_attribute(cls, field_name: str) -> str:
         return "S"
 
+    @classmethod
+    def derived_attributes(cls, record: "Record") -> dict:
+        """
+        Attributes computed from the fields of a record and stored with it, e.g. the key of a sharded index.
+        """
+        return {}
+
+    @classmethod
+    def to_db_item(cls, record: "Record") -> dict:
+        item = json.loads(record.model_dump_json())
+        item.update(cls.derived_attributes(record))
+        return item
+
     @classmethod
     def get_attribute_definitions(cls):
         attributes = set()
@@ -136,7 +193,8 @@ class Record(DbBaseModel):
             attributes.add(index.sort_key.field_name)
 
         attribute_definitions = []
-        for field_name in cls.model_fields.keys():
+        # index keys can be derived attributes which are not fields of the model
+        for field_name in list(cls.model_fields.keys()) + sorted(attributes - cls.model_fields.keys()):
             if field_name in attributes:
                 attribute_definitions.append(
                     {"AttributeName": field_name, "AttributeType": cls.get_attribute(field_name)}
@@ -183,25 +241,17 @@ class Record(DbBaseModel):
 
     @classmethod
     def create_table(cls, bot: str | None = None) -> None:
-        table_name = cls.get_full_table_name(bot)
-        if table_name not in get_dynamodb().meta.client.list_tables().get("TableNames"):
-            create_table_arguments = cls.build_create_table_arguments(table_name)
-            table = get_dynamodb().create_table(**create_table_arguments)
-            table.meta.client.get_waiter("table_exists").wait(TableName=table_name)
+        get_schema_manager().create_tables([cls], bot)
 
     @classmethod
     def delete_table(cls, bot: str | None = None) -> None:
-        table_name = cls.get_full_table_name(bot)
-        if table_name in get_dynamodb().meta.client.list_tables().get("TableNames"):
-            table = get_dynamodb().Table(table_name)
-            table.delete()
-            table.meta.client.get_waiter("table_not_exists").wait(TableName=table_name)
+        get_schema_manager().delete_tables([cls], bot)
 
     @classmethod
-    def _get_table(cls, bot: str) -> Table:
+    def _get_table(cls, bot: str) -> Any:
         table_name = cls.get_full_table_name(bot)
-        if cls._table is None:
-            cls._table = get_dynamodb().Table(table_name)
+        if cls._table is None or cls._table.name != table_name:
+            cls._table = get_storage().Table(table_name)
         return cls._table
 
     @classmethod
@@ -215,18 +265,19 @@ class Record(DbBaseModel):
                 )
             else:
                 return None
-        return cls.create_from_db(response["Item"])
+        return cls.from_db_item(response["Item"])
 
     @classmethod
     def save(cls, bot: str, record: "Record") -> None:
         table = cls._get_table(bot)
-        item = json.loads(record.model_dump_json())
+        item = cls.to_db_item(record)
         try:
             # Put the item into the DynamoDB table
             table.put_item(Item=item)
             print(f"{cls.__name__} {record.get_id()} saved successfully to DynamoDB.")
         except Exception as e:
             raise RuntimeError(f"Failed to save {cls.__name__} {record.get_id()} to DynamoDB: {e}")
+        record.mark_clean()
 
     @classmethod
     def delete(cls, bot: str, id: str) -> None:
@@ -240,40 +291,84 @@ class Record(DbBaseModel):
 
     @classmethod
     def update(cls, bot: str, record: "Record") -> None:
+        """
+        Update the fields of a record modified since it was loaded (all of them if it was not loaded).
+        """
         table = cls._get_table(bot)
         item = record.model_dump()
+        dirty = record.dirty_fields()
+        version_field = cls.version_field()
+        fields = [
+            field
+            for field in cls.model_fields.keys()
+            if field != cls.key_field() and field != version_field and (dirty is None or field in dirty)
+        ]
 
         update_expression_parts = []
         remove_expression_parts = []
+        expression_names = {}
         expression_values = {}
 
-        for key, value in item.items():
-            if value is None:
-                remove_expression_parts.append(key)
+        for field in fields:
+            expression_names[f"#{field}"] = field
+            if item.get(field) is None:
+                remove_expression_parts.append(f"#{field}")
             else:
-                update_expression_parts.append(f"{key} = :{key}")
-                expression_values[f":{key}"] = value
+                update_expression_parts.append(f"#{field} = :{field}")
+                expression_values[f":{field}"] = item[field]
+
+        if not update_expression_parts and not remove_expression_parts:
+            if dirty is None:
+                raise ValueError("No fields to update or remove")
+            return
+
+        for name, value in cls.derived_attributes(record).items():
+            expression_names[f"#{name}"] = name
+            expression_values[f":{name}"] = value
+            update_expression_parts.append(f"#{name} = :{name}")
+
+        update_arguments = {}
+        new_version = None
+        # conditioned on the loaded version, a concurrent modification raises ConflictError
+        if version_field is not None:
+            expected_version = getattr(record, version_field) or 0
+            new_version = expected_version + 1
+            expression_names[f"#{version_field}"] = version_field
+            expression_values[f":{version_field}"] = new_version
+            update_expression_parts.append(f"#{version_field} = :{version_field}")
+            condition = Attr(version_field).eq(expected_version)
+            if expected_version == 0:
+                condition |= Attr(version_field).not_exists()
+            update_arguments["ConditionExpression"] = condition
 
         update_expression = "SET " + ", ".join(update_expression_parts) if update_expression_parts else ""
         remove_expression = "REMOVE " + ", ".join(remove_expression_parts) if remove_expression_parts else ""
 
         final_update_expression = " ".join(filter(None, [update_expression, remove_expression]))
 
-        if not final_update_expression:
-            raise ValueError("No fields to update or remove")
+        update_arguments["Key"] = {cls.key_field(): record.get_id()}
+        update_arguments["UpdateExpression"] = final_update_expression
+        # boto3 rejects empty expression maps, an update that only removes fields has no values
+        if expression_names:
+            update_arguments["ExpressionAttributeNames"] = expression_names
+        if expression_values:
+            update_arguments["ExpressionAttributeValues"] = expression_values
 
         try:
             # Update the item in DynamoDB
-            table.update_item(
-                Key={cls.key_field(): record.get_id()},
-                UpdateExpression=final_update_expression,
-                ExpressionAttributeValues=expression_values or None,
-            )
+            table.update_item(**update_arguments)
 
             print(
                 f"{cls.__name__} {record.get_id()} updated successfully in DynamoDB. update_expression: {final_update_expression}"
             )
         except Exception as e:
+            if is_conditional_check_failed(e):
+                raise cls.ConflictError(
+                    f"{cls.__name__} {record.get_id()} was modified concurrently (expected {version_field}={new_version - 1})"
+                )
             raise RuntimeError(
                 f"Failed to update {cls.__name__} {record.get_id()} update_expression: {final_update_expression} error={e}"
             )
+        if new_version is not None:
+            object.__setattr__(record, version_field, new_version)
+        record.mark_clean()
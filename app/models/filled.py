@@ -32,11 +32,13 @@ class Fill(BaseModel):
     amount: Decimal
     price: Decimal
     side: OrderType
+    order_id: Optional[str] = None
 
     @classmethod
     def from_coinex(cls, record: dict):
         return cls(
             fill_id=str(record.get("deal_id")),
+            order_id=str(record["order_id"]) if record.get("order_id") is not None else None,
             amount=Decimal(record.get("amount", "0")),
             price=Decimal(record.get("price", "0")),
             side=OrderType(record.get("side", "buy")),
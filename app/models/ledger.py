@@ -0,0 +1,212 @@
+"""
+In-memory balances of a bot, kept up to date from its own orders and fills.
+"""
+
+import threading
+from decimal import Decimal
+from typing import Callable, Iterable, Optional
+
+from pydantic import BaseModel
+
+from app.common.clock import monotonic
+from app.config.config import Config
+from app.models.balance import Balance
+from app.models.enums import OrderType
+from app.models.filled import Fill
+from app.models.order import Order
+from app.models.price import Price
+
+
+class BalanceDrift(BaseModel):
+    # exchange minus ledger
+    currency: str
+    available: Decimal
+    locked: Decimal
+
+    @property
+    def size(self) -> Decimal:
+        return abs(self.available) + abs(self.locked)
+
+
+class _OpenOrder:
+    __slots__ = ("type", "price", "amount", "locked")
+
+    def __init__(self, type: OrderType, price: Decimal, amount: Decimal, locked: Decimal):
+        self.type = type
+        self.price = price
+        self.amount = amount
+        self.locked = locked
+
+
+class BalanceLedger:
+    def __init__(
+        self,
+        config: Config,
+        fetch: Callable[[], dict[str, Balance]],
+        reconcile_interval: float = 300,
+        tolerance: Decimal = Decimal(0),
+        max_fills: int = 10000,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.config = config
+        self.fetch = fetch
+        self.reconcile_interval = reconcile_interval
+        self.tolerance = tolerance
+        self.max_fills = max_fills
+        self.clock = clock
+        self.last_drift: list[BalanceDrift] = []
+        self._balances: dict[str, Balance] = {}
+        self._orders: dict[str, _OpenOrder] = {}
+        # ids of the applied fills, in insertion order so the oldest are dropped first
+        self._fills: dict[str, None] = {}
+        # None until the first snapshot is taken
+        self._reconciled_at: Optional[float] = None
+        # an update couldn't be applied exactly, the balances are read again on the next read
+        self._stale = False
+        self._lock = threading.RLock()
+
+    @property
+    def spec(self):
+        return self.config.spec
+
+    @property
+    def due(self) -> bool:
+        reconciled_at = self._reconciled_at
+        return reconciled_at is None or self._stale or self.clock() - reconciled_at >= self.reconcile_interval
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stale = True
+
+    def balances(self) -> dict[str, Balance]:
+        if self.due:
+            self.reconcile()
+        # copies, the ledger only changes through its orders and fills
+        with self._lock:
+            return {currency: balance.model_copy() for currency, balance in self._balances.items()}
+
+    def get(self, currency: str) -> Balance:
+        if self.due:
+            self.reconcile()
+        with self._lock:
+            return self._balances[currency].model_copy()
+
+    def available_amount(self, currency: str, price: Price) -> Decimal:
+        return self.get(currency).available_amount(price)
+
+    def reconcile(self) -> list[BalanceDrift]:
+        """
+        Replace the ledger with the exchange balances, returns (and keeps in `last_drift`) what didn't match.
+        """
+        fetched = self.fetch()
+        with self._lock:
+            drifts = self._compare(fetched) if self._reconciled_at is not None else []
+            self._balances = fetched
+            self._reconciled_at = self.clock()
+            self._stale = False
+            self.last_drift = drifts
+        for drift in drifts:
+            print(
+                f"Balance drift {self.config.label} {drift.currency}: "
+                f"available={drift.available} locked={drift.locked} size={drift.size}"
+            )
+        return drifts
+
+    def _compare(self, fetched: dict[str, Balance]) -> list[BalanceDrift]:
+        drifts = []
+        for currency in sorted(set(fetched) | set(self._balances)):
+            exchange, ledger = fetched.get(currency), self._balances.get(currency)
+            drift = BalanceDrift(
+                currency=currency,
+                available=(exchange.available if exchange else Decimal(0))
+                - (ledger.available if ledger else Decimal(0)),
+                locked=(exchange.locked_amount if exchange else Decimal(0))
+                - (ledger.locked_amount if ledger else Decimal(0)),
+            )
+            if drift.size > self.tolerance:
+                drifts.append(drift)
+        return drifts
+
+    def _balance(self, currency: str) -> Balance:
+        balance = self._balances.get(currency)
+        if balance is None:
+            balance = Balance.create_basic_balance(currency=currency, config=self.config)
+            self._balances[currency] = balance
+        return balance
+
+    def _check(self, *balances: Balance) -> None:
+        if any(balance.available < 0 or balance.locked_amount < 0 for balance in balances):
+            self._stale = True
+
+    def order_placed(self, order: Order) -> None:
+        with self._lock:
+            if self._reconciled_at is None:
+                return
+            price = order.buy_price if order.type == OrderType.BUY else order.sell_price
+            if price is None:
+                # nothing to lock it at, re-read what the exchange locked
+                self._stale = True
+                return
+            if order.type == OrderType.BUY:
+                locked = self.spec.round_quote(order.amount * price)
+                balance = self._balance(self.spec.quote)
+            else:
+                locked = self.spec.round_base(order.amount)
+                balance = self._balance(self.spec.base)
+            balance.lock(locked)
+            self._orders[order.order_id] = _OpenOrder(order.type, price, order.amount, locked)
+            self._check(balance)
+
+    def order_cancelled(self, order_id: str) -> None:
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                # placed before the snapshot (its lock is in there), re-read to see it released
+                self._stale = True
+                return
+            if self._reconciled_at is None:
+                return
+            balance = self._balance(self.spec.quote if order.type == OrderType.BUY else self.spec.base)
+            balance.unlock(order.locked)
+            self._check(balance)
+
+    def market_order(self, order: Order) -> None:
+        # executed at prices we only learn from its fills, re-read the balances instead of guessing them
+        self.invalidate()
+
+    def apply_fills(self, fills: Iterable[Fill]) -> None:
+        with self._lock:
+            for fill in fills:
+                if fill.fill_id in self._fills:
+                    continue
+                self._fills[fill.fill_id] = None
+                if len(self._fills) > self.max_fills:
+                    del self._fills[next(iter(self._fills))]
+                order_id = fill.order_id
+                order = self._orders.get(order_id) if order_id is not None else None
+                if order_id is None or order is None or self._reconciled_at is None:
+                    # fills of the orders of the snapshot, caught by the next periodic reconcile
+                    continue
+                self._apply_fill(order_id, fill, order)
+
+    def _apply_fill(self, order_id: str, fill: Fill, order: _OpenOrder) -> None:
+        base, quote = self._balance(self.spec.base), self._balance(self.spec.quote)
+        if fill.amount >= order.amount:
+            unlocked = order.locked
+            self._orders.pop(order_id)
+        elif order.type == OrderType.BUY:
+            unlocked = min(self.spec.round_quote(fill.amount * order.price), order.locked)
+        else:
+            unlocked = min(self.spec.round_base(fill.amount), order.locked)
+        order.amount -= fill.amount
+        order.locked -= unlocked
+
+        if order.type == OrderType.BUY:
+            quote.unlock(unlocked)
+            quote.dec(fill.amount * fill.price)
+            base.inc(fill.amount)
+        else:
+            base.unlock(unlocked)
+            base.dec(fill.amount)
+            quote.inc(fill.amount * fill.price)
+        self._check(base, quote)
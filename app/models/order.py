@@ -1,10 +1,17 @@
 import datetime
+import heapq
+import itertools
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from typing import Any, Optional
 
-from boto3.dynamodb.conditions import Key
 from pydantic import BaseModel, PrivateAttr
 
+from app.common.clock import get_clock
+from app.config.conditions import Key
 from app.config.config import Config
 from app.models.common import DbBaseModel, Index, IndexField, Record, parse_value
 from app.models.enums import (
@@ -15,6 +22,8 @@ from app.models.enums import (
     OrderTypeError,
 )
 from app.models.filled import Fill, fill_parser
+from app.models.rollup import DbRollup, RollupGranularity
+from app.models.schema import get_schema_manager
 
 
 class Order(Record):
@@ -49,6 +58,65 @@ class Order(Record):
         if self.executed is None:
             self.executed = self.created
 
+    @classmethod
+    def status_shards(cls) -> int:
+        """
+        Number of shards of the `orderStatusShard` index (ORDER_STATUS_SHARDS), 0 when the index is not sharded.
+        """
+        return int(os.environ.get("ORDER_STATUS_SHARDS", "0"))
+
+    @classmethod
+    def indexes(cls):
+        # the sharded index replaces the `orderStatus` one, `shard-orders` drops the latter once the orders are backfilled
+        if cls.status_shards() > 0:
+            return [
+                Index(
+                    partition_key=IndexField(field_name="orderStatusShard", key_type="HASH"),
+                    sort_key=IndexField(field_name="executed", key_type="RANGE"),
+                )
+            ]
+        return super().indexes()
+
+    @staticmethod
+    def status_shard_key(orderStatus: OrderStatus, shard: int) -> str:
+        return f"{orderStatus.value}#{shard}"
+
+    @classmethod
+    def status_shard(cls, order_id: str, orderStatus: OrderStatus, shards: int) -> str:
+        return cls.status_shard_key(orderStatus, zlib.crc32(order_id.encode()) % shards)
+
+    @classmethod
+    def derived_attributes(cls, record: "Order") -> dict:
+        shards = cls.status_shards()
+        if shards == 0:
+            return {}
+        return {"orderStatusShard": cls.status_shard(record.order_id, record.orderStatus, shards)}
+
+    @classmethod
+    def backfill_status_shards(cls, bot: str) -> int:
+        """
+        Write the `orderStatusShard` of the orders saved before the index was sharded, returns how many were updated.
+        """
+        table = cls._get_table(bot)
+        updated = 0
+        scan_arguments: dict = {}
+        while True:
+            response = table.scan(**scan_arguments)
+            for item in response.get("Items", []):
+                attributes = cls.derived_attributes(cls.create_from_db(item))
+                if all(item.get(name) == value for name, value in attributes.items()):
+                    continue
+                table.update_item(
+                    Key={cls.key_field(): item[cls.key_field()]},
+                    UpdateExpression="SET " + ", ".join(f"#{name} = :{name}" for name in attributes),
+                    ExpressionAttributeNames={f"#{name}": name for name in attributes},
+                    ExpressionAttributeValues={f":{name}": value for name, value in attributes.items()},
+                )
+                updated += 1
+            if "LastEvaluatedKey" not in response:
+                return updated
+            scan_arguments["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
     @classmethod
     def get_attribute(cls, field_name: str) -> str:
         match field_name:
@@ -153,27 +221,43 @@ class Order(Record):
     ) -> list["Order"]:
         # Define the table name and index name
         table = cls._get_table(bot)
-        index_name = "orderStatus_executed_index"
-
-        filter_expression = Key("orderStatus").eq(orderStatus.value)
-        if from_date is not None and to_date is not None:
-            filter_expression &= Key("executed").between(from_date.isoformat(), to_date.isoformat())
-        elif from_date is not None:
-            filter_expression &= Key("executed").gte(from_date.isoformat())
-        elif to_date is not None:
-            filter_expression &= Key("executed").lt(to_date.isoformat())
-
-        query_params = {
-            "IndexName": index_name,
-            "KeyConditionExpression": filter_expression,
-            "ScanIndexForward": ascending,
-        }
-        if limit is not None:
-            query_params["Limit"] = limit
-        response = table.query(**query_params)
-        # Convert response items into Order instances
-        data = [cls.create_from_db(item) for item in response.get("Items", [])]
-        return data
+        shards = cls.status_shards()
+        if shards > 0:
+            index_name = "orderStatusShard_executed_index"
+            partitions = [
+                Key("orderStatusShard").eq(cls.status_shard_key(orderStatus, shard)) for shard in range(shards)
+            ]
+        else:
+            index_name = "orderStatus_executed_index"
+            partitions = [Key("orderStatus").eq(orderStatus.value)]
+
+        def query_partition(filter_expression) -> list["Order"]:
+            if from_date is not None and to_date is not None:
+                filter_expression &= Key("executed").between(from_date.isoformat(), to_date.isoformat())
+            elif from_date is not None:
+                filter_expression &= Key("executed").gte(from_date.isoformat())
+            elif to_date is not None:
+                filter_expression &= Key("executed").lt(to_date.isoformat())
+
+            query_params = {
+                "IndexName": index_name,
+                "KeyConditionExpression": filter_expression,
+                "ScanIndexForward": ascending,
+            }
+            if limit is not None:
+                query_params["Limit"] = limit
+            response = table.query(**query_params)
+            # Convert response items into Order instances
+            return [cls.from_db_item(item) for item in response.get("Items", [])]
+
+        if len(partitions) == 1:
+            return query_partition(partitions[0])
+
+        # scatter-gather: every shard is sorted by executed, merge them and keep the first `limit` orders
+        with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+            results = list(executor.map(query_partition, partitions))
+        merged = heapq.merge(*results, key=lambda order: order.executed, reverse=not ascending)
+        return list(itertools.islice(merged, limit))
 
     @classmethod
     def query_first_by_status(
@@ -243,6 +327,7 @@ def market_orders_parser(value) -> list[ExecutedOrder]:
 
 
 class DbExecuted(Record):
+    # Legacy paged layout, replaced by DbExecutedOrder. Only read to keep the history recorded with it.
     _KEY_FIELD: str = PrivateAttr(default="date")
     _TABLE_NAME: str = PrivateAttr(default="executed")
     _indexes: list[Index] = PrivateAttr(
@@ -304,80 +389,268 @@ class DbExecuted(Record):
             "ScanIndexForward": True,
         }
         response = table.query(**query_params)
-        data = [cls.create_from_db(item) for item in response.get("Items", [])]
+        data = [cls.from_db_item(item) for item in response.get("Items", [])]
         return data
 
 
-class Executed(BaseModel):
-    date: datetime.datetime
-    pages: list[DbExecuted] = []
-    bot: str
+class DbExecutedOrder(Record):
+    """
+    One item per executed market order, partitioned by day and sorted by execution time.
+    """
 
-    _page_size: Optional[int] = PrivateAttr(default=1000)
+    _KEY_FIELD: str = PrivateAttr(default="order_id")
+    _TABLE_NAME: str = PrivateAttr(default="executed_orders")
+    _indexes: list[Index] = PrivateAttr(
+        default=[
+            Index(
+                partition_key=IndexField(field_name="day", key_type="HASH"),
+                sort_key=IndexField(field_name="sequence", key_type="RANGE"),
+            )
+        ]
+    )
 
-    @property
-    def current_page(self) -> DbExecuted:
-        return self.pages[-1]
+    order_id: str
+    day: datetime.datetime
+    sequence: str
+    executed: datetime.datetime
+    type: MarketOrderType
+    buy_price: Optional[Decimal] = None
+    sell_price: Optional[Decimal] = None
+    amount: Decimal
+    benefit: Optional[Decimal] = None
+    market: str  # Note market does not include /
 
-    @property
-    def current_date(self) -> datetime.datetime:
-        return self.current_page.date
+    @classmethod
+    def create_from_executed_order(cls, order: ExecutedOrder) -> "DbExecutedOrder":
+        return cls(
+            order_id=order.order_id,
+            day=datetime.datetime(year=order.executed.year, month=order.executed.month, day=order.executed.day),
+            sequence=cls.build_sequence(order),
+            executed=order.executed,
+            type=order.type,
+            buy_price=order.buy_price,
+            sell_price=order.sell_price,
+            amount=order.amount,
+            benefit=order.benefit,
+            market=order.market,
+        )
 
-    @property
-    def current_day(self) -> datetime.datetime:
-        return self.current_page.day
+    @staticmethod
+    def build_sequence(order: ExecutedOrder) -> str:
+        return f"{order.executed.isoformat()}#{order.order_id}"
+
+    @classmethod
+    def create_from_db(cls, data: dict) -> "DbExecutedOrder":
+        try:
+            return cls(
+                order_id=parse_value(data, "order_id"),
+                day=parse_value(data, "day", datetime.datetime),
+                sequence=parse_value(data, "sequence"),
+                executed=parse_value(data, "executed", datetime.datetime),
+                type=parse_value(data, "type", MarketOrderType),
+                buy_price=parse_value(data, "buy_price", Decimal, default=None),
+                sell_price=parse_value(data, "sell_price", Decimal, default=None),
+                amount=parse_value(data, "amount", Decimal),
+                benefit=parse_value(data, "benefit", Decimal, default=None),
+                market=parse_value(data, "market"),
+            )
+        except KeyError as e:
+            raise cls.ParsingError(f"Missing required field in database record: {e}")
+        except Exception as e:
+            raise ValueError(f"Error creating DbExecutedOrder from database record: {e}")
+
+    def to_executed_order(self) -> ExecutedOrder:
+        return ExecutedOrder(
+            order_id=self.order_id,
+            executed=self.executed,
+            type=self.type,
+            buy_price=self.buy_price,
+            sell_price=self.sell_price,
+            amount=self.amount,
+            benefit=self.benefit,
+            market=self.market,
+        )
+
+    @classmethod
+    def save_all(cls, bot: str, records: list["DbExecutedOrder"]) -> None:
+        table = cls._get_table(bot)
+        try:
+            with table.batch_writer() as batch:
+                for record in records:
+                    batch.put_item(Item=cls.to_db_item(record))
+        except Exception as e:
+            raise RuntimeError(f"Failed to save {len(records)} {cls.__name__} to DynamoDB: {e}")
+
+    @classmethod
+    def query_by_day(
+        cls,
+        bot: str,
+        day: datetime.datetime,
+        from_date: Optional[datetime.datetime] = None,
+        to_date: Optional[datetime.datetime] = None,
+    ) -> list["DbExecutedOrder"]:
+        table = cls._get_table(bot)
+        filter_expression = Key("day").eq(day.isoformat())
+        if from_date is not None and to_date is not None:
+            filter_expression &= Key("sequence").between(from_date.isoformat(), to_date.isoformat())
+        elif from_date is not None:
+            filter_expression &= Key("sequence").gte(from_date.isoformat())
+        elif to_date is not None:
+            filter_expression &= Key("sequence").lt(to_date.isoformat())
+
+        query_params = {
+            "IndexName": "day_sequence_index",
+            "KeyConditionExpression": filter_expression,
+            "ScanIndexForward": True,
+        }
+        data = []
+        while True:
+            response = table.query(**query_params)
+            data += [cls.from_db_item(item) for item in response.get("Items", [])]
+            if "LastEvaluatedKey" not in response:
+                return data
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+class Executed(BaseModel):
+    date: datetime.datetime
+    orders: list[ExecutedOrder] = []
+    bot: str
+    rollup_granularities: list[RollupGranularity] = [RollupGranularity.DAY]
+
+    # orders added since the last save
+    _pending: list[ExecutedOrder] = PrivateAttr(default_factory=list)
 
     @classmethod
     def load_day(cls, bot: str, day: datetime.datetime) -> "Executed":
-        new_executed = cls(bot=bot, date=day, pages=[])
+        new_executed = cls(bot=bot, date=day, orders=[])
         new_executed.load()
         return new_executed
 
-    def __init__(self, *args, **kwargs):
-        private_value = kwargs.pop("_page_size", None)
-        super().__init__(*args, **kwargs)
-        self._page_size = private_value if private_value else self._page_size
+    @property
+    def pending(self) -> list[ExecutedOrder]:
+        return list(self._pending)
 
     def add_executed_order(self, order: Order, order_type: MarketOrderType | OrderType) -> ExecutedOrder:
-        if len(self.pages) == 0:
-            self.load()
-        if self.current_page.is_full():
-            DbExecuted.save(self.bot, self.current_page)
-            self.add_page()
-        return self.current_page.add_order(order=order, order_type=order_type)
-
-    def add_page(self):
-        self.pages.append(
-            DbExecuted(
-                day=self.current_day,
-                date=self.current_date + datetime.timedelta(minutes=1),
-                orders=[],
-                _page_size=self._page_size,
-            )
-        )
+        executed_order = ExecutedOrder.create_from_order(order, order_type)
+        self.orders.append(executed_order)
+        self._pending.append(executed_order)
+        return executed_order
 
     def load(self) -> None:
-        from_date = self.date
-        filter_expression = Key("day").eq(from_date.isoformat())
-        query_params = {
-            "IndexName": "day_date_index",
-            "KeyConditionExpression": filter_expression,
-            "ScanIndexForward": True,
-        }
-        table = DbExecuted._get_table(self.bot)
-        response = table.query(**query_params)
-        self.pages = [DbExecuted.create_from_db(item) for item in response.get("Items", [])]
-        if len(self.pages) == 0:
-            self.pages = [DbExecuted(date=self.date, day=self.date, orders=[], _page_size=self._page_size)]
+        pending_ids = {order.order_id for order in self._pending}
+        stored = [order for order in self.query_by_day(self.bot, self.date) if order.order_id not in pending_ids]
+        self.orders = sorted(stored + self._pending, key=lambda order: order.executed)
+
+    def refresh(self, overlap: float = 300) -> int:
+        """
+        Read and merge the orders recorded by other writers, returns the number of orders added.
+        """
+        if not self.orders:
+            self.load()
+            return len(self.orders)
+        # another writer may record an order some time after it was executed
+        from_date = max(order.executed for order in self.orders) - datetime.timedelta(seconds=overlap)
+        orders = {order.order_id: order for order in self.legacy_orders(self.bot, self.date)}
+        for record in DbExecutedOrder.query_by_day(self.bot, self.date, from_date=from_date):
+            orders[record.order_id] = record.to_executed_order()
+        known_ids = {order.order_id for order in self.orders}
+        new_orders = [order for order_id, order in orders.items() if order_id not in known_ids]
+        if new_orders:
+            self.orders = sorted(self.orders + new_orders, key=lambda order: order.executed)
+        return len(new_orders)
+
+    @staticmethod
+    def legacy_orders(bot: str, day: datetime.datetime) -> list[ExecutedOrder]:
+        # orders recorded before the append-only layout are still in the paged table
+        if not get_schema_manager().table_exists(DbExecuted.get_full_table_name(bot)):
+            return []
+        return [order for page in DbExecuted.query_by_day(bot, day) for order in page.orders]
 
     @classmethod
     def query_by_day(cls, bot: str, day: datetime.datetime) -> list[ExecutedOrder]:
-        data = DbExecuted.query_by_day(bot, day)
-        orders = []
-        for page in data:
-            orders.extend(page.orders)
-        return orders
+        orders = {order.order_id: order for order in cls.legacy_orders(bot, day)}
+        for order in DbExecutedOrder.query_by_day(bot, day):
+            orders[order.order_id] = order.to_executed_order()
+        return sorted(orders.values(), key=lambda order: order.executed)
 
     def save(self):
-        if len(self.pages) > 0:
-            DbExecuted.save(self.bot, self.current_page)
+        if len(self._pending) > 0:
+            DbExecutedOrder.save_all(
+                self.bot, [DbExecutedOrder.create_from_executed_order(order) for order in self._pending]
+            )
+            DbRollup.add_orders(self.bot, self._pending, self.rollup_granularities)
+            self._pending = []
+
+
+class ExecutedCache:
+    """
+    Keeps the executed orders of the current day (UTC) of a bot in memory.
+    """
+
+    def __init__(
+        self, bot: str, refresh_interval: float = 60, hourly_rollups: bool = False, refresh_overlap: float = 300
+    ):
+        self.bot = bot
+        self.refresh_interval = refresh_interval
+        self.refresh_overlap = refresh_overlap
+        self.rollup_granularities = [RollupGranularity.DAY] + ([RollupGranularity.HOUR] if hourly_rollups else [])
+        self._executed: Optional[Executed] = None
+        self._loaded = False
+        self._last_refresh: Optional[datetime.datetime] = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def today() -> datetime.datetime:
+        now = get_clock().now()
+        return datetime.datetime(year=now.year, month=now.month, day=now.day)
+
+    def _executed_for(self, day: datetime.datetime) -> Executed:
+        if self._executed is None or self._executed.date != day:
+            if self._executed is not None:
+                self._executed.save()
+            self._executed = Executed(bot=self.bot, date=day, orders=[], rollup_granularities=self.rollup_granularities)
+            self._loaded = False
+            self._last_refresh = None
+        return self._executed
+
+    def add_executed_order(self, order: Order, order_type: MarketOrderType | OrderType) -> ExecutedOrder:
+        with self._lock:
+            executed = self._executed_for(self.today())
+            if order.executed_day() != executed.date:
+                # recorded late, written without touching the day in memory
+                executed = Executed(
+                    bot=self.bot, date=order.executed_day(), orders=[], rollup_granularities=self.rollup_granularities
+                )
+            executed_order = executed.add_executed_order(order, order_type)
+            executed.save()
+            return executed_order
+
+    def orders(self) -> list[ExecutedOrder]:
+        with self._lock:
+            executed = self._executed_for(self.today())
+            now = get_clock().now()
+            if not self._loaded:
+                executed.load()
+                self._loaded = True
+                self._last_refresh = now
+            elif self._last_refresh is None or (now - self._last_refresh).total_seconds() >= self.refresh_interval:
+                executed.refresh(self.refresh_overlap)
+                self._last_refresh = now
+            return list(executed.orders)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._executed is not None:
+                self._executed.save()
+
+
+_executed_caches: dict[str, ExecutedCache] = {}
+_executed_caches_lock = threading.Lock()
+
+
+def get_executed_cache(bot: str) -> ExecutedCache:
+    with _executed_caches_lock:
+        if bot not in _executed_caches:
+            _executed_caches[bot] = ExecutedCache(bot)
+        return _executed_caches[bot]
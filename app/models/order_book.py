@@ -0,0 +1,156 @@
+"""
+Local mirror of the open orders of a bot, following its own creates, cancels and fills.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+from typing import Callable, Iterable, Optional
+
+from app.common.clock import monotonic
+from app.models.enums import OrderType
+from app.models.filled import Fill
+from app.models.order import Order
+
+# (price, order_id) of the orders of a side, sorted
+SideIndex = list[tuple[Decimal, str]]
+
+
+def order_price(order: Order) -> Decimal:
+    price = order.buy_price if order.type == OrderType.BUY else order.sell_price
+    if price is None:
+        raise ValueError(f"Open order {order.order_id} has no {order.type.value} price")
+    return price
+
+
+def _price(item: tuple[Decimal, str]) -> Decimal:
+    return item[0]
+
+
+class OpenOrderBook:
+    def __init__(self, resync_interval: float = 600, clock: Callable[[], float] = monotonic, max_fills: int = 10000):
+        # read again to pick up what the book can't see, like orders cancelled from the web
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self.max_fills = max_fills
+        self._orders: dict[str, Order] = {}
+        # amount still open of the orders with fills
+        self._remaining: dict[str, Decimal] = {}
+        # ids of the last fills applied (insertion ordered), the user deals are read again from the same start time
+        self._fills: dict[str, None] = {}
+        self._index: dict[OrderType, SideIndex] = {OrderType.BUY: [], OrderType.SELL: []}
+        self._synced_at: Optional[float] = None
+        self._stale = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    @property
+    def due(self) -> bool:
+        return self._synced_at is None or self._stale or self.clock() - self._synced_at >= self.resync_interval
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stale = True
+
+    def get(self, order_id: str) -> Optional[Order]:
+        return self._orders.get(order_id)
+
+    def replace(self, orders: Iterable[Order]) -> None:
+        with self._lock:
+            self._orders = {}
+            self._remaining = {}
+            self._index = {OrderType.BUY: [], OrderType.SELL: []}
+            for order in orders:
+                self._add(order)
+            for index in self._index.values():
+                index.sort()
+            self._synced_at = self.clock()
+            self._stale = False
+
+    def _add(self, order: Order) -> None:
+        self._orders[order.order_id] = order
+        self._index[order.type].append((order_price(order), order.order_id))
+
+    def add(self, order: Order) -> None:
+        with self._lock:
+            if order.order_id in self._orders:
+                self._remove(order.order_id)
+            self._orders[order.order_id] = order
+            insort(self._index[order.type], (order_price(order), order.order_id))
+
+    def _remove(self, order_id: str) -> Optional[Order]:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        self._remaining.pop(order_id, None)
+        index = self._index[order.type]
+        key = (order_price(order), order_id)
+        position = bisect_left(index, key)
+        if position < len(index) and index[position] == key:
+            del index[position]
+        return order
+
+    def remove(self, order_id: str) -> Optional[Order]:
+        with self._lock:
+            return self._remove(order_id)
+
+    def apply_fills(self, fills: Iterable[Fill]) -> list[Order]:
+        """
+        Remove the orders completed by the fills, returns them.
+        """
+        completed: list[Order] = []
+        with self._lock:
+            for fill in fills:
+                if fill.fill_id in self._fills:
+                    continue
+                self._fills[fill.fill_id] = None
+                if len(self._fills) > self.max_fills:
+                    del self._fills[next(iter(self._fills))]
+                order = self._orders.get(fill.order_id) if fill.order_id is not None else None
+                if order is None:
+                    continue
+                remaining = self._remaining.get(order.order_id, order.amount) - fill.amount
+                if remaining > 0:
+                    self._remaining[order.order_id] = remaining
+                else:
+                    self._remove(order.order_id)
+                    completed.append(order)
+        return completed
+
+    def orders(self, side: Optional[OrderType] = None) -> list[Order]:
+        sides = [side] if side is not None else [OrderType.BUY, OrderType.SELL]
+        with self._lock:
+            return [self._orders[order_id] for order_side in sides for _, order_id in self._index[order_side]]
+
+    def between(self, side: OrderType, low: Decimal, high: Decimal) -> list[Order]:
+        """
+        The orders of a side with price between `low` and `high` (both included), sorted by price.
+        """
+        with self._lock:
+            index = self._index[side]
+            start = bisect_left(index, low, key=_price)
+            end = bisect_right(index, high, key=_price)
+            return [self._orders[order_id] for _, order_id in index[start:end]]
+
+    def nearest(self, side: OrderType, price: Decimal, count: int = 1) -> list[Order]:
+        """
+        The `count` orders of a side with the price closest to `price`, the closest first.
+        """
+        with self._lock:
+            index = self._index[side]
+            right = bisect_left(index, price, key=_price)
+            left = right - 1
+            found: list[str] = []
+            while len(found) < count and (left >= 0 or right < len(index)):
+                if right >= len(index) or (left >= 0 and price - index[left][0] <= index[right][0] - price):
+                    found.append(index[left][1])
+                    left -= 1
+                else:
+                    found.append(index[right][1])
+                    right += 1
+            return [self._orders[order_id] for order_id in found]
@@ -3,7 +3,9 @@ from decimal import Decimal
 
 import pydantic
 
+from app.common.clock import get_clock
+
 
 class Price(pydantic.BaseModel):
     price: Decimal
-    date: datetime.datetime = datetime.datetime.now(tz=datetime.timezone.utc)
+    date: datetime.datetime = pydantic.Field(default_factory=lambda: get_clock().now())
@@ -0,0 +1,217 @@
+import datetime
+from decimal import Decimal
+from enum import Enum as PyEnum
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic import PrivateAttr
+
+from app.config.conditions import Attr, Key
+from app.config.storage import is_conditional_check_failed
+from app.models.common import Index, IndexField, Record, parse_value
+from app.models.enums import BaseEnumMixin, MarketOrderType, OrderType
+
+if TYPE_CHECKING:
+    from boto3.dynamodb.conditions import ConditionBase
+
+    from app.models.order import ExecutedOrder
+
+
+class RollupGranularity(BaseEnumMixin, PyEnum):
+    DAY = "day"
+    HOUR = "hour"
+
+    def bucket_start(self, date: datetime.datetime) -> datetime.datetime:
+        if self == RollupGranularity.HOUR:
+            return datetime.datetime(year=date.year, month=date.month, day=date.day, hour=date.hour)
+        return datetime.datetime(year=date.year, month=date.month, day=date.day)
+
+
+TOTAL = "total"
+METRICS = ["orders", "amount", "volume", "benefit"]
+# string set of the ids of the orders already added to a bucket
+COUNTED = "counted"
+# orders added per update, the condition has one `contains` per order and is limited to 4KB
+MAX_ORDERS_PER_UPDATE = 50
+
+
+def counter_name(order_type: MarketOrderType | OrderType | str, metric: str) -> str:
+    prefix = order_type if isinstance(order_type, str) else order_type.value
+    return f"{prefix}_{metric}"
+
+
+class DbRollup(Record):
+    """
+    Aggregated executed market orders of a bot for one day (or hour).
+    """
+
+    _KEY_FIELD: str = PrivateAttr(default="bucket")
+    _TABLE_NAME: str = PrivateAttr(default="rollups")
+    _indexes: list[Index] = PrivateAttr(
+        default=[
+            Index(
+                partition_key=IndexField(field_name="granularity", key_type="HASH"),
+                sort_key=IndexField(field_name="period", key_type="RANGE"),
+            )
+        ]
+    )
+
+    bucket: str
+    granularity: RollupGranularity
+    period: datetime.datetime
+    # flat `{type}_{metric}` attributes in the table (e.g. `sb_benefit`), incremented with `ADD`
+    counters: dict[str, Decimal] = {}
+
+    @staticmethod
+    def build_bucket(granularity: RollupGranularity, period: datetime.datetime) -> str:
+        return f"{granularity.value}#{period.isoformat()}"
+
+    @classmethod
+    def create_from_db(cls, data: dict) -> "DbRollup":
+        try:
+            return cls(
+                bucket=parse_value(data, "bucket"),
+                granularity=parse_value(data, "granularity", RollupGranularity),
+                period=parse_value(data, "period", datetime.datetime),
+                counters={
+                    key: Decimal(value)
+                    for key, value in data.items()
+                    if key not in ("bucket", "granularity", "period", COUNTED) and value is not None
+                },
+            )
+        except KeyError as e:
+            raise cls.ParsingError(f"Missing required field in database record: {e}")
+        except Exception as e:
+            raise ValueError(f"Error creating DbRollup from database record: {e}")
+
+    def get_counter(self, order_type: MarketOrderType | OrderType | str, metric: str) -> Decimal:
+        return self.counters.get(counter_name(order_type, metric), Decimal(0))
+
+    @property
+    def orders(self) -> int:
+        return int(self.get_counter(TOTAL, "orders"))
+
+    @property
+    def benefit(self) -> Decimal:
+        return self.get_counter(TOTAL, "benefit")
+
+    @property
+    def volume(self) -> Decimal:
+        return self.get_counter(TOTAL, "volume")
+
+    @property
+    def bought_volume(self) -> Decimal:
+        return self.get_counter(MarketOrderType.BUY, "volume")
+
+    @property
+    def sold_volume(self) -> Decimal:
+        return self.volume - self.bought_volume
+
+    @staticmethod
+    def order_counters(order: "ExecutedOrder") -> dict[str, Decimal]:
+        price: Optional[Decimal] = order.buy_price
+        if order.type != MarketOrderType.BUY and order.sell_price is not None:
+            price = order.sell_price
+        values = {
+            "orders": Decimal(1),
+            "amount": order.amount,
+            "volume": Decimal(0) if price is None else order.amount * price,
+            "benefit": order.benefit or Decimal(0),
+        }
+        counters: dict[str, Decimal] = {}
+        for prefix in (TOTAL, order.type.value):
+            for metric in METRICS:
+                counters[counter_name(prefix, metric)] = values[metric]
+        return counters
+
+    @classmethod
+    def add_orders(
+        cls,
+        bot: str,
+        orders: list["ExecutedOrder"],
+        granularities: Optional[list[RollupGranularity]] = None,
+    ) -> None:
+        """
+        Add executed orders to the rollups of their day (and hour), skipping the ones the bucket already counted.
+        """
+        buckets: dict[tuple[RollupGranularity, datetime.datetime], list["ExecutedOrder"]] = {}
+        for order in orders:
+            for granularity in granularities or [RollupGranularity.DAY]:
+                buckets.setdefault((granularity, granularity.bucket_start(order.executed)), []).append(order)
+
+        table = cls._get_table(bot)
+        for (granularity, period), bucket_orders in buckets.items():
+            for start in range(0, len(bucket_orders), MAX_ORDERS_PER_UPDATE):
+                cls._add_to_bucket(table, granularity, period, bucket_orders[start : start + MAX_ORDERS_PER_UPDATE])
+
+    @classmethod
+    def _add_to_bucket(
+        cls, table, granularity: RollupGranularity, period: datetime.datetime, orders: list["ExecutedOrder"]
+    ) -> None:
+        bucket = cls.build_bucket(granularity, period)
+        while orders:
+            counters: dict[str, Decimal] = {}
+            for order in orders:
+                for name, value in cls.order_counters(order).items():
+                    counters[name] = counters.get(name, Decimal(0)) + value
+            order_ids = {order.order_id for order in orders}
+
+            expression_names = {"#granularity": "granularity", "#period": "period", f"#{COUNTED}": COUNTED}
+            expression_values: dict[str, Any] = {
+                ":granularity": granularity.value,
+                ":period": period.isoformat(),
+                f":{COUNTED}": order_ids,
+            }
+            add_parts = [f"#{COUNTED} :{COUNTED}"]
+            for name, value in counters.items():
+                expression_names[f"#{name}"] = name
+                expression_values[f":{name}"] = value
+                add_parts.append(f"#{name} :{name}")
+            update_expression = "SET #granularity = :granularity, #period = :period ADD " + ", ".join(add_parts)
+            conditions = [~Attr(COUNTED).contains(order_id) for order_id in sorted(order_ids)]
+            condition: "ConditionBase" = conditions[0]
+            for not_counted in conditions[1:]:
+                condition &= not_counted
+            try:
+                table.update_item(
+                    Key={cls.key_field(): bucket},
+                    UpdateExpression=update_expression,
+                    ExpressionAttributeNames=expression_names,
+                    ExpressionAttributeValues=expression_values,
+                    ConditionExpression=condition,
+                )
+                return
+            except Exception as e:
+                if not is_conditional_check_failed(e):
+                    raise RuntimeError(f"Failed to update {cls.__name__} {bucket} error={e}")
+            # some of the orders were added by a previous attempt, add the others
+            item = table.get_item(Key={cls.key_field(): bucket}, ConsistentRead=True).get("Item", {})
+            counted = set(item.get(COUNTED) or [])
+            orders = [order for order in orders if order.order_id not in counted]
+
+    @classmethod
+    def query_range(
+        cls,
+        bot: str,
+        from_date: datetime.datetime,
+        to_date: datetime.datetime,
+        granularity: RollupGranularity = RollupGranularity.DAY,
+    ) -> list["DbRollup"]:
+        """
+        Read the rollups of the buckets starting between `from_date` and `to_date` (both included) in one query.
+        """
+        table = cls._get_table(bot)
+        query_params = {
+            "IndexName": "granularity_period_index",
+            "KeyConditionExpression": Key("granularity").eq(granularity.value)
+            & Key("period").between(
+                granularity.bucket_start(from_date).isoformat(), granularity.bucket_start(to_date).isoformat()
+            ),
+            "ScanIndexForward": True,
+        }
+        data = []
+        while True:
+            response = table.query(**query_params)
+            data += [cls.from_db_item(item) for item in response.get("Items", [])]
+            if "LastEvaluatedKey" not in response:
+                return data
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
@@ -0,0 +1,174 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.config.storage import get_storage, list_table_names
+
+
+class IndexDiff(BaseModel):
+    table_name: str
+    to_create: list[dict] = []
+    to_delete: list[str] = []
+    # indexes on the table whose key schema or projection differ from the model, they must be deleted and created
+    to_replace: list[dict] = []
+
+    @property
+    def empty(self) -> bool:
+        return not self.to_create and not self.to_delete and not self.to_replace
+
+
+def bot_models() -> list:
+    from app.models.filled import DbFill
+    from app.models.order import DbExecutedOrder, Order
+    from app.models.rollup import DbRollup
+
+    return [Order, DbFill, DbExecutedOrder, DbRollup]
+
+
+class SchemaManager:
+    """
+    Creates and deletes the tables of the `Record` models, waiting for all of them in parallel.
+    """
+
+    def __init__(self, storage=None, max_workers: int = 8, index_poll_interval: float = 5):
+        self.storage = storage if storage is not None else get_storage()
+        self.max_workers = max_workers
+        self.index_poll_interval = index_poll_interval
+        self._tables: Optional[set[str]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self.storage.meta.client
+
+    def table_names(self, refresh: bool = False) -> set[str]:
+        with self._lock:
+            if self._tables is None or refresh:
+                self._tables = set(list_table_names(self.storage))
+            return set(self._tables)
+
+    def table_exists(self, table_name: str) -> bool:
+        return table_name in self.table_names()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._tables = None
+
+    def _wait(self, waiter_name: str, table_names: list[str]) -> None:
+        if not table_names:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(table_names))) as executor:
+            futures = [
+                executor.submit(self.client.get_waiter(waiter_name).wait, TableName=table_name)
+                for table_name in table_names
+            ]
+            for future in futures:
+                future.result()
+
+    def create_tables(self, models: list, bot: str | None = None) -> list[str]:
+        existing = self.table_names()
+        created = []
+        for model in models:
+            table_name = model.get_full_table_name(bot)
+            if table_name in existing or table_name in created:
+                continue
+            self.storage.create_table(**model.build_create_table_arguments(table_name))
+            created.append(table_name)
+
+        self._wait("table_exists", created)
+        with self._lock:
+            if self._tables is not None:
+                self._tables.update(created)
+        return created
+
+    def delete_tables(self, models: list, bot: str | None = None) -> list[str]:
+        existing = self.table_names()
+        deleted = []
+        for model in models:
+            table_name = model.get_full_table_name(bot)
+            if table_name not in existing or table_name in deleted:
+                continue
+            self.storage.Table(table_name).delete()
+            deleted.append(table_name)
+
+        self._wait("table_not_exists", deleted)
+        with self._lock:
+            if self._tables is not None:
+                self._tables.difference_update(deleted)
+        return deleted
+
+    def provision_bot(self, bot: str) -> list[str]:
+        return self.create_tables(bot_models(), bot)
+
+    @staticmethod
+    def _index_signature(index: dict) -> tuple:
+        projection = index.get("Projection", {})
+        return (
+            tuple((key["AttributeName"], key["KeyType"]) for key in index["KeySchema"]),
+            projection.get("ProjectionType", "ALL"),
+            tuple(sorted(projection.get("NonKeyAttributes", []))),
+        )
+
+    def diff_indexes(self, model, bot: str | None = None) -> IndexDiff:
+        table_name = model.get_full_table_name(bot)
+        table = self.client.describe_table(TableName=table_name)["Table"]
+        current = {index["IndexName"]: index for index in table.get("GlobalSecondaryIndexes", [])}
+        expected = {index["IndexName"]: index for index in model.get_index_definitions()}
+        return IndexDiff(
+            table_name=table_name,
+            to_create=[index for name, index in expected.items() if name not in current],
+            to_delete=sorted(current.keys() - expected.keys()),
+            to_replace=[
+                index
+                for name, index in expected.items()
+                if name in current and self._index_signature(current[name]) != self._index_signature(index)
+            ],
+        )
+
+    def _wait_for_indexes(self, table_name: str) -> None:
+        while True:
+            table = self.client.describe_table(TableName=table_name)["Table"]
+            statuses = [index.get("IndexStatus", "ACTIVE") for index in table.get("GlobalSecondaryIndexes", [])]
+            if table.get("TableStatus", "ACTIVE") == "ACTIVE" and all(status == "ACTIVE" for status in statuses):
+                return
+            time.sleep(self.index_poll_interval)
+
+    def apply_index_changes(self, model, bot: str | None = None, prune: bool = False) -> IndexDiff:
+        """
+        Create the missing indexes of the model, returns the differences found.
+        """
+        diff = self.diff_indexes(model, bot)
+        to_delete, to_create = [], diff.to_create
+        # stale or changed indexes only go with `prune`, the code deployed may still query them
+        if prune:
+            to_delete = diff.to_delete + [index["IndexName"] for index in diff.to_replace]
+            to_create = diff.to_replace + diff.to_create
+        # DynamoDB accepts a single GSI creation or deletion per UpdateTable call
+        for index_name in to_delete:
+            self.client.update_table(
+                TableName=diff.table_name, GlobalSecondaryIndexUpdates=[{"Delete": {"IndexName": index_name}}]
+            )
+            self._wait_for_indexes(diff.table_name)
+        for index in to_create:
+            self.client.update_table(
+                TableName=diff.table_name,
+                AttributeDefinitions=model.get_attribute_definitions(),
+                GlobalSecondaryIndexUpdates=[{"Create": index}],
+            )
+            self._wait_for_indexes(diff.table_name)
+        return diff
+
+
+_managers: dict = {}
+_managers_lock = threading.Lock()
+
+
+def get_schema_manager(storage=None) -> SchemaManager:
+    storage = storage if storage is not None else get_storage()
+    with _managers_lock:
+        if id(storage) not in _managers or _managers[id(storage)].storage is not storage:
+            _managers[id(storage)] = SchemaManager(storage)
+        return _managers[id(storage)]
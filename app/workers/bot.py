@@ -1,10 +1,16 @@
-import time
+from typing import Optional
 
+from app.bots.bot import Bot
+from app.common.clock import get_clock
 
-def run():
+
+def run(bot: Optional[Bot] = None, interval: float = 5):
+    if bot is not None:
+        bot.loop(interval=interval)
+        return
     while True:
         print("Bot is running")
-        time.sleep(5)
+        get_clock().sleep(interval)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+"""
+Offline microbenchmarks of the hot paths of the bot, run them with `python -m benchmarks.run`.
+"""
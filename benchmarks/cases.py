@@ -0,0 +1,194 @@
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+import numpy as np
+
+from app.api.client.coinex import CoinexClient
+from app.common.common import rnd
+from app.common.ticks import convert_text_file
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals, Pair
+from app.models.common import clean_dict
+from app.models.enums import OrderStatus, OrderType
+from app.models.filled import Fill
+from app.models.order import Order
+from app.models.price import Price
+from benchmarks.suite import benchmark
+from tests.fake_exchange.coinex import CoinexFakeExchange
+from tests.fake_exchange.db import Db
+
+TICKS = 200_000
+
+
+def _config() -> Config:
+    return Config(
+        label="ADA1",
+        exchange="coinex",
+        pair="ADA/USDT",
+        decimals=ExchangeDecimals(pairs={"ADAUSDT": Pair(amount=6, price=4)}),
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("0"),
+    )
+
+
+def _order(order_id: int = 1, price: str = "0.3512") -> Order:
+    return Order(
+        order_id=str(order_id),
+        created=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        executed=None,
+        type=OrderType.BUY,
+        buy_price=Decimal(price),
+        sell_price=Decimal("0.3601"),
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal("152.341"),
+        fills=[],
+        benefit=None,
+        market="ADAUSDT",
+    )
+
+
+COINEX_ORDER = {
+    "order_id": 13400,
+    "market": "ADAUSDT",
+    "market_type": "SPOT",
+    "side": "buy",
+    "type": "limit",
+    "amount": "152.341",
+    "price": "0.35127",
+    "created_at": 1704067200000,
+}
+
+COINEX_DEAL = {
+    "deal_id": 3514376759,
+    "order_id": 13400,
+    "market": "ADAUSDT",
+    "side": "buy",
+    "price": "0.3512",
+    "amount": "76.1705",
+    "created_at": 1704067200000,
+}
+
+
+@benchmark("common.rnd")
+def _rnd():
+    value = Decimal("0.351234567")
+    return lambda: rnd(value, 4)
+
+
+@benchmark("config.rnd_price")
+def _rnd_price():
+    config, value = _config(), Decimal("0.351234567")
+    return lambda: config.rnd_price(value)
+
+
+@benchmark("config.rnd_amount")
+def _rnd_amount():
+    config, value = _config(), Decimal("152.3412345678")
+    return lambda: config.rnd_amount(value)
+
+
+@benchmark("common.clean_dict")
+def _clean_dict():
+    data = dict(_order().__dict__, fills=[{"price": Decimal("0.35"), "date": None}], extra={"nested": Decimal(1)})
+    return lambda: clean_dict(data)
+
+
+@benchmark("order.model_dump")
+def _model_dump():
+    order = _order()
+    return order.model_dump
+
+
+@benchmark("order.create_from_db")
+def _create_from_db():
+    item = _order().model_dump()
+    return lambda: Order.create_from_db(item)
+
+
+@benchmark("order.create_from_coinex")
+def _create_from_coinex():
+    config = _config()
+    return lambda: Order.create_from_coinex(config, COINEX_ORDER)
+
+
+@benchmark("fill.from_coinex")
+def _fill_from_coinex():
+    return lambda: Fill.from_coinex(COINEX_DEAL)
+
+
+@benchmark("client.sign_v2")
+def _sign_v2():
+    client = CoinexClient(access_id="key", secret="secret")
+    params = {"market": "ADAUSDT", "market_type": "SPOT", "start_time": 1704067200000}
+    return lambda: client._sign_v2(
+        method="GET", url="spot/user-deals", timestamp=1704067200000, page=1, limit=100, **params
+    )
+
+
+@benchmark("client.join_params")
+def _join_params():
+    client = CoinexClient(access_id="key", secret="secret")
+    params = {"market": "ADAUSDT", "market_type": "SPOT", "side": "buy", "amount": "152.341", "price": "0.3512"}
+    return lambda: client._join_params(params)
+
+
+def _check_buy_orders(count: int, fixed: bool):
+    config = _config()
+    db = Db()
+    db.reset(config=config, fixed=fixed)
+    db.increase_balance("USDT", Decimal(10**9))
+    db.increase_balance("ADA", Decimal(0))
+    price = Price(price=Decimal("0.5"), date=datetime.datetime(2024, 1, 1))
+    for i in range(count):
+        buy_price = config.spec.round_price(Decimal("0.3") - Decimal(i) / 10**6)
+        db.add_buy_order(_order(i, price=str(buy_price)), price)
+    # a tick that crosses none of the orders, the cost paid on almost every tick
+    return lambda: db.check_buy_orders("ADAUSDT", Decimal("0.4"))
+
+
+for _count in (100, 10_000):
+    for _fixed in (False, True):
+        benchmark(f"db.check_buy_orders[{_count}{',fixed' if _fixed else ''}]")(
+            lambda count=_count, fixed=_fixed: _check_buy_orders(count, fixed)
+        )
+
+
+def _price_folder(binary: bool) -> tempfile.TemporaryDirectory:
+    # a random walk where most ticks repeat the previous price, like the agg trades
+    folder = tempfile.TemporaryDirectory()
+    rng = np.random.default_rng(1)
+    steps = np.where(rng.random(TICKS) < 0.2, rng.integers(-2, 3, size=TICKS), 0)
+    prices = 3500 + np.cumsum(steps)
+    start = datetime.datetime(2024, 1, 1)
+    path = os.path.join(folder.name, "2024_01_ADAUSDT.txt")
+    with open(path, "w") as file:
+        for i, price in enumerate(prices.tolist()):
+            file.write(f"{(start + datetime.timedelta(seconds=i)).isoformat()},{price / 10**4:.4f}\n")
+    if binary:
+        convert_text_file(path)
+        os.remove(path)
+    return folder
+
+
+def _get_current_price(binary: bool):
+    folder = _price_folder(binary)
+    with contextlib.redirect_stdout(io.StringIO()):
+        exchange = CoinexFakeExchange(db=Db(), prices_folder=folder.name)
+        exchange.set_config(_config())
+    end = TICKS - 1000
+
+    def get_current_price():
+        # the folder lives as long as the benchmark
+        if folder and exchange.index >= end:
+            exchange.index = 0
+        return exchange.get_current_price()
+
+    return get_current_price
+
+
+benchmark("fake_exchange.get_current_price[text]")(lambda: _get_current_price(False))
+benchmark("fake_exchange.get_current_price[ticks]")(lambda: _get_current_price(True))
@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+
+from benchmarks import cases  # noqa: F401
+from benchmarks.suite import compare, format_time, load, run, save, select
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results")
+
+# Create the parser
+parser = argparse.ArgumentParser(description="Run the microbenchmarks and compare them with the baseline.")
+parser.add_argument("-k", "--filter", type=str, default=None, help="Only the benchmarks with this text in their name")
+parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark, the best one is kept")
+parser.add_argument("--number", type=int, default=None, help="Calls per round (default: rounds of at least 0.2s)")
+parser.add_argument("--output", type=str, default=os.path.join(RESULTS, "latest.json"), help="Results file")
+parser.add_argument("--baseline", type=str, default=os.path.join(RESULTS, "baseline.json"), help="Baseline file")
+parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown allowed before failing (0.2 = 20%%)")
+parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+
+# Parse arguments
+args = parser.parse_args()
+
+names = select(args.filter)
+if not names:
+    sys.exit(f"No benchmarks match {args.filter}")
+
+baseline = load(args.baseline)
+width = max(len(name) for name in names)
+
+
+def print_result(name, timing):
+    line = f"{name.ljust(width)}  {format_time(timing.best):>10}  (median {format_time(timing.median)})"
+    if name in baseline:
+        line += f"  {timing.best / baseline[name].best:6.2f}x baseline"
+    print(line, flush=True)
+
+
+results = run(names, repeat=args.repeat, number=args.number, on_result=print_result)
+save(args.output, results)
+print(f"results written to {args.output}")
+
+if args.save_baseline:
+    save(args.baseline, {**baseline, **results})
+    print(f"baseline written to {args.baseline}")
+    sys.exit(0)
+
+regressions = compare(results, baseline, args.threshold)
+for regression in regressions:
+    print(
+        f"REGRESSION {regression.name}: {format_time(regression.current)} vs {format_time(regression.baseline)} "
+        f"({regression.ratio:.2f}x)"
+    )
+sys.exit(1 if regressions else 0)
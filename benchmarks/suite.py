@@ -0,0 +1,104 @@
+"""
+Registry, timing and baseline comparison of the benchmarks.
+"""
+
+import datetime
+import json
+import os
+import platform
+import statistics
+import timeit
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+
+BENCHMARKS: dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    # decorates a setup function, it returns the callable to time
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        if name in BENCHMARKS:
+            raise ValueError(f"Duplicated benchmark: {name}")
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+class Timing(BaseModel):
+    best: float
+    median: float
+    number: int
+    repeat: int
+
+
+class Regression(BaseModel):
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+
+def select(pattern: Optional[str] = None) -> list[str]:
+    return [name for name in BENCHMARKS if not pattern or pattern in name]
+
+
+def measure(name: str, repeat: int = 5, number: Optional[int] = None) -> Timing:
+    timer = timeit.Timer(BENCHMARKS[name]())
+    # rounds of at least 0.2s, in seconds per call
+    if number is None:
+        number, _ = timer.autorange()
+    rounds = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return Timing(best=min(rounds), median=statistics.median(rounds), number=number, repeat=repeat)
+
+
+def run(names: list[str], repeat: int = 5, number: Optional[int] = None, on_result=None) -> dict[str, Timing]:
+    results = {}
+    for name in names:
+        results[name] = measure(name, repeat=repeat, number=number)
+        if on_result is not None:
+            on_result(name, results[name])
+    return results
+
+
+def compare(results: dict[str, Timing], baseline: dict[str, Timing], threshold: float = 0.2) -> list[Regression]:
+    """
+    The benchmarks slower than the baseline by more than `threshold`, comparing the best times.
+    """
+    return [
+        Regression(name=name, baseline=baseline[name].best, current=timing.best)
+        for name, timing in results.items()
+        if name in baseline and timing.best > baseline[name].best * (1 + threshold)
+    ]
+
+
+def save(path: str, results: dict[str, Timing]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": {name: timing.model_dump() for name, timing in results.items()},
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2)
+        file.write("\n")
+
+
+def load(path: str) -> dict[str, Timing]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        data = json.load(file)
+    return {name: Timing(**timing) for name, timing in data.get("benchmarks", {}).items()}
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
@@ -0,0 +1,44 @@
+import argparse
+import os
+from typing import Optional
+
+from app.common.ticks import EXTENSION, TickFile, convert_text_file, write_change_index
+
+# Create the parser
+parser = argparse.ArgumentParser(
+    description="Convert the price files of download.py to memory-mapped tick files, with their change index."
+)
+parser.add_argument(
+    "paths",
+    nargs="+",
+    type=str,
+    help="Text files or folders with {year}_{month}_{pair}.txt files, .ticks files only get their change index rebuilt",
+)
+parser.add_argument("--decimals", type=int, default=None, help="Price decimals (default: the most found in the file)")
+parser.add_argument(
+    "--output-dir", type=str, default=None, help="Where to write the tick files (default: next to them)"
+)
+
+# Parse arguments
+args = parser.parse_args()
+
+files = []
+for path in args.paths:
+    if os.path.isdir(path):
+        files += [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".txt")]
+    else:
+        files.append(path)
+
+for path in files:
+    if path.endswith(EXTENSION):
+        ticks = TickFile(path)
+        output = write_change_index(path)
+        print(f"{path} -> {output}: {len(ticks.changes)} price changes in {len(ticks)} ticks")
+        continue
+    target: Optional[str] = None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        target = os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0] + EXTENSION)
+    output = convert_text_file(path, target, decimals=args.decimals)
+    ticks = TickFile(output)
+    print(f"{path} -> {output}: {len(ticks)} ticks, {len(ticks.changes)} price changes, {ticks.decimals} decimals")
@@ -0,0 +1,54 @@
+import argparse
+
+from app.config.config import DbConfig
+from app.config.dynamodb import get_dynamodb
+from app.config.sqlite import SqliteResource
+from app.config.storage import copy_table, list_table_names
+from app.models.order import DbExecuted
+from app.models.schema import bot_models
+
+# Create the parser
+parser = argparse.ArgumentParser(description="Copy the bot tables between DynamoDB and SQLite.")
+
+# Define subcommands
+subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+# Subcommand: export
+export_parser = subparsers.add_parser("export", help="Copy the tables from DynamoDB to SQLite")
+export_parser.add_argument("--sqlite-path", required=True, type=str, help="The SQLite database file")
+export_parser.add_argument("--bot", action="append", default=[], type=str, help="The bot label (repeatable)")
+export_parser.add_argument("--skip-config", action="store_true", help="Don't copy the config table")
+
+# Subcommand: import
+import_parser = subparsers.add_parser("import", help="Copy the tables from SQLite to DynamoDB")
+import_parser.add_argument("--sqlite-path", required=True, type=str, help="The SQLite database file")
+import_parser.add_argument("--bot", action="append", default=[], type=str, help="The bot label (repeatable)")
+import_parser.add_argument("--skip-config", action="store_true", help="Don't copy the config table")
+
+# Parse arguments
+args = parser.parse_args()
+
+if args.command not in ("export", "import"):
+    print("Invalid command. Use --help for usage information.")
+    raise SystemExit(1)
+
+sqlite = SqliteResource(args.sqlite_path)
+source, target = (get_dynamodb(), sqlite) if args.command == "export" else (sqlite, get_dynamodb())
+
+tables = []
+if not args.skip_config:
+    tables.append((DbConfig, None))
+for bot in args.bot:
+    tables += [(model, bot) for model in bot_models() + [DbExecuted]]
+
+source_tables = list_table_names(source)
+copied_tables = set()
+for model, bot in tables:
+    table_name = model.get_full_table_name(bot)
+    if table_name in copied_tables or table_name not in source_tables:
+        # DbFill is shared by all the bots, the legacy executed table only exists for old bots
+        continue
+    print(f"Copying {table_name}...")
+    copied = copy_table(source, target, table_name, model.build_create_table_arguments(table_name))
+    copied_tables.add(table_name)
+    print(f"{table_name}: {copied} items copied")
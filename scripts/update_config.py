@@ -1,6 +1,8 @@
 import argparse
 
 from app.config.config import DbConfig
+from app.models.order import Order
+from app.models.schema import bot_models, get_schema_manager
 
 # Create the parser
 parser = argparse.ArgumentParser(description="Manage trading bot operations.")
@@ -12,6 +14,21 @@ subparsers = parser.add_subparsers(dest="command", help="Available commands")
 create_table_parser = subparsers.add_parser("create-table", help="Create the config table")
 # No additional arguments required
 
+# Subcommand: provision-bot
+provision_bot_parser = subparsers.add_parser("provision-bot", help="Create the tables of a bot and sync their indexes")
+provision_bot_parser.add_argument("--label", required=True, type=str, help="The label for the bot")
+provision_bot_parser.add_argument(
+    "--prune", action="store_true", help="Also delete the indexes no longer declared and recreate the changed ones"
+)
+
+# Subcommand: shard-orders
+shard_orders_parser = subparsers.add_parser(
+    "shard-orders",
+    help="Replace the orderStatus index with the sharded one (ORDER_STATUS_SHARDS): create it, backfill the orders and "
+    "drop the old index",
+)
+shard_orders_parser.add_argument("--label", required=True, type=str, help="The label for the bot")
+
 # Subcommand: add-bot
 add_bot_parser = subparsers.add_parser("add-bot", help="Add a new trading bot")
 add_bot_parser.add_argument("--label", required=True, type=str, help="The label for the bot")
@@ -21,6 +38,14 @@ add_bot_parser.add_argument("--min_buy_amount_usdt", required=True, type=float,
 
 # Subcommand: list-bots
 list_bots_parser = subparsers.add_parser("list-bots", help="List all trading bots")
+list_bots_parser.add_argument(
+    "--segments", default=4, type=int, help="Parallel scan segments when the table has no kind index"
+)
+
+# Subcommand: index-bots
+index_bots_parser = subparsers.add_parser(
+    "index-bots", help="Create the kind index of the config table and tag the bots"
+)
 
 # Subcommand: delete-bot
 delete_bot_parser = subparsers.add_parser("delete-bot", help="Delete a trading bot")
@@ -75,6 +100,38 @@ if args.command == "create-table":
     print("Creating the database table...")
     DbConfig.create_table()
 
+elif args.command == "provision-bot":
+    print(f"Provisioning tables for bot: {args.label}")
+    schema = get_schema_manager()
+    created = schema.provision_bot(args.label)
+    print(f"Created tables: {created}")
+    for model in bot_models():
+        diff = schema.apply_index_changes(model, args.label, prune=args.prune)
+        if diff.empty:
+            continue
+        replaced = [index["IndexName"] for index in diff.to_replace]
+        if args.prune:
+            print(
+                f"{diff.table_name}: created {[index['IndexName'] for index in diff.to_create]}, "
+                f"deleted {diff.to_delete}, replaced {replaced}"
+            )
+        else:
+            print(f"{diff.table_name}: created {[index['IndexName'] for index in diff.to_create]}")
+            if diff.to_delete or replaced:
+                print(f"{diff.table_name}: run with --prune to delete {diff.to_delete} and replace {replaced}")
+
+elif args.command == "shard-orders":
+    if Order.status_shards() == 0:
+        print("ORDER_STATUS_SHARDS is not set")
+        raise SystemExit(1)
+    print(f"Sharding the orderStatus index of bot: {args.label} in {Order.status_shards()} shards")
+    schema = get_schema_manager()
+    diff = schema.apply_index_changes(Order, args.label)
+    print(f"{diff.table_name}: created {[index['IndexName'] for index in diff.to_create]}")
+    print(f"Backfilled orders: {Order.backfill_status_shards(args.label)}")
+    diff = schema.apply_index_changes(Order, args.label, prune=True)
+    print(f"{diff.table_name}: deleted {diff.to_delete}")
+
 elif args.command == "add-bot":
     print(f"Adding bot with label: {args.label}")
     print(f"Trading pair: {args.pair}")
@@ -87,13 +144,18 @@ elif args.command == "add-bot":
 
 elif args.command == "list-bots":
     print("Listing all trading bots...")
-    bots = DbConfig.get_all_bots()
-    for bot in bots:
+    for bot in DbConfig.iter_bots(args.segments):
         print(f"{'- ' * 50}")
         print(f"Bot: {bot.key}")
         for cfg in bot.values:
             print(f"{cfg.name} -> {cfg.value}")
 
+elif args.command == "index-bots":
+    print("Creating the kind index of the config table...")
+    diff = get_schema_manager().apply_index_changes(DbConfig)
+    print(f"{diff.table_name}: created {[index['IndexName'] for index in diff.to_create]}")
+    print(f"Tagged bots: {DbConfig.backfill_kind()}")
+
 elif args.command == "delete-bot":
     print(f"Deleting bot with label: {args.label}")
     DbConfig.delete_bot(args.label)
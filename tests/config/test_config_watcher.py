@@ -0,0 +1,81 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from app.bots.bot import Bot
+from app.common.clock import SimulatedClock, use_clock
+from app.config.config import Config, DbConfig, get_config_loader
+from app.config.watcher import ConfigWatcher
+
+
+def test_watcher_publishes_changes(load_db_config):
+    watcher = ConfigWatcher()
+    bot = Bot("ADA1", "coinex", watcher=watcher)
+    config = bot.config
+    assert watcher.poll() == []
+
+    DbConfig.add_bot_config("ADA1", key="min_buy_amount_usdt", value="300")
+    [diff] = watcher.poll()
+    assert diff.label == "ADA1"
+    assert diff.changed == {"min_buy_amount_usdt": (Decimal("200"), Decimal("300"))}
+
+    # swapped between iterations only
+    assert bot.config is config
+    with use_clock(SimulatedClock(datetime.datetime(2024, 1, 1))) as clock:
+        bot.loop(interval=5, iterations=2)
+    assert clock.slept == 10
+    assert bot.config.min_buy_amount_usdt == Decimal("300")
+    assert bot.apply_pending_config() is False
+    assert watcher.poll() == []
+
+
+def test_watcher_detects_shared_items_changes(load_db_config):
+    watcher = ConfigWatcher()
+    bot = Bot("ADA1", "coinex", watcher=watcher)
+    watcher.poll()
+
+    DbConfig.add_decimals_config("coinex", pairs=[{"ADAUSDT": {"amount": 4, "price": 2}}])
+    DbConfig.add_secrets([{"ADA1-coinex-secret-key": "new-secret"}])
+    [diff] = watcher.poll()
+    assert set(diff.changed) == {"decimals", "client"}
+    assert diff.changed["client"] == ("***", "***")
+
+    bot.loop(interval=0, iterations=1)
+    assert bot.config.rnd_price(Decimal("0.1234")) == Decimal("0.13")
+    assert bot.config.client.secret == "new-secret"
+
+
+def test_watcher_survives_a_deleted_bot(load_db_config):
+    watcher = ConfigWatcher()
+    bot = Bot("ADA1", "coinex", watcher=watcher)
+    DbConfig.add_bot("ADA2", pair="ADA/USDT", exchange="coinex", min_buy_amount_usdt=200)
+    DbConfig.add_secrets([{"ADA2-coinex-access-key": "key"}, {"ADA2-coinex-secret-key": "secret"}])
+    get_config_loader().invalidate()
+    other = Bot("ADA2", "coinex", watcher=watcher)
+    watcher.poll()
+
+    DbConfig.delete_bot("ADA2")
+    DbConfig.add_bot_config("ADA1", key="min_buy_amount_usdt", value="300")
+    [diff] = watcher.poll()
+    assert diff.label == "ADA1"
+    assert other.config.min_buy_amount_usdt == Decimal("200")
+    assert watcher.poll() == []
+    bot.loop(interval=0, iterations=1)
+    assert bot.config.min_buy_amount_usdt == Decimal("300")
+
+
+def test_watcher_retries_a_failed_reload(load_db_config):
+    watcher = ConfigWatcher()
+    bot = Bot("ADA1", "coinex", watcher=watcher)
+    watcher.poll()
+
+    DbConfig.add_bot_config("ADA1", key="min_buy_amount_usdt", value="300")
+    with mock.patch.object(Config, "create_from_db_configs", side_effect=RuntimeError("unavailable")):
+        assert watcher.poll() == []
+    assert watcher._configs["ADA1"].min_buy_amount_usdt == Decimal("200")
+
+    # the version wasn't recorded, the next poll applies the change
+    [diff] = watcher.poll()
+    assert diff.changed == {"min_buy_amount_usdt": (Decimal("200"), Decimal("300"))}
+    bot.loop(interval=0, iterations=1)
+    assert bot.config.min_buy_amount_usdt == Decimal("300")
@@ -1,7 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+
 import pytest
 
-from app.config.config import DbConfig
+from app.config.config import Config, ConfigLoader, DbConfig
 from app.config.dynamodb import get_dynamodb
+from app.models.schema import get_schema_manager
 
 
 @pytest.fixture
@@ -64,3 +69,98 @@ def test_get_all_bots(create_table):
     )
     bots = DbConfig.get_all_bots()
     assert len(bots) == 3
+
+
+def test_batch_from_db(create_table):
+    DbConfig.add_bot("ADA1", pair="ADA/USDT", exchange="coinex", min_buy_amount_usdt=200)
+    DbConfig.add_secrets([{"key1": "value1"}])
+    configs = DbConfig.batch_from_db(["bot_ADA1", "secrets", "bot_MISSING"])
+    assert configs["bot_ADA1"].pair == "ADA/USDT"
+    assert configs["secrets"].get_secret("key1") == "value1"
+    assert configs["bot_MISSING"].values == []
+
+
+def test_config_loader(load_db_config):
+    for ccy in ["ETH", "BTC"]:
+        DbConfig.add_bot(f"{ccy}1", pair=f"{ccy}/USDT", exchange="coinex", min_buy_amount_usdt=200)
+        DbConfig.add_secrets([{f"{ccy}1-coinex-access-key": "key"}, {f"{ccy}1-coinex-secret-key": "secret"}])
+    loader = ConfigLoader(ttl=60)
+    storage = get_dynamodb()
+    with mock.patch.object(storage, "batch_get_item", wraps=storage.batch_get_item) as batch_get_item:
+        config = loader.load("ADA1")
+        assert batch_get_item.call_count == 1
+        assert config.client.key == "test-key"
+        assert config.rnd_price("0.123456") == Decimal("0.1235")
+
+        # the shared items are cached, only the bot items are read
+        configs = loader.load_many(["ETH1", "BTC1"])
+        assert batch_get_item.call_count == 2
+        assert batch_get_item.call_args.kwargs["RequestItems"]["config"]["Keys"] == [
+            {"key": "bot_ETH1"},
+            {"key": "bot_BTC1"},
+        ]
+        assert configs["BTC1"].pair == "BTC/USDT"
+
+        loader.invalidate()
+        loader.load("ADA1")
+        assert batch_get_item.call_count == 3
+
+
+def test_config_loader_shares_in_flight_reads(load_db_config):
+    loader = ConfigLoader(ttl=60)
+    with mock.patch.object(DbConfig, "batch_from_db", wraps=DbConfig.batch_from_db) as batch_from_db:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            configs = list(executor.map(lambda _: loader.load("ADA1"), range(8)))
+    assert all(config == configs[0] for config in configs)
+    read_keys = [key for call in batch_from_db.call_args_list for key in call.args[0] if key != "bot_ADA1"]
+    assert sorted(read_keys) == ["decimals_binance", "decimals_coinex", "secrets"]
+
+
+def test_load_config_from_db_config(load_db_config):
+    config = Config.load_config_from_db_config("ADA1")
+    assert config.exchange == "coinex"
+    assert config.client.secret == "test-secret-key"
+
+
+def test_iter_bots_scan(create_table):
+    for i in range(30):
+        DbConfig.add_bot(f"BOT{i:02}", pair="ADA/USDT", exchange="coinex", min_buy_amount_usdt=200)
+    DbConfig.add_secrets([{"key1": "value1"}])
+    get_schema_manager().client.update_table(
+        TableName="config", GlobalSecondaryIndexUpdates=[{"Delete": {"IndexName": "kind_key_index"}}]
+    )
+    assert not DbConfig.has_kind_index()
+
+    table = get_dynamodb().Table("config")
+    with (
+        mock.patch.object(get_dynamodb(), "Table", return_value=table),
+        mock.patch.object(table, "scan", wraps=table.scan) as scan,
+        mock.patch.object(DbConfig, "from_db") as from_db,
+    ):
+        bots = list(DbConfig.iter_bots(total_segments=3))
+    assert sorted(bot.key for bot in bots) == [f"bot_BOT{i:02}" for i in range(30)]
+    assert bots[0].exchange == "coinex"
+    assert {call.kwargs["Segment"] for call in scan.call_args_list} == {0, 1, 2}
+    from_db.assert_not_called()
+
+
+def test_iter_bots_query(create_table):
+    for ccy in ["ADA", "ETH"]:
+        DbConfig.add_bot(f"{ccy}1", pair=f"{ccy}/USDT", exchange="coinex", min_buy_amount_usdt=200)
+    DbConfig.add_secrets([{"key1": "value1"}])
+    assert DbConfig.has_kind_index()
+    table = get_dynamodb().Table("config")
+    with (
+        mock.patch.object(get_dynamodb(), "Table", return_value=table),
+        mock.patch.object(table, "scan") as scan,
+    ):
+        assert [bot.key for bot in DbConfig.iter_bots()] == ["bot_ADA1", "bot_ETH1"]
+    scan.assert_not_called()
+
+
+def test_backfill_kind(create_table):
+    table = get_dynamodb().Table("config")
+    table.put_item(Item={"key": "bot_OLD1", "values": [{"name": "pair", "value": "ADA/USDT"}]})
+    assert DbConfig.get_all_bots() == []
+    assert DbConfig.backfill_kind() == 1
+    assert [bot.pair for bot in DbConfig.get_all_bots()] == ["ADA/USDT"]
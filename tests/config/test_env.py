@@ -0,0 +1,39 @@
+import os
+from unittest import mock
+
+import pytest
+from dotenv import load_dotenv
+
+from app.config import env
+
+load_dotenv("configurations/test/.env-tests")
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    path = tmp_path / ".env"
+    path.write_text("ENV_TEST_FROM_FILE=file\nENV_TEST_SET_BY_PROCESS=file\n")
+    monkeypatch.setenv("ENV_FILE_PATH", str(path))
+    monkeypatch.setattr(env, "_loaded", None)
+    yield path
+    for name in ("ENV_TEST_FROM_FILE", "ENV_TEST_SET_BY_PROCESS"):
+        os.environ.pop(name, None)
+
+
+def test_process_variables_win(env_file):
+    os.environ["ENV_TEST_SET_BY_PROCESS"] = "process"
+    env.load_env()
+    assert os.environ["ENV_TEST_FROM_FILE"] == "file"
+    assert os.environ["ENV_TEST_SET_BY_PROCESS"] == "process"
+    os.environ["ENV_TEST_FROM_FILE"] = "changed"
+    env.load_env()
+    assert os.environ["ENV_TEST_FROM_FILE"] == "changed"
+
+
+def test_reloaded_after_a_patched_environment(env_file):
+    with mock.patch.dict(os.environ):
+        env.load_env()
+        assert os.environ["ENV_TEST_FROM_FILE"] == "file"
+    assert "ENV_TEST_FROM_FILE" not in os.environ
+    env.load_env()
+    assert os.environ["ENV_TEST_FROM_FILE"] == "file"
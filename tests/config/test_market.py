@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+import pytest
+
+from app.common.common import rnd
+from app.common.fixed import from_fixed, rescale, round_up_div, to_fixed
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals, MarketDecimalsUndefined
+from app.config.market import MarketSpec
+
+
+@pytest.fixture
+def config():
+    return Config(
+        label="ADA1",
+        exchange="coinex",
+        pair="ADA/USDT",
+        decimals=ExchangeDecimals(pairs={"ADAUSDT": {"amount": 6, "price": 4}}),
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("200"),
+    )
+
+
+def test_market_spec():
+    spec = MarketSpec.create("ada/usdt", price_decimals=4, amount_decimals=0)
+    assert (spec.base, spec.quote, spec.market) == ("ADA", "USDT", "ADAUSDT")
+    assert spec.tick_size == Decimal("0.0001")
+    assert spec.step_size == Decimal("1")
+    assert spec.round_amount("10.2") == Decimal("11")
+    assert spec.round_quote(Decimal("1.001")) == Decimal("1.01")
+    assert spec.round_base(Decimal("0.000000001")) == Decimal("0.00000001")
+
+
+@pytest.mark.parametrize("value", [Decimal("0.123456789"), "0.12341", 0.1, 3, Decimal("7"), 1e-7, Decimal("-0.00015")])
+def test_same_rounding_as_rnd(value):
+    spec = MarketSpec.create("ADA/USDT", price_decimals=4, amount_decimals=6)
+    assert spec.round_price(value) == rnd(value, 4)
+    assert spec.round_amount(value, cls=float) == rnd(value, 6, cls=float)
+    assert str(spec.round_price(value)) == str(rnd(value, 4))
+
+
+def test_batch_rounding():
+    spec = MarketSpec.create("ADA/USDT", price_decimals=4, amount_decimals=6)
+    prices = [Decimal("0.5") + Decimal("0.000037") * i for i in range(100)]
+    assert spec.round_prices(prices) == [rnd(price, 4) for price in prices]
+    assert spec.round_amounts(["1.0000001", 2], cls=float) == [1.000001, 2.0]
+
+
+def test_config_spec(config):
+    assert config.spec is config.spec
+    assert config.market == "ADAUSDT"
+    assert config.rnd_price(Decimal("0.123456"), cls=float) == Decimal("0.1235")
+    assert config.rnd_amount("1.0000001", cls=float) == 1.000001
+    assert config.rnd_amount_by_ccy(Decimal("1.001"), "USDT") == Decimal("1.01")
+    assert config.rnd_amount_by_ccy(Decimal("1.0000000001"), "ADA") == Decimal("1.00000001")
+
+
+def test_undefined_decimals():
+    with pytest.raises(MarketDecimalsUndefined):
+        MarketSpec("ADA", "USDT", price_decimals=None, amount_decimals=6)
+
+
+@pytest.mark.parametrize(
+    "amount, price", [("10.123456", "0.3333"), ("1", "1"), ("0.000001", "0.0001"), ("250.5", "1.2345")]
+)
+def test_fixed_point(amount, price):
+    spec = MarketSpec.create("ADA/USDT", price_decimals=4, amount_decimals=6)
+    amount_i, price_i = spec.amount_to_fixed(amount), spec.price_to_fixed(price)
+    assert spec.fixed_to_amount(amount_i) == Decimal(amount)
+    assert spec.fixed_to_price(price_i) == Decimal(price)
+    assert spec.fixed_quote(amount_i, price_i) == to_fixed(spec.round_quote(Decimal(amount) * Decimal(price)), 2)
+    assert spec.fixed_base(amount_i) == to_fixed(spec.round_base(Decimal(amount)), 8)
+
+
+def test_fixed_helpers():
+    assert to_fixed(Decimal("1.001"), 2) == 101
+    assert to_fixed(Decimal("-1.001"), 2) == -101
+    assert from_fixed(101, 2) == Decimal("1.01")
+    assert rescale(12345, 4, 2) == 124
+    assert rescale(-12345, 4, 2) == -124
+    assert rescale(123, 2, 4) == 12300
+    assert round_up_div(7, 7) == 1
@@ -2,33 +2,37 @@ import datetime
 import os
 import signal
 import time
-from decimal import Decimal
 from threading import Thread
+from typing import Optional
 from unittest import mock
 
 import pytest
 import requests
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from app.api.client.coinex import CoinexClient
 from app.api.coinex import CoinexApi
-from app.config.config import Config, DbConfig
-from app.models.enums import OrderStatus, OrderType
-from app.models.filled import DbFill
-from app.models.order import DbExecuted, Order
+from app.config.config import Config, DbConfig, get_config_loader
+from app.models.schema import bot_models, get_schema_manager
+from tests.fake_exchange import transport
 from tests.fake_exchange.coinex import (
     SpotCancelOrderRequest,
     SpotLimitOrderRequest,
     SpotMarketOrderRequest,
 )
 from tests.fake_exchange.models import OrderPendingResponse
+from tests.fake_exchange.multi import MultiMarketExchange
+from tests.fake_exchange.transport import FakeExchangeTransport
 
 load_dotenv("configurations/test/.env-tests")
 
 app = FastAPI()
 
+# the simulation answering the endpoints instead of the single market fake exchange (see the `simulation` fixture)
+_simulation: Optional[MultiMarketExchange] = None
+
 
 class CoinexClientTest(CoinexClient):
     BASE_URL = "http://127.0.0.1:50001/"
@@ -43,12 +47,11 @@ def create_config():
 
 @pytest.fixture(autouse=True)
 def new_tables():
-    for _cls in [Order, DbFill, DbExecuted]:
-        _cls.delete_table("ADA1")
-        _cls.create_table("ADA1")
+    schema = get_schema_manager()
+    schema.delete_tables(bot_models(), "ADA1")
+    schema.create_tables(bot_models(), "ADA1")
     yield
-    for _cls in [Order, DbFill, DbExecuted]:
-        _cls.delete_table("ADA1")
+    schema.delete_tables(bot_models(), "ADA1")
 
 
 @pytest.fixture
@@ -59,6 +62,12 @@ def coinex_api(get_coinex_client) -> CoinexApi:
     return coinex_api
 
 
+@pytest.fixture
+def in_process_coinex_api() -> CoinexApi:
+    # same exchange as the test server, without HTTP in between
+    return CoinexApi(create_config(), transport=FakeExchangeTransport(get_exchange()))
+
+
 @pytest.fixture
 def fake_exchange():
     exchange = get_exchange()
@@ -66,10 +75,25 @@ def fake_exchange():
     exchange.reset()
 
 
+@pytest.fixture
+def simulation():
+    global _simulation
+    _simulation = MultiMarketExchange()
+    yield _simulation
+    _simulation = None
+
+
+def route(market: str = "", access_id: Optional[str] = None):
+    # with a simulation the request is served by the account of the API key, in the market of the request
+    if _simulation is not None:
+        return _simulation.view(access_id, market or None)
+    return get_exchange()
+
+
 def get_exchange(reset: bool = False, upload_basic_prices: bool = False, basic_prices: list[datetime.datetime] = []):
-    from tests.fake_exchange.coinex import CoinexFakeExchange
+    from tests.fake_exchange.coinex import get_fake_exchange
 
-    exchange = CoinexFakeExchange()
+    exchange = get_fake_exchange()
     if exchange.config is None:
         config = create_config()
         exchange.set_config(config)
@@ -113,6 +137,7 @@ def start_test_server():
 
 @pytest.fixture()
 def load_db_config():
+    get_config_loader().invalidate()
     DbConfig.create_table()
     DbConfig.add_bot("ADA1", pair="ADA/USDT", exchange="coinex", min_buy_amount_usdt=200)
     DbConfig.add_decimals_config(
@@ -139,41 +164,20 @@ async def shutdown():
 
 
 @app.get("/spot/deals")
-async def market_deals():
-    exchange = get_exchange()
-    price = exchange.get_current_price()
-    return {
-        "code": 0,
-        "data": [
-            {
-                "deal_id": exchange.deal_id,
-                "created_at": int(price.date.timestamp() * 1000),
-                "price": f"{price.price: .2f}",
-                "amount": "1.0",
-            }
-        ],
-    }
+async def market_deals(market: str = ""):
+    return transport.market_deals(route(market))
 
 
 @app.get("/assets/spot/balance")
-async def balance_info():
-    exchange = get_exchange()
-    data = []
-    for balance in exchange.db.get_balances():
-        data.append(balance.get_coinex_data())
-    return {"code": 0, "data": data, "message": "OK"}
+async def balance_info(x_coinex_key: Optional[str] = Header(None)):
+    return transport.balance_info(route(access_id=x_coinex_key))
 
 
 @app.get("/spot/pending-order")
-async def get_pending_orders():
-    exchange = get_exchange()
-    orders = exchange.db.open_orders
-    return {
-        "code": 0,
-        "data": [exchange.db.as_coinex_order(order) for order in orders],
-        "pagination": {"total": 1, "has_next": False},
-        "message": "OK",
-    }
+async def get_pending_orders(
+    market: str = "", page: int = 1, limit: int = 100, x_coinex_key: Optional[str] = Header(None)
+):
+    return transport.pending_orders(route(market, x_coinex_key), market=market, page=page, limit=limit)
 
 
 @app.get("/spot/pending-order")
@@ -184,63 +188,27 @@ async def order_pending(market: str, page: int = 1, limit: int = 100):
 
 
 @app.get("/spot/user-deals")
-async def user_deals(market: str, market_type: str = "SPOT", limit: int = 100, start_time: int = 0):
-    exchange = get_exchange()
-    fills = []
-    for completed_order in exchange.db.completed_orders:
-        fills += exchange.db.fills_from_completed_order(completed_order)
-
-    return {
-        "code": 0,
-        "data": fills,
-        "pagination": {"total": 1, "has_next": False},
-        "message": "OK",
-    }
+async def user_deals(
+    market: str,
+    market_type: str = "SPOT",
+    page: int = 1,
+    limit: int = 100,
+    start_time: int = 0,
+    x_coinex_key: Optional[str] = Header(None),
+):
+    return transport.user_deals(
+        route(market, x_coinex_key), market=market, start_time=start_time or None, page=page, limit=limit
+    )
 
 
 @app.post("/spot/order")
-async def limit_order(order_request: SpotLimitOrderRequest | SpotMarketOrderRequest):
+async def limit_order(
+    order_request: SpotLimitOrderRequest | SpotMarketOrderRequest, x_coinex_key: Optional[str] = Header(None)
+):
     print(f"Creating order: {order_request}")
-    exchange = get_exchange()
-    match order_request.type:
-        case "market":
-            price = exchange.get_current_price().price
-        case "limit":
-            price = order_request.price
-        case _:
-            raise RuntimeError(f"Error creating order: {order_request}")
-
-    order = Order(
-        order_id=exchange.db.next_order_id,
-        created=exchange._get_current_date(),
-        executed=None,
-        type=order_request.side,
-        buy_price=Decimal(price) if order_request.side == OrderType.BUY.value else None,
-        sell_price=Decimal(price) if order_request.side == OrderType.SELL.value else None,
-        orderStatus=OrderStatus.INITIAL,
-        amount=Decimal(order_request.amount),
-        fills=[],
-        benefit=None,
-        market=order_request.market,
-        market_type=order_request.market_type,
-    )
-    match order_request.type:
-        case "market":
-            return exchange.add_market_order(order).model_dump()
-        case "limit":
-            match order.type:
-                case OrderType.BUY:
-                    return exchange.add_buy_order(order).model_dump()
-                case OrderType.SELL:
-                    return exchange.add_sell_order(order).model_dump()
-                case _:
-                    raise RuntimeError(f"Error creating limit order: Invalid order type: {order.type}")
-        case _:
-            raise RuntimeError(f"Error creating order: Invalid request: {order_request}")
+    return transport.create_order(route(order_request.market, x_coinex_key), **order_request.model_dump())
 
 
 @app.post("/spot/cancel-order")
-async def cancel_order(cance_order_request: SpotCancelOrderRequest):
-    exchange = get_exchange()
-    cancelled_order = exchange.cancel_order(cance_order_request.order_id)
-    return cancelled_order.model_dump()
+async def cancel_order(cance_order_request: SpotCancelOrderRequest, x_coinex_key: Optional[str] = Header(None)):
+    return transport.cancel_order(route(cance_order_request.market, x_coinex_key), cance_order_request.order_id)
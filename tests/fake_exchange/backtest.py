@@ -0,0 +1,202 @@
+"""
+Vectorized backtest of resting limit orders over a tick array.
+"""
+
+import heapq
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+from typing import Optional, Protocol
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.common.ticks import TickFile, from_micros
+from app.models.balance import Balance, NotEnoughBalanceException
+from app.models.enums import OrderStatus, OrderType
+from app.models.order import Order
+from app.models.price import Price
+from tests.fake_exchange.db import Db
+
+
+class TickIndex:
+    """
+    First-crossing searches over int64 prices, `block_size` ticks are scanned at most.
+    """
+
+    def __init__(self, prices: np.ndarray, block_size: int = 4096):
+        self.prices = prices
+        self.block_size = block_size
+        starts = np.arange(0, len(prices), block_size)
+        self.block_min = np.minimum.reduceat(prices, starts) if len(prices) else np.empty(0, dtype=prices.dtype)
+        self.block_max = np.maximum.reduceat(prices, starts) if len(prices) else np.empty(0, dtype=prices.dtype)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def first_at_or_below(self, price: int, start: int) -> Optional[int]:
+        return self._first(price, start, below=True)
+
+    def first_at_or_above(self, price: int, start: int) -> Optional[int]:
+        return self._first(price, start, below=False)
+
+    def _first(self, price: int, start: int, below: bool) -> Optional[int]:
+        if start >= len(self.prices):
+            return None
+        block = start // self.block_size
+        end = (block + 1) * self.block_size
+        found = self._scan(start, end, price, below)
+        if found is not None:
+            return found
+        # running extreme of the following blocks, monotonic so the first block reaching the price is a bisection
+        if below:
+            running = -np.minimum.accumulate(self.block_min[block + 1 :])
+            position = int(np.searchsorted(running, -price, side="left"))
+        else:
+            running = np.maximum.accumulate(self.block_max[block + 1 :])
+            position = int(np.searchsorted(running, price, side="left"))
+        if position >= len(running):
+            return None
+        start = (block + 1 + position) * self.block_size
+        return self._scan(start, start + self.block_size, price, below)
+
+    def _scan(self, start: int, end: int, price: int, below: bool) -> Optional[int]:
+        segment = self.prices[start:end]
+        hits = np.flatnonzero(segment <= price if below else segment >= price)
+        return start + int(hits[0]) if len(hits) else None
+
+
+class Strategy(Protocol):
+    def initial_orders(self, price: Price) -> list[Order]:
+        """
+        The orders placed before the first tick.
+        """
+
+    def follow_up(self, order: Order, price: Price) -> list[Order]:
+        """
+        The orders placed when `order` is executed at `price`.
+        """
+
+
+class GridStrategy:
+    """
+    A static grid of `levels` buy orders `step` apart, each one followed by a sell `sell_step` above it and back.
+    """
+
+    def __init__(self, market: str, amount: Decimal, step: Decimal, levels: int, sell_step: Optional[Decimal] = None):
+        self.market = market
+        self.amount = amount
+        self.step = step
+        self.levels = levels
+        self.sell_step = sell_step if sell_step is not None else step
+
+    def _order(self, order_type: OrderType, price: Decimal, date, buy_price: Optional[Decimal] = None) -> Order:
+        return Order(
+            order_id="",
+            created=date,
+            type=order_type,
+            orderStatus=OrderStatus.INITIAL,
+            amount=self.amount,
+            buy_price=price if order_type == OrderType.BUY else buy_price,
+            sell_price=price if order_type == OrderType.SELL else None,
+            executed=None,
+            market=self.market,
+        )
+
+    def initial_orders(self, price: Price) -> list[Order]:
+        return [
+            self._order(OrderType.BUY, price.price - self.step * level, price.date)
+            for level in range(1, self.levels + 1)
+            if price.price - self.step * level > 0
+        ]
+
+    def follow_up(self, order: Order, price: Price) -> list[Order]:
+        if order.type == OrderType.BUY:
+            return [
+                self._order(OrderType.SELL, order.buy_price + self.sell_step, price.date, buy_price=order.buy_price)
+            ]
+        return [self._order(OrderType.BUY, order.sell_price - self.sell_step, price.date)]
+
+
+class BacktestResult(BaseModel):
+    completed: list[Order]
+    rejected: list[Order]
+    balances: dict[str, Balance]
+    visited_ticks: int
+    ticks: int
+
+
+class VectorizedBacktest:
+    def __init__(self, db: Db, ticks: TickFile, market: str, block_size: int = 4096):
+        self.db = db
+        self.market = market
+        self.decimals = ticks.decimals
+        prices = np.asarray(ticks.prices)
+        # without the repeated prices
+        keep = np.asarray(ticks.changes)
+        self.prices = prices[keep]
+        self.timestamps = np.asarray(ticks.timestamps)[keep]
+        self.index = TickIndex(self.prices, block_size)
+
+    def price(self, position: int) -> Price:
+        return Price(
+            price=Decimal(int(self.prices[position])).scaleb(-self.decimals),
+            date=from_micros(self.timestamps[position]),
+        )
+
+    def _threshold(self, order: Order) -> int:
+        # exact integer bounds: buy crosses when tick <= floor(price), sell when tick >= ceil(price)
+        if order.type == OrderType.BUY:
+            return int(order.buy_price.scaleb(self.decimals).to_integral_value(rounding=ROUND_FLOOR))
+        return int(order.sell_price.scaleb(self.decimals).to_integral_value(rounding=ROUND_CEILING))
+
+    def _first_cross(self, order: Order, start: int) -> Optional[int]:
+        if order.type == OrderType.BUY:
+            return self.index.first_at_or_below(self._threshold(order), start)
+        return self.index.first_at_or_above(self._threshold(order), start)
+
+    def run(self, strategy: Strategy) -> BacktestResult:
+        # only the ticks where an open order crosses are visited, with the same `Db` methods as tick by tick
+        events: list[int] = []
+        scheduled: set[int] = set()
+        rejected: list[Order] = []
+        visited = 0
+
+        def place(orders: list[Order], position: int) -> None:
+            price = self.price(position)
+            for order in orders:
+                order.order_id = self.db.next_order_id
+                try:
+                    if order.type == OrderType.BUY:
+                        self.db.add_buy_order(order, price)
+                    else:
+                        self.db.add_sell_order(order, price)
+                except NotEnoughBalanceException:
+                    rejected.append(order)
+                    continue
+                cross = self._first_cross(order, position + 1)
+                if cross is not None and cross not in scheduled:
+                    scheduled.add(cross)
+                    heapq.heappush(events, cross)
+
+        if len(self.prices):
+            place(strategy.initial_orders(self.price(0)), 0)
+        while events:
+            position = heapq.heappop(events)
+            scheduled.discard(position)
+            visited += 1
+            price = self.price(position)
+            done = len(self.db.completed_orders)
+            self.db.check_buy_orders(self.market, price.price, price.date)
+            self.db.check_sell_orders(self.market, price.price, price.date)
+            for order in self.db.completed_orders[done:]:
+                place(strategy.follow_up(order, price), position)
+
+        return BacktestResult(
+            completed=list(self.db.completed_orders),
+            rejected=rejected,
+            balances={
+                currency: balance.to_balance() if self.db.fixed else balance.model_copy()
+                for currency, balance in self.db.balances.items()
+            },
+            visited_ticks=visited,
+            ticks=len(self.prices),
+        )
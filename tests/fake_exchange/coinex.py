@@ -1,6 +1,7 @@
 """
 This is a fake exchange module for testing purposes.
 """
+
 import datetime
 import os
 from decimal import Decimal
@@ -9,12 +10,15 @@ from typing import Optional
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
-from app.common.common import singleton
+from app.common.clock import SimulatedClock
+from app.common.fixed import to_fixed
+from app.common.ticks import CHANGES_EXTENSION, EXTENSION, TickFile
 from app.config.config import Config
+from app.config.market import MarketSpec
 from app.models.enums import OrderType
 from app.models.order import Order
 from app.models.price import Price
-from tests.fake_exchange.db import Db
+from tests.fake_exchange.db import Db, get_db
 from tests.fake_exchange.models import BuyOrderResponse, SellOrderResponse
 
 load_dotenv("configurations/test/.env-tests")
@@ -39,10 +43,13 @@ class StopLongRun(Exception):
     pass
 
 
-@singleton
 class CoinexFakeExchange:
-    def __init__(self):
-        self.db = Db()
+    def __init__(
+        self, db: Optional[Db] = None, prices_folder: Optional[str] = None, clock: Optional[SimulatedClock] = None
+    ):
+        self.db = db if db is not None else Db()
+        # moved to the date of every tick replayed
+        self.clock = clock
         self.deal_id = 0
         self.prices = []
         self.index = 0
@@ -50,12 +57,15 @@ class CoinexFakeExchange:
         self.prices = []
         self.prices_folder = None
         self.current_file_index = 0
-        self.prices_folder = os.environ.get("DATAPATH")
+        self.prices_folder = prices_folder or os.environ.get("DATAPATH")
         if not os.path.exists(self.prices_folder):
             raise RuntimeError("can't find DATAPATH = {prices_folder}")
         self.previous_price = None
 
-        self.data_files = sorted(os.listdir(self.prices_folder))
+        # the change indexes are read with their tick files
+        self.data_files = [
+            name for name in sorted(os.listdir(self.prices_folder)) if not name.endswith(CHANGES_EXTENSION)
+        ]
         if len(self.data_files) == 0:
             raise RuntimeError("no data files found in {prices_folder}")
 
@@ -65,12 +75,16 @@ class CoinexFakeExchange:
         self.load_file_of_prices()
         self.db.set_config(config)
 
+    @property
+    def spec(self) -> MarketSpec:
+        return self.config.spec
+
     @property
     def current_file(self):
         return os.path.join(self.prices_folder, self.data_files[self.current_file_index])
 
-    def reset(self, config: Config = None):
-        self.db.reset(config=config)
+    def reset(self, config: Config = None, fixed: bool = False):
+        self.db.reset(config=config, fixed=fixed)
         self.prices = []
         self.index = 0
         self.deal_id = 0
@@ -80,6 +94,10 @@ class CoinexFakeExchange:
 
     def load_file_of_prices(self):
         print(f"loading prices from {self.current_file}")
+        if self.current_file.endswith(EXTENSION):
+            # memory mapped, the ticks are read as they are used
+            self.prices = TickFile(self.current_file)
+            return
         with open(self.current_file, "r") as file:
             self.prices = [line.split(",") for line in file.readlines()]
 
@@ -87,6 +105,8 @@ class CoinexFakeExchange:
         self.prices = prices
 
     def _get_current_date(self) -> datetime.datetime:
+        if isinstance(self.prices, TickFile):
+            return self.prices.date(self.index)
         line = self.prices[self.index]
         return datetime.datetime.fromisoformat(line[0])
 
@@ -94,41 +114,74 @@ class CoinexFakeExchange:
         if self.previous_price:
             return self.previous_price
         else:
-            line = self.prices[self.index]
-            self.previous_price = self.get_price_from_line(line)
+            self.previous_price = self._price_at(self.index)
         return self.previous_price
 
     def get_price_from_line(self, line: list[str]) -> Price:
         return Price(price=Decimal(line[1]), date=datetime.datetime.fromisoformat(line[0]))
 
+    def _price_at(self, index: int) -> Price:
+        if isinstance(self.prices, TickFile):
+            return Price(price=self.prices.price(index), date=self.prices.date(index))
+        return self.get_price_from_line(self.prices[index])
+
     def get_current_price(self) -> Price:
         if len(self.prices) == 0:
             self.load_file_of_prices()
             self.index = 0
         elif self.index >= len(self.prices):
-            self.index = 0
-            if self.current_file <= len(self.data_files):
-                self.current_file += 1
-            else:
-                raise StopLongRun()
-            self.load_file_of_prices()
+            self._load_next_file()
 
-        line = self.prices[self.index]
-        new_price = False
-        while not new_price or (self.previous_price and self.previous_price.price == new_price.price):
-            try:
-                new_price = Price(price=Decimal(line[1]), date=datetime.datetime.fromisoformat(line[0]))
-            except Exception:
-                pass
-            self.index += 1
+        if isinstance(self.prices, TickFile):
+            new_price = self._next_tick()
+            while new_price is None:
+                self._load_next_file()
+                new_price = self._next_tick()
+        else:
             line = self.prices[self.index]
+            new_price = False
+            while not new_price or (self.previous_price and self.previous_price.price == new_price.price):
+                try:
+                    new_price = Price(price=Decimal(line[1]), date=datetime.datetime.fromisoformat(line[0]))
+                except Exception:
+                    pass
+                self.index += 1
+                line = self.prices[self.index]
 
         self.previous_price = new_price
-        self.db.check_buy_orders(self.market, new_price.price)
-        self.db.check_sell_orders(self.market, new_price.price)
+        if self.clock is not None:
+            self.clock.advance_to(new_price.date)
+        self.db.check_buy_orders(self.market, new_price.price, new_price.date)
+        self.db.check_sell_orders(self.market, new_price.price, new_price.date)
         self.deal_id += 1
         return new_price
 
+    def _load_next_file(self):
+        self.index = 0
+        if self.current_file_index + 1 < len(self.data_files):
+            self.current_file_index += 1
+        else:
+            raise StopLongRun()
+        self.load_file_of_prices()
+
+    def _next_tick(self) -> Optional[Price]:
+        # jumps over the ticks that repeat the previous price with the change index, no Decimal per tick.
+        # None when the rest of the file repeats the previous price.
+        prices = self.prices.prices
+        index = self.index
+        if index >= len(prices):
+            return None
+        if self.previous_price is not None and prices[index] == to_fixed(
+            self.previous_price.price, self.prices.decimals
+        ):
+            index = self.prices.next_change(index)
+            if index is None:
+                self.index = len(prices)
+                return None
+        new_price = self._price_at(index)
+        self.index = index + 1
+        return new_price
+
     def add_balance(self, currency: str, amount: Decimal):
         self.db.increase_balance(currency=currency, amount=amount)
 
@@ -168,6 +221,17 @@ class CoinexFakeExchange:
         return self.db.open_orders
 
 
+_exchange: Optional[CoinexFakeExchange] = None
+
+
+def get_fake_exchange() -> CoinexFakeExchange:
+    # the exchange behind the test server, simulations create their own
+    global _exchange
+    if _exchange is None:
+        _exchange = CoinexFakeExchange(db=get_db())
+    return _exchange
+
+
 class UnkonwnMarketException(Exception):
     pass
 
@@ -1,11 +1,16 @@
+import datetime
+import heapq
 import random
-from decimal import Decimal
-from typing import Dict, List
+from bisect import bisect_left
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+from typing import Dict, List, Optional
 
-from app.common.common import singleton
+from app.common.fixed import exact_fixed, rescale, to_fixed
 from app.config.config import Config
+from app.config.market import MarketSpec
 from app.models.balance import (
     Balance,
+    FixedBalance,
     NotEnoughBalanceException,
     NotFoundBalanceException,
 )
@@ -13,28 +18,71 @@ from app.models.order import Order, OrderStatus, OrderType
 from app.models.price import Price
 
 
-@singleton
 class Db:
     def __init__(self, pair: str = "BTC/USDT"):
         self.order_id = 1
         self.fill_id = 1
         self.pair = pair
         self.balances: Dict[str, Balance] = {}
-        self.open_orders: List[Order] = []
         self.completed_orders: List[Order] = []
+        self._reset_open_orders()
+        self._reset_fills()
         self.config: Config | None = None
+        # specs of the markets traded besides the one of the config (multi-market simulations)
+        self.specs: Dict[str, MarketSpec] = {}
+        # fixed-point mode: balances, prices and amounts as scaled integers (see MarketSpec)
+        self.fixed = False
+        self._fixed_orders: Dict[str, tuple[int, int, int, int]] = {}
 
-    def reset(self, config: Config = None):
+    def reset(self, config: Config = None, fixed: bool = False):
         self.order_id = 1
         self.balances = {}
-        self.open_orders = []
         self.completed_orders = []
+        self._reset_open_orders()
+        self._reset_fills()
         self.config = config
+        self.specs = {}
         self.fill_id = 1
+        self.fixed = fixed
+        self._fixed_orders = {}
+
+    def _reset_open_orders(self):
+        # open orders by id (with the sequence of their heap entry) and, per market, a max-heap of
+        # (-buy_price, sequence, order_id) and a min-heap of (sell_price, sequence, order_id). Cancelled orders stay
+        # in the heaps and are dropped when they reach the top.
+        self._open: Dict[str, tuple[int, Order]] = {}
+        self._buy_heaps: Dict[str, list] = {}
+        self._sell_heaps: Dict[str, list] = {}
+        self._sequence = 0
+        self._stale_entries = 0
+        # fixed-point mode: the decimals of the heap prices of each market, the market ones until an order priced off
+        # its grid comes
+        self._heap_decimals: Dict[str, int] = {}
+
+    def _reset_fills(self):
+        # fills of the completed orders per market, in execution order, and their `created_at` for the
+        # `start_time` searches. Fills are made once, when the order is executed.
+        self._fills: Dict[str, List[dict]] = {}
+        self._fill_times: Dict[str, List[int]] = {}
+
+    @property
+    def open_orders(self) -> List[Order]:
+        return [order for _, order in self._open.values()]
 
     def set_config(self, config: Config):
         self.config = config
 
+    @property
+    def spec(self) -> MarketSpec:
+        return self.config.spec
+
+    def add_market(self, spec: MarketSpec):
+        self.specs[spec.market] = spec
+
+    def spec_for(self, market: str) -> MarketSpec:
+        spec = self.specs.get(market)
+        return spec if spec is not None else self.config.spec
+
     @property
     def next_order_id(self) -> str:
         self.order_id += 1
@@ -56,41 +104,153 @@ class Db:
     def increase_balance(self, currency: str, amount: Decimal):
         balance = self.balances.get(currency)
         if balance is None:
-            balance = Balance.create_basic_balance(currency=currency, config=self.config)
+            balance_cls = FixedBalance if self.fixed else Balance
+            balance = balance_cls.create_basic_balance(currency=currency, config=self.config)
             self.balances[currency] = balance
-        balance.available += amount
+        balance.available += self._balance_amount(currency, *exact_fixed(amount)) if self.fixed else amount
 
     def _get_balances(self, order: Order) -> List[Balance]:
         return [self.get_balance(order.currency_from()), self.get_balance(order.currency_to())]
 
+    @staticmethod
+    def _exact_fixed(value: Decimal, decimals: int) -> tuple[int, int]:
+        # the value at `decimals`, or at the decimals it carries when it has more
+        value, value_decimals = exact_fixed(value)
+        if value_decimals > decimals:
+            return value, value_decimals
+        return rescale(value, value_decimals, decimals), decimals
+
+    def _fixed_order(self, order: Order) -> tuple[int, int, int, int]:
+        # amount, amount decimals, price and price decimals of an open order, converted once. They are exact, even off
+        # the grid of the market, so the fills and balances match the Decimal mode.
+        values = self._fixed_orders.get(order.order_id)
+        if values is None:
+            price = order.buy_price if order.type == OrderType.BUY else order.sell_price
+            spec = self.spec_for(order.market)
+            values = (
+                *self._exact_fixed(order.amount, spec.amount_decimals),
+                *self._exact_fixed(price, spec.price_decimals),
+            )
+            self._fixed_orders[order.order_id] = values
+        return values
+
+    def _widen_heaps(self, market: str, decimals: int = 0) -> int:
+        # the decimals of the heap prices of a market, at least `decimals`. Widening scales every entry by the same
+        # factor, which keeps the heaps ordered.
+        current = self._heap_decimals.get(market)
+        if current is None:
+            current = self.spec_for(market).price_decimals
+        if decimals > current:
+            factor = 10 ** (decimals - current)
+            for heap in (self._buy_heaps.get(market), self._sell_heaps.get(market)):
+                if heap:
+                    heap[:] = [(price * factor, sequence, order_id) for price, sequence, order_id in heap]
+            current = decimals
+        self._heap_decimals[market] = current
+        return current
+
+    def _order_price(self, order: Order):
+        if self.fixed:
+            _, _, price, price_decimals = self._fixed_order(order)
+            return rescale(price, price_decimals, self._widen_heaps(order.market, price_decimals))
+        return order.buy_price if order.type == OrderType.BUY else order.sell_price
+
+    def _tick_price(self, market: str, price: Decimal, rounding: str):
+        # order prices are exact at the heap decimals, so a tick rounded towards the orders it doesn't cross
+        # (ceiling for the buys, floor for the sells) crosses the same orders as the exact one
+        return to_fixed(price, self._widen_heaps(market), rounding) if self.fixed else price
+
+    def _balance_amount(self, currency: str, value: int, decimals: int) -> int:
+        # an exact fixed value in the decimals of the balance of the currency, widening the balance to hold it
+        balance = self.balances[currency]
+        while decimals > balance.decimals and value % 10 == 0:
+            value, decimals = value // 10, decimals - 1
+        balance.widen(decimals)
+        return rescale(value, decimals, balance.decimals)
+
+    def _quote_amount(self, order: Order, rounded: bool = True):
+        if self.fixed:
+            spec = self.spec_for(order.market)
+            amount, amount_decimals, price, price_decimals = self._fixed_order(order)
+            value, decimals = amount * price, amount_decimals + price_decimals
+            if rounded:
+                value, decimals = rescale(value, decimals, spec.quote_decimals), spec.quote_decimals
+            return self._balance_amount(spec.quote, value, decimals)
+        value = order.amount * (order.buy_price if order.type == OrderType.BUY else order.sell_price)
+        return self.spec_for(order.market).round_quote(value) if rounded else value
+
+    def _base_amount(self, order: Order, rounded: bool = True):
+        if self.fixed:
+            spec = self.spec_for(order.market)
+            amount, decimals = self._fixed_order(order)[:2]
+            if rounded:
+                amount, decimals = rescale(amount, decimals, spec.base_decimals), spec.base_decimals
+            return self._balance_amount(spec.base, amount, decimals)
+        return self.spec_for(order.market).round_base(order.amount) if rounded else order.amount
+
+    def _market_amount(self, order: Order):
+        if self.fixed:
+            spec = self.spec_for(order.market)
+            amount, decimals = self._fixed_order(order)[:2]
+            # rounded to the step size, as `round_amount`
+            return self._balance_amount(
+                spec.base, rescale(amount, decimals, spec.amount_decimals), spec.amount_decimals
+            )
+        return self.spec_for(order.market).round_amount(order.amount)
+
+    def _dump(self, balance) -> dict:
+        return balance.to_balance().model_dump() if self.fixed else balance.model_dump()
+
+    def _not_enough(self, order: Order, balance: Balance, amount, price: Price) -> bool:
+        if self.fixed:
+            # the price as it is, the rinconcito is not rounded to the market decimals in Decimal mode either
+            return balance.available_amount(*exact_fixed(price.price)) < amount
+        return balance.available_amount(price) < amount
+
     def add_buy_order(self, buy_order: Order, price: Price):
         balance_from, balance_to = self._get_balances(buy_order)
         if balance_to is None:
             raise NotFoundBalanceException(f"Balance not found. order={buy_order.model_dump()}")
-        if balance_to.available_amount(price) < self.config.rnd_amount_by_ccy(
-            buy_order.amount * buy_order.buy_price, buy_order.currency_to()
-        ):
+        if self._not_enough(buy_order, balance_to, self._quote_amount(buy_order), price):
             raise NotEnoughBalanceException(
-                f"Not enough balance. order={buy_order.model_dump()}, balance={balance_to.model_dump()}"
+                f"Not enough balance. order={buy_order.model_dump()}, balance={self._dump(balance_to)}"
             )
-        balance_to.lock(self.config.rnd_amount_by_ccy(buy_order.amount * buy_order.buy_price, buy_order.currency_to()))
+        balance_to.lock(self._quote_amount(buy_order))
         self._add_order(buy_order)
 
     def add_sell_order(self, sell_order: Order, price: Price):
         balance_from, balance_to = self._get_balances(sell_order)
         if balance_from is None:
             raise NotFoundBalanceException(f"Balance not found. order={sell_order.model_dump()}")
-        if balance_from.available_amount(price) < self.config.rnd_amount_by_ccy(
-            sell_order.amount, sell_order.currency_from()
-        ):
+        if self._not_enough(sell_order, balance_from, self._base_amount(sell_order), price):
             raise NotEnoughBalanceException(
-                f"Not enough balance. order={sell_order.model_dump()}, balance={balance_from.model_dump()}"
+                f"Not enough balance. order={sell_order.model_dump()}, balance={self._dump(balance_from)}"
             )
-        balance_from.lock(self.config.rnd_amount_by_ccy(sell_order.amount, sell_order.currency_from()))
+        balance_from.lock(self._base_amount(sell_order))
         self._add_order(sell_order)
 
     def _add_order(self, order: Order):
-        self.open_orders.append(order)
+        self._sequence += 1
+        self._open[order.order_id] = (self._sequence, order)
+        price = self._order_price(order)
+        if order.type == OrderType.BUY:
+            heapq.heappush(self._buy_heaps.setdefault(order.market, []), (-price, self._sequence, order.order_id))
+        else:
+            heapq.heappush(self._sell_heaps.setdefault(order.market, []), (price, self._sequence, order.order_id))
+
+    def _pop_crossed(self, heap: list | None, bound) -> List[Order]:
+        # the orders at the top of the heap with a key <= bound, in price priority
+        orders = []
+        while heap:
+            key, sequence, order_id = heap[0]
+            entry = self._open.get(order_id)
+            if entry is not None and entry[0] == sequence:
+                if key > bound:
+                    break
+                del self._open[order_id]
+                orders.append(entry[1])
+            heapq.heappop(heap)
+        return orders
 
     def create_buy_order(self, market: str, amount: Decimal, price: Decimal):
         self.add_order(Order(market=market, type=OrderType.BUY, amount=amount, status=OrderStatus.OPEN, price=price))
@@ -99,81 +259,89 @@ class Db:
         self.add_order(Order(market=market, type=OrderType.SELL, amount=amount, status=OrderStatus.OPEN, price=price))
 
     def cancel_order(self, order_id: str):
-        for order in self.open_orders:
-            if order.order_id == order_id:
-                if order.type == OrderType.BUY:
-                    balance_from, balance_to = self._get_balances(order)
-                    balance_to.unlock(
-                        self.config.rnd_amount_by_ccy(order.amount * order.buy_price, order.currency_to())
-                    )
-                else:  # OrderType.SELL
-                    balance_from, balance_to = self._get_balances(order)
-                    balance_from.unlock(self.config.rnd_amount_by_ccy(order.amount, order.currency_from()))
-                self.open_orders.remove(order)
-                return order
-        raise Exception(f"Order not found: {order_id}")
-
-    def check_buy_orders(self, market: str, price: Decimal):
-        any_completed = False
-        for order in self.open_orders:
-            if order.market == market and order.type == OrderType.BUY and price <= order.buy_price:
-                order.orderStatus = OrderStatus.EXECUTED
-                balance_from, balance_to = self._get_balances(order)
-                balance_to.unlock(self.config.rnd_amount_by_ccy(order.amount * order.buy_price, order.currency_to()))
-                balance_to.dec(self.config.rnd_amount_by_ccy(order.amount * order.buy_price, order.currency_to()))
-                balance_from.inc(self.config.rnd_amount(order.amount))
-                any_completed = True
-        if any_completed:
-            self.update_completed_orders(OrderType.BUY)
-
-    def check_sell_orders(self, market: str, price: Decimal):
-        any_completed = False
-        for order in self.open_orders:
-            if order.market == market and order.type == OrderType.SELL and price >= order.sell_price:
-                order.orderStatus = OrderStatus.EXECUTED
-
-                balance_from = self.get_balance(order.currency_from())
-                balance_from.dec(order.amount)
-                balance_to = self.get_balance(order.currency_to())
-                balance_to.inc(order.amount * order.sell_price)
-                any_completed = True
-        if any_completed:
-            self.update_completed_orders(OrderType.SELL)
+        entry = self._open.pop(order_id, None)
+        if entry is None:
+            raise Exception(f"Order not found: {order_id}")
+        order = entry[1]
+        if order.type == OrderType.BUY:
+            balance_from, balance_to = self._get_balances(order)
+            balance_to.unlock(self._quote_amount(order))
+        else:  # OrderType.SELL
+            balance_from, balance_to = self._get_balances(order)
+            balance_from.unlock(self._base_amount(order))
+        self._fixed_orders.pop(order.order_id, None)
+        self._stale_entries += 1
+        if self._stale_entries > len(self._open) + 64:
+            self._compact_heaps()
+        return order
+
+    def _compact_heaps(self):
+        # drop the entries of the cancelled orders once they outnumber the open ones
+        for heaps in (self._buy_heaps, self._sell_heaps):
+            for market, heap in heaps.items():
+                heaps[market] = [entry for entry in heap if self._open.get(entry[2], (None,))[0] == entry[1]]
+                heapq.heapify(heaps[market])
+        self._stale_entries = 0
+
+    def check_buy_orders(self, market: str, price: Decimal, date: Optional[datetime.datetime] = None):
+        price = self._tick_price(market, price, ROUND_CEILING)
+        # only the buy orders priced at or above the tick are popped
+        completed = self._pop_crossed(self._buy_heaps.get(market), -price)
+        for order in completed:
+            order.orderStatus = OrderStatus.EXECUTED
+            balance_from, balance_to = self._get_balances(order)
+            quote_amount = self._quote_amount(order)
+            balance_to.unlock(quote_amount)
+            balance_to.dec(quote_amount)
+            balance_from.inc(self._market_amount(order))
+        self._complete_orders(completed, date)
+
+    def check_sell_orders(self, market: str, price: Decimal, date: Optional[datetime.datetime] = None):
+        price = self._tick_price(market, price, ROUND_FLOOR)
+        # only the sell orders priced at or below the tick are popped
+        completed = self._pop_crossed(self._sell_heaps.get(market), price)
+        for order in completed:
+            order.orderStatus = OrderStatus.EXECUTED
+
+            balance_from = self.get_balance(order.currency_from())
+            balance_from.unlock(self._base_amount(order))
+            balance_from.dec(self._base_amount(order, rounded=False))
+            balance_to = self.get_balance(order.currency_to())
+            balance_to.inc(self._quote_amount(order, rounded=False))
+        self._complete_orders(completed, date)
 
     def add_market_order(self, order: Order, price: Price):
         order.orderStatus = OrderStatus.EXECUTED
         balance_from, balance_to = self._get_balances(order)
         if order.type == OrderType.BUY:
-            amount_to_dec = self.config.rnd_amount_by_ccy(order.amount * order.buy_price, order.currency_to())
-            if balance_to.available_amount(price) < amount_to_dec:
+            amount_to_dec = self._quote_amount(order)
+            if self._not_enough(order, balance_to, amount_to_dec, price):
                 raise NotEnoughBalanceException(
-                    f"Not enough balance. order={order.model_dump()}, balance={balance_to.model_dump()}"
+                    f"Not enough balance. order={order.model_dump()}, balance={self._dump(balance_to)}"
                 )
             balance_to.dec(amount_to_dec)
-            balance_from.inc(self.config.rnd_amount(order.amount))
+            balance_from.inc(self._market_amount(order))
         else:  # OrderType.SELL
-            amount_to_dec = self.config.rnd_amount(order.amount)
-            if balance_from.available_amount(price) < amount_to_dec:
+            amount_to_dec = self._market_amount(order)
+            if self._not_enough(order, balance_from, amount_to_dec, price):
                 raise NotEnoughBalanceException(
-                    f"Not enough balance. order={order.model_dump()}, balance={balance_from.model_dump()}"
+                    f"Not enough balance. order={order.model_dump()}, balance={self._dump(balance_from)}"
                 )
             balance_from.dec(amount_to_dec)
-            balance_to.inc(self.config.rnd_amount_by_ccy(order.amount * order.sell_price, order.currency_to()))
-        self.update_completed_orders(order.type)
+            balance_to.inc(self._quote_amount(order))
+        self._fixed_orders.pop(order.order_id, None)
         return order
 
-    def update_completed_orders(self, side: OrderStatus) -> List[Order]:
-        completed = [
-            order for order in self.open_orders if order.orderStatus == OrderStatus.EXECUTED and order.type == side
-        ]
+    def _complete_orders(self, completed: List[Order], date: Optional[datetime.datetime] = None):
         self.completed_orders.extend(completed)
-        self.open_orders = [order for order in self.open_orders if order.orderStatus != OrderStatus.EXECUTED]
-        return completed
+        for order in completed:
+            self._fixed_orders.pop(order.order_id, None)
+            self._add_fills(order, date or order.created)
 
     def as_coinex_order(self, order: Order) -> dict[str, str]:
         return {
             "order_id": int(order.order_id),
-            "market": self.market,
+            "market": order.market,
             "market_type": "SPOT",
             "type": "limit",
             "side": order.type.value,
@@ -182,34 +350,65 @@ class Db:
             "created_at": order.created.timestamp() * 1000,
         }
 
-    def fills_from_completed_order(self, order: Order) -> list[dict[str, str]]:
+    def _add_fills(self, order: Order, date: datetime.datetime):
+        fills = self._fills.setdefault(order.market, [])
+        times = self._fill_times.setdefault(order.market, [])
+        # the log stays sorted by time, a fill is never dated before the previous one
+        created_at = max(int(date.timestamp() * 1000), times[-1] if times else 0)
+        for fill in self.fills_from_completed_order(order, created_at):
+            fills.append(fill)
+            times.append(created_at)
+
+    def user_deals(
+        self, market: Optional[str] = None, start_time: Optional[int] = None, page: int = 1, limit: int = 100
+    ) -> tuple[list[dict], int]:
+        """
+        A page of the fills since `start_time` (milliseconds), oldest first, and the number of fills matching.
+        """
+        if market is None:
+            fills = sorted(
+                (fill for fills in self._fills.values() for fill in fills if fill["created_at"] >= (start_time or 0)),
+                key=lambda fill: fill["deal_id"],
+            )
+            first = 0
+        else:
+            fills = self._fills.get(market, [])
+            first = bisect_left(self._fill_times.get(market, []), start_time) if start_time else 0
+        start = first + (page - 1) * limit
+        return fills[start : start + limit], len(fills) - first
+
+    def fills_from_completed_order(self, order: Order, created_at: int) -> list[dict[str, str]]:
         fills = []
         splits = random.choice([1, 2, 3])
         base_amount = order.amount / splits
         accumulated_amount = Decimal(0)
         for split in range(splits):
-            fill_amount = self.config.rnd_amount(base_amount)
+            fill_amount = self.spec_for(order.market).round_amount(base_amount)
             if split == splits - 1:
                 fill_amount = order.amount - accumulated_amount
             accumulated_amount += fill_amount
             fill = {
                 "deal_id": self.fill_id,
                 "order_id": int(order.order_id),
-                "market": self.market,
+                "market": order.market,
                 "price": str(order.buy_price) if order.type == OrderType.BUY else str(order.sell_price),
                 "amount": str(fill_amount),
                 "side": order.type.value,
-                "created_at": order.created.timestamp() * 1000,
+                "created_at": created_at,
             }
             self.fill_id += 1
             fills.append(fill)
         return fills
 
 
+_db: Db | None = None
+
+
 def get_db(reset=False):
+    # the Db shared by the test server, simulations create their own
+    global _db
+    if _db is None:
+        _db = Db()
     if reset:
-        db = Db()
-        db.reset()
-        return db
-    else:
-        return Db()
+        _db.reset()
+    return _db
@@ -0,0 +1,270 @@
+"""
+Many markets and accounts in one simulation, the tick streams of the markets are merged in timestamp order.
+"""
+
+import datetime
+import heapq
+import itertools
+from decimal import Decimal
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from app.common.clock import SimulatedClock
+from app.common.ticks import TickFile, from_micros, to_micros
+from app.config.config import Config
+from app.config.market import MarketSpec
+from app.models.enums import OrderType
+from app.models.order import Order
+from app.models.price import Price
+from tests.fake_exchange.coinex import StopLongRun, UnkonwnMarketException
+from tests.fake_exchange.db import Db
+from tests.fake_exchange.models import BuyOrderResponse, SellOrderResponse
+from tests.fake_exchange.transport import FakeExchangeTransport
+
+CHUNK_SIZE = 1 << 16
+
+
+# every account has its own `Db`, the quote currency is shared by the markets of the account
+class AccountDb(Db):
+    def __init__(self, ids: Iterator[int], pair: str):
+        super().__init__(pair=pair)
+        self._ids = ids
+
+    @property
+    def next_order_id(self) -> str:
+        # order ids are unique across the accounts, like on the exchange
+        return str(next(self._ids))
+
+
+class MarketFeed:
+    """
+    The tick stream of one market, without the repeated prices.
+    """
+
+    def __init__(self, config: Config, ticks: TickFile | list[list[str]]):
+        self.config = config
+        self.market = config.market
+        self.ticks = ticks
+        self.price: Optional[Price] = None
+        self.deal_id = 0
+
+    @property
+    def spec(self) -> MarketSpec:
+        return self.config.spec
+
+    def price_at(self, position: int) -> Price:
+        if isinstance(self.ticks, TickFile):
+            return Price(price=self.ticks.price(position), date=self.ticks.date(position))
+        date, price = self.ticks[position][:2]
+        return Price(price=Decimal(price), date=datetime.datetime.fromisoformat(date))
+
+    def first_price(self) -> Price:
+        if len(self.ticks) == 0:
+            raise RuntimeError(f"no prices for {self.market}")
+        return self.price_at(0)
+
+    def advance(self, position: int) -> Price:
+        self.price = self.price_at(position)
+        self.deal_id += 1
+        return self.price
+
+    def events(self, order: int) -> Iterator[tuple[int, int, int]]:
+        """
+        `(timestamp, order, position)` of the ticks that change the price, `order` breaks the ties between markets.
+        """
+        if isinstance(self.ticks, TickFile):
+            keep = np.asarray(self.ticks.changes)
+            for start in range(0, len(keep), CHUNK_SIZE):
+                positions = keep[start : start + CHUNK_SIZE]
+                timestamps = np.asarray(self.ticks.timestamps)[positions]
+                for timestamp, position in zip(timestamps.tolist(), positions.tolist()):
+                    yield timestamp, order, position
+            return
+
+        previous = None
+        for position, line in enumerate(self.ticks):
+            price = Decimal(line[1])
+            if price == previous:
+                continue
+            previous = price
+            yield to_micros(datetime.datetime.fromisoformat(line[0])), order, position
+
+
+class MultiMarketExchange:
+    def __init__(self, fixed: bool = False, clock: Optional[SimulatedClock] = None):
+        self.fixed = fixed
+        self.clock = clock
+        self.feeds: dict[str, MarketFeed] = {}
+        self.accounts: dict[str, Db] = {}
+        self.now: Optional[datetime.datetime] = None
+        self._ids = itertools.count(1)
+        # account of every order placed, and the accounts with orders in each market
+        self._owners: dict[str, str] = {}
+        self._traders: dict[str, set[str]] = {}
+        # deal id of the last price read by each (account, market)
+        self._read: dict[tuple[Optional[str], str], int] = {}
+        self._feeds: list[MarketFeed] = []
+        self._timeline: Optional[Iterator[tuple[int, int, int]]] = None
+
+    def add_market(self, config: Config, ticks: TickFile | list[list[str]]) -> MarketFeed:
+        if self._timeline is not None:
+            raise RuntimeError("markets must be added before the simulation starts")
+        feed = MarketFeed(config, ticks)
+        self.feeds[feed.market] = feed
+        for db in self.accounts.values():
+            db.add_market(feed.spec)
+        return feed
+
+    def add_account(self, name: str, config: Config) -> Db:
+        db = AccountDb(self._ids, pair=config.pair)
+        db.reset(config=config, fixed=self.fixed)
+        for feed in self.feeds.values():
+            db.add_market(feed.spec)
+        self.accounts[name] = db
+        return db
+
+    def deposit(self, account: str, currency: str, amount: Decimal):
+        self.accounts[account].increase_balance(currency, amount)
+
+    def feed(self, market: str) -> MarketFeed:
+        feed = self.feeds.get(market)
+        if feed is None:
+            raise UnkonwnMarketException(f"Unknown market {market}")
+        return feed
+
+    def price(self, market: str) -> Price:
+        feed = self.feed(market)
+        return feed.price if feed.price is not None else feed.first_price()
+
+    def next_price(self, market: str, account: Optional[str] = None) -> Price:
+        # the price of a market not read yet by the account, the simulation moves to the next change of the market
+        # when it has read the current one, raises StopLongRun at the end of the streams
+        feed = self.feed(market)
+        key = (account, market)
+        while feed.price is None or self._read.get(key) == feed.deal_id:
+            if self.step() is None:
+                raise StopLongRun()
+        self._read[key] = feed.deal_id
+        return feed.price
+
+    def place(self, account: str, order: Order) -> Order:
+        db = self.accounts[account]
+        if not order.order_id:
+            order.order_id = db.next_order_id
+        price = self.price(order.market)
+        if order.type == OrderType.BUY:
+            db.add_buy_order(order, price)
+        else:
+            db.add_sell_order(order, price)
+        self._owners[order.order_id] = account
+        self._traders.setdefault(order.market, set()).add(account)
+        return order
+
+    def place_market(self, account: str, order: Order) -> Order:
+        db = self.accounts[account]
+        if not order.order_id:
+            order.order_id = db.next_order_id
+        return db.add_market_order(order, self.price(order.market))
+
+    def cancel(self, order_id: str, account: Optional[str] = None) -> Order:
+        owner = self._owners.get(order_id)
+        if owner is None or (account is not None and owner != account):
+            raise Exception(f"Order not found: {order_id}")
+        return self.accounts[owner].cancel_order(order_id)
+
+    def step(self) -> Optional[tuple[str, Price]]:
+        """
+        Move to the next tick of any market, returns its market and price or None at the end of all the streams.
+        """
+        if self._timeline is None:
+            self._feeds = list(self.feeds.values())
+            self._timeline = heapq.merge(*(feed.events(order) for order, feed in enumerate(self._feeds)))
+        event = next(self._timeline, None)
+        if event is None:
+            return None
+        timestamp, order, position = event
+        feed = self._feeds[order]
+        price = feed.advance(position)
+        self.now = from_micros(timestamp)
+        if self.clock is not None:
+            self.clock.advance_to(self.now)
+        for account in self._traders.get(feed.market, ()):
+            db = self.accounts[account]
+            db.check_buy_orders(feed.market, price.price, price.date)
+            db.check_sell_orders(feed.market, price.price, price.date)
+        return feed.market, price
+
+    def run(
+        self, on_tick: Optional[Callable[[str, Price], None]] = None, until: Optional[datetime.datetime] = None
+    ) -> int:
+        """
+        Replay the ticks up to `until` (all of them by default), returns the number of ticks replayed.
+        """
+        count = 0
+        while until is None or self.now is None or self.now < until:
+            tick = self.step()
+            if tick is None:
+                break
+            count += 1
+            if on_tick is not None:
+                on_tick(*tick)
+        return count
+
+    def view(self, account: Optional[str], market: Optional[str]) -> "AccountView":
+        return AccountView(self, account, market)
+
+    def transport(self, account: str, market: str) -> FakeExchangeTransport:
+        return FakeExchangeTransport(self.view(account, market))
+
+
+class AccountView:
+    """
+    One account and market of a simulation, with the methods of `CoinexFakeExchange` the transport handlers call.
+    """
+
+    def __init__(self, simulation: MultiMarketExchange, account: Optional[str], market: Optional[str]):
+        self.simulation = simulation
+        self.account = account
+        self.market = market
+
+    @property
+    def db(self) -> Db:
+        db = self.simulation.accounts.get(self.account)
+        if db is None:
+            raise RuntimeError(f"Unknown account {self.account}")
+        return db
+
+    @property
+    def spec(self) -> MarketSpec:
+        return self.simulation.feed(self.market).spec
+
+    @property
+    def deal_id(self) -> int:
+        return self.simulation.feed(self.market).deal_id
+
+    def get_current_price(self) -> Price:
+        return self.simulation.next_price(self.market, self.account)
+
+    def _get_current_date(self) -> datetime.datetime:
+        return self.simulation.price(self.market).date
+
+    def add_buy_order(self, order: Order) -> BuyOrderResponse:
+        self.simulation.place(self.account, order)
+        return BuyOrderResponse.from_order(order=order)
+
+    def add_sell_order(self, order: Order) -> SellOrderResponse:
+        self.simulation.place(self.account, order)
+        return SellOrderResponse.from_order(order=order)
+
+    def add_market_order(self, order: Order):
+        self.simulation.place_market(self.account, order)
+        if order.type == OrderType.BUY:
+            return BuyOrderResponse.from_order(order=order)
+        return SellOrderResponse.from_order(order=order)
+
+    def cancel_order(self, order_id: str):
+        order = self.simulation.cancel(order_id, account=self.account)
+        if order.type == OrderType.BUY:
+            return BuyOrderResponse.from_order(order)
+        return SellOrderResponse.from_order(order)
@@ -0,0 +1,167 @@
+"""
+Parameter sweeps of the grid backtest over a process pool, the results are appended to a JSON lines file.
+"""
+
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from multiprocessing import get_context
+from typing import Callable, Iterator, Optional
+
+from app.common.ticks import TickFile
+from app.config.config import Config
+from tests.fake_exchange.backtest import GridStrategy, VectorizedBacktest
+from tests.fake_exchange.db import Db
+
+PARAMETERS = ["min_buy_amount_usdt", "step", "sell_step", "amount", "levels"]
+
+_ticks: dict[str, TickFile] = {}
+
+
+def combinations(grid: dict[str, list]) -> list[dict]:
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def params_key(params: dict) -> str:
+    return json.dumps({name: str(value) for name, value in params.items()}, sort_keys=True)
+
+
+def _open_ticks(path: str) -> TickFile:
+    # one mapping per worker process
+    if path not in _ticks:
+        _ticks[path] = TickFile(path)
+    return _ticks[path]
+
+
+def run_backtest(config: Config, ticks_path: str, balances: dict[str, str], params: dict) -> dict:
+    started = time.monotonic()
+    unknown = set(params) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    ticks = _open_ticks(ticks_path)
+    if "min_buy_amount_usdt" in params:
+        config = config.model_copy(update={"min_buy_amount_usdt": Decimal(str(params["min_buy_amount_usdt"]))})
+
+    db = Db(pair=config.pair)
+    db.reset(config=config)
+    for currency, amount in balances.items():
+        db.increase_balance(currency, Decimal(amount))
+    strategy = GridStrategy(
+        config.market,
+        amount=Decimal(str(params.get("amount", "1"))),
+        step=Decimal(str(params["step"])),
+        levels=int(params.get("levels", 10)),
+        sell_step=Decimal(str(params["sell_step"])) if params.get("sell_step") is not None else None,
+    )
+    result = VectorizedBacktest(db, ticks, config.market).run(strategy)
+
+    last_price = ticks.price(len(ticks) - 1) if len(ticks) else Decimal(0)
+    base, quote = config.spec.base, config.spec.quote
+    base_total = result.balances[base].total if base in result.balances else Decimal(0)
+    quote_total = result.balances[quote].total if quote in result.balances else Decimal(0)
+    return {
+        "key": params_key(params),
+        "params": {name: str(value) for name, value in params.items()},
+        "buys": sum(1 for order in result.completed if order.type.value == "buy"),
+        "sells": sum(1 for order in result.completed if order.type.value == "sell"),
+        "rejected": len(result.rejected),
+        "base": str(base_total),
+        "quote": str(quote_total),
+        "value": str(quote_total + base_total * last_price),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+class SweepRunner:
+    def __init__(
+        self,
+        config: Config,
+        ticks_path: str,
+        results_path: str,
+        balances: dict[str, str],
+        max_workers: Optional[int] = None,
+        mp_context: str = "spawn",
+    ):
+        self.config = config
+        self.ticks_path = ticks_path
+        self.results_path = results_path
+        self.balances = balances
+        self.max_workers = max_workers or os.cpu_count()
+        self.mp_context = mp_context
+
+    def results(self) -> list[dict]:
+        if not os.path.exists(self.results_path):
+            return []
+        with open(self.results_path, "r") as file:
+            # a line cut by an interrupted sweep is ignored, its combination runs again
+            rows = []
+            for line in file:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            return rows
+
+    def pending(self, grid: dict[str, list]) -> list[dict]:
+        done = {row["key"] for row in self.results()}
+        return [params for params in combinations(grid) if params_key(params) not in done]
+
+    def run(self, grid: dict[str, list], on_result: Optional[Callable[[dict], None]] = None) -> list[dict]:
+        """
+        Run the combinations of `grid` not in the results file yet, returns the new results.
+        """
+        pending = self.pending(grid)
+        if not pending:
+            return []
+        self._end_last_line()
+        new_results = []
+        with (
+            ProcessPoolExecutor(
+                max_workers=min(self.max_workers, len(pending)), mp_context=get_context(self.mp_context)
+            ) as executor,
+            open(self.results_path, "a") as file,
+        ):
+            futures = [
+                executor.submit(run_backtest, self.config, self.ticks_path, self.balances, params) for params in pending
+            ]
+            for future in as_completed(futures):
+                row = future.result()
+                file.write(json.dumps(row) + "\n")
+                file.flush()
+                new_results.append(row)
+                if on_result is not None:
+                    on_result(row)
+        return new_results
+
+    def _end_last_line(self) -> None:
+        # after an interrupted write the new results must start on their own line
+        if not os.path.exists(self.results_path) or os.path.getsize(self.results_path) == 0:
+            return
+        with open(self.results_path, "rb+") as file:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                file.write(b"\n")
+
+    def summary(self, sort_by: str = "value") -> list[dict]:
+        return sorted(self.results(), key=lambda row: Decimal(str(row[sort_by])), reverse=True)
+
+
+def format_table(rows: list[dict]) -> Iterator[str]:
+    if not rows:
+        return
+    param_names = sorted({name for row in rows for name in row["params"]})
+    columns = param_names + ["buys", "sells", "rejected", "value", "seconds"]
+    table = [
+        [row["params"].get(name, "") for name in param_names] + [row[name] for name in columns[len(param_names) :]]
+        for row in rows
+    ]
+    widths = [
+        max(len(str(value)) for value in [column] + [line[i] for line in table]) for i, column in enumerate(columns)
+    ]
+    yield "  ".join(column.ljust(width) for column, width in zip(columns, widths))
+    for line in table:
+        yield "  ".join(str(value).ljust(width) for value, width in zip(line, widths))
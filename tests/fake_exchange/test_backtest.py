@@ -0,0 +1,96 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.common.ticks import TickFile, to_micros, write_tick_file
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals
+from app.models.balance import NotEnoughBalanceException
+from app.models.enums import OrderType
+from tests.fake_exchange.backtest import GridStrategy, TickIndex, VectorizedBacktest
+
+load_dotenv("configurations/test/.env-tests")
+
+
+@pytest.fixture
+def config():
+    return Config(
+        label="ADA1",
+        exchange="coinex",
+        pair="ADA/USDT",
+        decimals=ExchangeDecimals(pairs={"ADAUSDT": {"amount": 6, "price": 4}}),
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("0"),
+    )
+
+
+@pytest.fixture
+def ticks(tmp_path):
+    # a random walk around 0.5 with repeated prices
+    rng = np.random.default_rng(7)
+    prices = 5000 + np.cumsum(rng.integers(-3, 4, size=20000))
+    start = to_micros(datetime.datetime(2024, 1, 1))
+    timestamps = start + np.arange(len(prices), dtype=np.int64) * 1_000_000
+    path = str(tmp_path / "2024_01_ADAUSDT.ticks")
+    write_tick_file(path, timestamps, prices, 4)
+    return TickFile(path)
+
+
+def _fund(db):
+    db.increase_balance("USDT", Decimal("1000"))
+    db.increase_balance("ADA", Decimal("0"))
+
+
+def _strategy() -> GridStrategy:
+    return GridStrategy("ADAUSDT", amount=Decimal("100"), step=Decimal("0.0025"), levels=8)
+
+
+def test_tick_index():
+    prices = np.array([5, 4, 6, 3, 7, 7, 2, 9], dtype=np.int64)
+    index = TickIndex(prices, block_size=3)
+    assert index.first_at_or_below(3, 0) == 3
+    assert index.first_at_or_below(3, 4) == 6
+    assert index.first_at_or_below(1, 0) is None
+    assert index.first_at_or_above(7, 0) == 4
+    assert index.first_at_or_above(8, 5) == 7
+    assert index.first_at_or_above(8, 8) is None
+
+
+def test_same_result_as_the_fake_exchange(fake_exchange, config, ticks):
+    # tick by tick, the orders placed by the bot after each price
+    fake_exchange.reset(config=config)
+    fake_exchange.upload_manual_prices(ticks)
+    _fund(fake_exchange.db)
+    strategy = _strategy()
+    rejected = []
+    price = fake_exchange.get_previous_price()
+    for order in strategy.initial_orders(price):
+        order.order_id = fake_exchange.db.next_order_id
+        fake_exchange.db.add_buy_order(order, price)
+    while fake_exchange.index < len(ticks):
+        done = len(fake_exchange.db.completed_orders)
+        price = fake_exchange.get_current_price()
+        for completed in fake_exchange.db.completed_orders[done:]:
+            for order in strategy.follow_up(completed, price):
+                order.order_id = fake_exchange.db.next_order_id
+                try:
+                    if order.type == OrderType.BUY:
+                        fake_exchange.db.add_buy_order(order, price)
+                    else:
+                        fake_exchange.db.add_sell_order(order, price)
+                except NotEnoughBalanceException:
+                    rejected.append(order.order_id)
+    expected_completed = [(o.order_id, o.type, o.buy_price, o.sell_price) for o in fake_exchange.db.completed_orders]
+    expected_balances = {currency: balance.model_copy() for currency, balance in fake_exchange.db.balances.items()}
+    assert len(expected_completed) > 20
+
+    fake_exchange.reset(config=config)
+    _fund(fake_exchange.db)
+    result = VectorizedBacktest(fake_exchange.db, ticks, "ADAUSDT").run(_strategy())
+    assert [(o.order_id, o.type, o.buy_price, o.sell_price) for o in result.completed] == expected_completed
+    assert result.balances == expected_balances
+    assert [order.order_id for order in result.rejected] == rejected
+    assert result.visited_ticks < result.ticks / 10
@@ -0,0 +1,127 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from dotenv import load_dotenv
+
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals
+from app.models.order import Order, OrderStatus, OrderType
+from app.models.price import Price
+from tests.fake_exchange.db import Db
+
+load_dotenv("configurations/test/.env-tests")
+
+PRICE = Price(price=Decimal("1"), date=datetime.datetime(2024, 1, 1))
+
+
+@pytest.fixture(params=[False, True], ids=["decimal", "fixed"])
+def db(request):
+    config = Config(
+        label="ADA1",
+        exchange="coinex",
+        pair="ADA/USDT",
+        decimals=ExchangeDecimals(pairs={"ADAUSDT": {"amount": 6, "price": 4}}),
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("0"),
+    )
+    db = Db()
+    db.reset(config=config, fixed=request.param)
+    db.increase_balance("USDT", Decimal("100000"))
+    db.increase_balance("ADA", Decimal("100000"))
+    yield db
+    db.reset()
+
+
+def _order(order_id: int, order_type: OrderType, price: str, market: str = "ADAUSDT") -> Order:
+    return Order(
+        order_id=str(order_id),
+        created=datetime.datetime(2024, 1, 1),
+        type=order_type,
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal("10"),
+        buy_price=Decimal(price) if order_type == OrderType.BUY else None,
+        sell_price=Decimal(price) if order_type == OrderType.SELL else None,
+        executed=None,
+        market=market,
+    )
+
+
+def _ids(orders: list[Order]) -> list[str]:
+    return [order.order_id for order in orders]
+
+
+class TestDbMatching:
+    def test_only_crossed_orders_execute(self, db):
+        for i, price in enumerate(["0.95", "0.97", "0.90", "0.97"]):
+            db.add_buy_order(_order(i, OrderType.BUY, price), PRICE)
+        for i, price in enumerate(["1.05", "1.02", "1.10"], start=10):
+            db.add_sell_order(_order(i, OrderType.SELL, price), PRICE)
+
+        db.check_buy_orders("ADAUSDT", Decimal("0.96"))
+        assert _ids(db.completed_orders) == ["1", "3"]
+        db.check_sell_orders("ADAUSDT", Decimal("1.05"))
+        assert _ids(db.completed_orders) == ["1", "3", "11", "10"]
+        assert all(order.orderStatus == OrderStatus.EXECUTED for order in db.completed_orders)
+        assert _ids(db.open_orders) == ["0", "2", "12"]
+
+        db.check_buy_orders("OTHERUSDT", Decimal("0.5"))
+        assert _ids(db.open_orders) == ["0", "2", "12"]
+        ada = db.get_balance("ADA").to_balance() if db.fixed else db.get_balance("ADA")
+        assert ada.locked_amount == Decimal("10")
+
+    def test_cancel(self, db):
+        db.add_buy_order(_order(1, OrderType.BUY, "0.95"), PRICE)
+        db.add_buy_order(_order(2, OrderType.BUY, "0.90"), PRICE)
+        assert db.cancel_order("1").order_id == "1"
+        with pytest.raises(Exception):
+            db.cancel_order("1")
+        db.check_buy_orders("ADAUSDT", Decimal("0.5"))
+        assert _ids(db.completed_orders) == ["2"]
+        assert db.open_orders == []
+
+    def test_many_cancels_compact_the_heaps(self, db):
+        for i in range(200):
+            db.add_sell_order(_order(i, OrderType.SELL, "2"), PRICE)
+        for i in range(199):
+            db.cancel_order(str(i))
+        assert len(db._sell_heaps["ADAUSDT"]) < 100
+        db.check_sell_orders("ADAUSDT", Decimal("2"))
+        assert _ids(db.completed_orders) == ["199"]
+
+
+class TestFillLog:
+    def _execute(self, db, minute: int, count: int) -> list[dict]:
+        start = len(db.completed_orders)
+        for i in range(count):
+            db.add_buy_order(_order(minute * 100 + i, OrderType.BUY, "0.99"), PRICE)
+        db.check_buy_orders("ADAUSDT", Decimal("0.98"), datetime.datetime(2024, 1, 1, 0, minute))
+        assert len(db.completed_orders) == start + count
+        fills, _ = db.user_deals("ADAUSDT", limit=1000)
+        return fills
+
+    def test_fills_are_made_once(self, db):
+        first = self._execute(db, 1, 3)
+        assert self._execute(db, 2, 0) == first
+        assert sum(Decimal(fill["amount"]) for fill in first) == Decimal("30")
+        assert {fill["created_at"] for fill in first} == {int(datetime.datetime(2024, 1, 1, 0, 1).timestamp() * 1000)}
+
+    def test_start_time_and_pages(self, db):
+        self._execute(db, 1, 4)
+        fills = self._execute(db, 2, 4)
+        later = [fill for fill in fills if fill["created_at"] >= datetime.datetime(2024, 1, 1, 0, 2).timestamp() * 1000]
+        start_time = int(datetime.datetime(2024, 1, 1, 0, 1, 30).timestamp() * 1000)
+
+        pages = []
+        page = 1
+        while True:
+            data, total = db.user_deals("ADAUSDT", start_time=start_time, page=page, limit=3)
+            pages += data
+            if page * 3 >= total:
+                break
+            page += 1
+        assert total == len(later)
+        assert pages == later
+        assert [fill["deal_id"] for fill in fills] == sorted(fill["deal_id"] for fill in fills)
+        assert db.user_deals("OTHERUSDT") == ([], 0)
+        assert db.user_deals(None, start_time=start_time, limit=1000)[0] == later
@@ -0,0 +1,114 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from dotenv import load_dotenv
+
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals
+from app.models.balance import NotEnoughBalanceException
+from app.models.order import Order, OrderStatus, OrderType
+from app.models.price import Price
+from tests.fake_exchange.db import Db
+
+load_dotenv("configurations/test/.env-tests")
+
+
+@pytest.fixture
+def config():
+    return Config(
+        label="ADA1",
+        exchange="coinex",
+        pair="ADA/USDT",
+        decimals=ExchangeDecimals(pairs={"ADAUSDT": {"amount": 6, "price": 4}}),
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("20"),
+    )
+
+
+@pytest.fixture
+def db():
+    db = Db()
+    yield db
+    db.reset()
+
+
+def _order(order_id: str, order_type: OrderType, amount: str, price: str) -> Order:
+    return Order(
+        order_id=order_id,
+        created=datetime.datetime(2024, 1, 1),
+        type=order_type,
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal(amount),
+        buy_price=Decimal(price) if order_type == OrderType.BUY else None,
+        sell_price=Decimal(price) if order_type == OrderType.SELL else None,
+        executed=None,
+        market="ADAUSDT",
+    )
+
+
+def _simulate(db: Db, config: Config, fixed: bool) -> dict:
+    db.reset(config=config, fixed=fixed)
+    price = Price(price=Decimal("0.5"), date=datetime.datetime(2024, 1, 1))
+    db.increase_balance("USDT", Decimal("1000"))
+    db.increase_balance("ADA", Decimal("500"))
+
+    db.add_buy_order(_order("1", OrderType.BUY, "100.123457", "0.4999"), price)
+    db.add_buy_order(_order("2", OrderType.BUY, "30", "0.45"), price)
+    db.add_sell_order(_order("3", OrderType.SELL, "200", "0.55"), price)
+    db.add_sell_order(_order("4", OrderType.SELL, "10", "0.6"), price)
+    db.cancel_order("4")
+    db.add_market_order(_order("5", OrderType.BUY, "3.333333", "0.5001"), price)
+    db.check_buy_orders("ADAUSDT", Decimal("0.49"))
+    db.check_sell_orders("ADAUSDT", Decimal("0.56"))
+
+    assert [order.order_id for order in db.open_orders] == ["2"]
+    assert [order.order_id for order in db.completed_orders] == ["1", "3"]
+    return {currency: balance.to_balance() if fixed else balance for currency, balance in db.balances.items()}
+
+
+def test_fixed_matches_decimal(db, config):
+    expected = _simulate(db, config, fixed=False)
+    balances = _simulate(db, config, fixed=True)
+    assert balances == expected
+    assert balances["USDT"].locked_amount == Decimal("13.50")
+    assert db._fixed_orders.keys() == {"2"}
+
+
+def test_fixed_not_enough_balance(db, config):
+    db.reset(config=config, fixed=True)
+    price = Price(price=Decimal("0.5"), date=datetime.datetime(2024, 1, 1))
+    db.increase_balance("ADA", Decimal("100"))
+    # 20 USDT of rinconcito are 40 ADA at 0.5
+    db.add_sell_order(_order("1", OrderType.SELL, "60", "0.6"), price)
+    with pytest.raises(NotEnoughBalanceException):
+        db.add_sell_order(_order("2", OrderType.SELL, "0.000001", "0.6"), price)
+    assert db.get_balance("ADA").get_coinex_data() == {
+        "ccy": "ADA",
+        "available": "40.00000000",
+        "frozen": "60.00000000",
+    }
+
+
+def _simulate_off_grid(db: Db, config: Config, fixed: bool) -> dict:
+    # prices and amounts with more decimals than the market (4 and 6) are kept as they are
+    db.reset(config=config, fixed=fixed)
+    price = Price(price=Decimal("0.5"), date=datetime.datetime(2024, 1, 1))
+    db.increase_balance("USDT", Decimal("1000.005"))
+    db.increase_balance("ADA", Decimal("500"))
+
+    db.add_buy_order(_order("1", OrderType.BUY, "100", "0.4999"), price)
+    db.add_buy_order(_order("2", OrderType.BUY, "10.1234567", "0.499999"), price)
+    db.add_sell_order(_order("3", OrderType.SELL, "200.0000001", "0.55001"), price)
+    db.add_market_order(_order("4", OrderType.BUY, "3.3333333", "0.50001"), price)
+    db.check_buy_orders("ADAUSDT", Decimal("0.49995"))
+    db.check_sell_orders("ADAUSDT", Decimal("0.55001"))
+
+    assert [order.order_id for order in db.open_orders] == ["1"]
+    assert [order.order_id for order in db.completed_orders] == ["2", "3"]
+    return {currency: balance.to_balance() if fixed else balance for currency, balance in db.balances.items()}
+
+
+def test_fixed_off_grid_orders_match_decimal(db, config):
+    expected = _simulate_off_grid(db, config, fixed=False)
+    assert _simulate_off_grid(db, config, fixed=True) == expected
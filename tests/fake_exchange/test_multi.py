@@ -0,0 +1,178 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.api.coinex import CoinexApi
+from app.common.ticks import TickFile, to_micros, write_tick_file
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals
+from app.models.balance import NotEnoughBalanceException
+from app.models.enums import OrderStatus, OrderType
+from app.models.order import Order
+from tests.conftest import CoinexClientTest
+from tests.fake_exchange.coinex import StopLongRun
+from tests.fake_exchange.multi import MultiMarketExchange
+
+load_dotenv("configurations/test/.env-tests")
+
+DECIMALS = ExchangeDecimals(pairs={"ADAUSDT": {"amount": 6, "price": 4}, "BTCUSDT": {"amount": 8, "price": 2}})
+
+
+def _config(pair: str) -> Config:
+    return Config(
+        label="ADA1",
+        exchange="coinex",
+        pair=pair,
+        decimals=DECIMALS,
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("0"),
+    )
+
+
+ADA_PRICES = [
+    ["2024-01-01T00:00:00", "0.5000"],
+    ["2024-01-01T00:00:02", "0.5000"],
+    ["2024-01-01T00:00:04", "0.4900"],
+    ["2024-01-01T00:00:06", "0.5100"],
+]
+BTC_PRICES = [
+    ["2024-01-01T00:00:01", "40000"],
+    ["2024-01-01T00:00:03", "39000"],
+    ["2024-01-01T00:00:05", "41000"],
+]
+
+
+def _order(market: str, order_type: OrderType, amount: str, price: str) -> Order:
+    return Order(
+        order_id="",
+        created=datetime.datetime(2024, 1, 1),
+        type=order_type,
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal(amount),
+        buy_price=Decimal(price) if order_type == OrderType.BUY else None,
+        sell_price=Decimal(price) if order_type == OrderType.SELL else None,
+        executed=None,
+        market=market,
+    )
+
+
+def _fund(exchange: MultiMarketExchange, account: str):
+    exchange.add_account(account, _config("ADA/USDT"))
+    exchange.deposit(account, "USDT", Decimal("1000"))
+    exchange.deposit(account, "ADA", Decimal("0"))
+    exchange.deposit(account, "BTC", Decimal("0"))
+
+
+@pytest.fixture
+def exchange() -> MultiMarketExchange:
+    exchange = MultiMarketExchange()
+    exchange.add_market(_config("ADA/USDT"), ADA_PRICES)
+    exchange.add_market(_config("BTC/USDT"), BTC_PRICES)
+    for account in ["a", "b"]:
+        _fund(exchange, account)
+    return exchange
+
+
+def test_timeline_merges_the_markets_in_time_order(exchange):
+    ticks = []
+    exchange.run(on_tick=lambda market, price: ticks.append((market, str(price.price), price.date.second)))
+    # the repeated ADA price is skipped
+    assert ticks == [
+        ("ADAUSDT", "0.5000", 0),
+        ("BTCUSDT", "40000", 1),
+        ("BTCUSDT", "39000", 3),
+        ("ADAUSDT", "0.4900", 4),
+        ("BTCUSDT", "41000", 5),
+        ("ADAUSDT", "0.5100", 6),
+    ]
+    assert exchange.step() is None
+
+
+def test_orders_fill_in_their_market_only(exchange):
+    ada = exchange.place("a", _order("ADAUSDT", OrderType.BUY, "100", "0.49"))
+    btc = exchange.place("a", _order("BTCUSDT", OrderType.BUY, "0.01", "39000"))
+    # both buys lock the USDT of the account
+    assert exchange.accounts["a"].get_balance("USDT").locked_amount == Decimal("439")
+
+    exchange.run(until=datetime.datetime(2024, 1, 1, 0, 0, 3))
+    assert exchange.accounts["a"].completed_orders == [btc]
+    exchange.run()
+    assert exchange.accounts["a"].completed_orders == [btc, ada]
+
+    balances = exchange.accounts["a"]
+    assert balances.get_balance("ADA").available == Decimal("100")
+    assert balances.get_balance("BTC").available == Decimal("0.01")
+    assert balances.get_balance("USDT").total == Decimal("561")
+    assert exchange.accounts["b"].get_balance("USDT").available == Decimal("1000")
+
+
+def test_accounts_have_their_own_balances(exchange):
+    first = exchange.place("a", _order("BTCUSDT", OrderType.BUY, "0.02", "40000"))
+    with pytest.raises(NotEnoughBalanceException):
+        exchange.place("a", _order("ADAUSDT", OrderType.BUY, "1000", "0.49"))
+    order = exchange.place("b", _order("ADAUSDT", OrderType.BUY, "1000", "0.49"))
+    # order ids are unique across the accounts
+    assert order.order_id != first.order_id
+
+    with pytest.raises(Exception, match="Order not found"):
+        exchange.cancel(order.order_id, account="a")
+    exchange.cancel(order.order_id, account="b")
+    assert exchange.accounts["b"].get_balance("USDT").available == Decimal("1000")
+
+
+def test_tick_file_markets(tmp_path):
+    start = to_micros(datetime.datetime(2024, 1, 1))
+    path = str(tmp_path / "2024_01_ADAUSDT.ticks")
+    write_tick_file(path, start + np.arange(4, dtype=np.int64) * 2_000_000, np.array([5000, 5000, 4900, 5100]), 4)
+
+    exchange = MultiMarketExchange(fixed=True)
+    exchange.add_market(_config("ADA/USDT"), TickFile(path))
+    exchange.add_market(_config("BTC/USDT"), BTC_PRICES)
+    _fund(exchange, "a")
+    order = exchange.place("a", _order("ADAUSDT", OrderType.BUY, "100", "0.49"))
+
+    markets = []
+    exchange.run(on_tick=lambda market, price: markets.append(market))
+    assert markets == ["ADAUSDT", "BTCUSDT", "BTCUSDT", "ADAUSDT", "BTCUSDT", "ADAUSDT"]
+    assert exchange.accounts["a"].completed_orders == [order]
+    assert exchange.accounts["a"].get_balance("ADA").to_balance().available == Decimal("100")
+
+
+def test_test_server_routes_by_market_and_account(simulation):
+    simulation.add_market(_config("ADA/USDT"), ADA_PRICES)
+    simulation.add_market(_config("BTC/USDT"), BTC_PRICES)
+    for account in ["a", "b"]:
+        _fund(simulation, account)
+    client_a = CoinexClientTest(access_id="a", secret="secret")
+    client_b = CoinexClientTest(access_id="b", secret="secret")
+
+    client_a.order_limit("ADAUSDT", "buy", "100", "0.49")
+    client_a.order_limit("BTCUSDT", "buy", "0.01", "39000")
+    client_b.order_limit("BTCUSDT", "buy", "0.01", "38000")
+    assert [order["market"] for order in client_a.order_pending("BTCUSDT")] == ["BTCUSDT"]
+    assert len(client_b.order_pending("ADAUSDT")) == 0
+
+    simulation.run()
+    deals = client_a.order_user_deals("ADAUSDT")
+    assert deals and {deal["market"] for deal in deals} == {"ADAUSDT"}
+    assert Decimal(client_a.balance_info()["BTC"]["available"]) == Decimal("0.01")
+    assert Decimal(client_b.balance_info()["BTC"]["available"]) == 0
+    assert client_b.market_deals("BTCUSDT")[0]["price"].strip() == "41000.00"
+
+
+def test_fetch_price_moves_the_simulation():
+    exchange = MultiMarketExchange()
+    exchange.add_market(_config("ADA/USDT"), [["2024-01-01T00:00:00", "0.5012"], ["2024-01-01T00:00:04", "0.5015"]])
+    exchange.add_market(_config("BTC/USDT"), BTC_PRICES)
+    _fund(exchange, "a")
+    api = CoinexApi(_config("ADA/USDT"), transport=exchange.transport("a", "ADAUSDT"))
+
+    assert api.fetch_price().price == Decimal("0.5012")
+    # over the BTC ticks, to the next ADA price
+    assert api.fetch_price().price == Decimal("0.5015")
+    assert exchange.now == datetime.datetime(2024, 1, 1, 0, 0, 4)
+    with pytest.raises(StopLongRun):
+        api.fetch_price()
@@ -0,0 +1,94 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.common.ticks import to_micros, write_tick_file
+from app.config.config import ClientCredentials, Config
+from app.config.exchange_decimals import ExchangeDecimals
+from tests.fake_exchange.coinex import CoinexFakeExchange
+from tests.fake_exchange.db import Db
+from tests.fake_exchange.sweep import (
+    SweepRunner,
+    format_table,
+    params_key,
+    run_backtest,
+)
+
+load_dotenv("configurations/test/.env-tests")
+
+BALANCES = {"USDT": "1000", "ADA": "0"}
+GRID = {"step": ["0.0020", "0.0030"], "min_buy_amount_usdt": ["0", "5"], "amount": ["100"]}
+
+
+@pytest.fixture
+def config():
+    return Config(
+        label="ADA1",
+        exchange="coinex",
+        pair="ADA/USDT",
+        decimals=ExchangeDecimals(pairs={"ADAUSDT": {"amount": 6, "price": 4}}),
+        client=ClientCredentials(key="key", secret="secret"),
+        min_buy_amount_usdt=Decimal("0"),
+    )
+
+
+@pytest.fixture
+def ticks_path(tmp_path):
+    rng = np.random.default_rng(3)
+    prices = 5000 + np.cumsum(rng.integers(-3, 4, size=20000))
+    timestamps = to_micros(datetime.datetime(2024, 1, 1)) + np.arange(len(prices), dtype=np.int64) * 1_000_000
+    path = str(tmp_path / "2024_01_ADAUSDT.ticks")
+    write_tick_file(path, timestamps, prices, 4)
+    return path
+
+
+def _without_time(row: dict) -> dict:
+    return {name: value for name, value in row.items() if name != "seconds"}
+
+
+def test_isolated_simulations(config):
+    first, second = CoinexFakeExchange(db=Db()), CoinexFakeExchange(db=Db())
+    assert first.db is not second.db
+    first.db.reset(config=config)
+    second.db.reset(config=config)
+    first.db.increase_balance("USDT", Decimal(10))
+    assert second.db.get_balance("USDT") is None
+
+
+def test_sweep_is_resumable(config, ticks_path, tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+    runner = SweepRunner(config, ticks_path, results_path, BALANCES, max_workers=2)
+    streamed = []
+    rows = runner.run(GRID, on_result=streamed.append)
+    assert len(rows) == 4 and streamed == rows
+    assert runner.pending(GRID) == []
+    assert runner.run(GRID) == []
+
+    params = {"amount": "100", "min_buy_amount_usdt": "0", "step": "0.0020"}
+    [row] = [row for row in runner.results() if row["key"] == params_key(params)]
+    assert _without_time(row) == _without_time(run_backtest(config, ticks_path, BALANCES, params))
+    assert int(row["buys"]) > 0
+
+    # an interrupted sweep: the last line was cut while writing
+    with open(results_path, "r") as file:
+        lines = file.readlines()
+    with open(results_path, "w") as file:
+        file.writelines(lines[:-1] + [lines[-1][:10]])
+    assert len(runner.pending(GRID)) == 1
+    assert len(runner.run(GRID)) == 1
+    assert len(runner.summary()) == 4
+    table = list(format_table(runner.summary()))
+    assert table[0].split() == [
+        "amount",
+        "min_buy_amount_usdt",
+        "step",
+        "buys",
+        "sells",
+        "rejected",
+        "value",
+        "seconds",
+    ]
+    assert len(table) == 5
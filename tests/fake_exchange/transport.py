@@ -0,0 +1,144 @@
+"""
+The endpoints of the fake exchange, shared by the FastAPI test server and the in-process transport.
+"""
+
+from decimal import Decimal
+from typing import Optional
+
+from app.models.enums import OrderStatus, OrderType
+from app.models.order import Order
+from tests.fake_exchange.coinex import CoinexFakeExchange
+
+
+def market_deals(exchange: CoinexFakeExchange) -> dict:
+    price = exchange.get_current_price()
+    return {
+        "code": 0,
+        "data": [
+            {
+                "deal_id": exchange.deal_id,
+                "created_at": int(price.date.timestamp() * 1000),
+                "price": f"{price.price:.{exchange.spec.price_decimals}f}",
+                "amount": "1.0",
+            }
+        ],
+    }
+
+
+def balance_info(exchange: CoinexFakeExchange) -> dict:
+    data = [balance.get_coinex_data() for balance in exchange.db.get_balances()]
+    return {"code": 0, "data": data, "message": "OK"}
+
+
+def pending_orders(exchange: CoinexFakeExchange, market: Optional[str] = None, page: int = 1, limit: int = 100) -> dict:
+    orders = [order for order in exchange.db.open_orders if not market or order.market == market]
+    start = (page - 1) * limit
+    return {
+        "code": 0,
+        "data": [exchange.db.as_coinex_order(order) for order in orders[start : start + limit]],
+        "pagination": {"total": len(orders), "has_next": start + limit < len(orders)},
+        "message": "OK",
+    }
+
+
+def user_deals(
+    exchange: CoinexFakeExchange,
+    market: Optional[str] = None,
+    start_time: Optional[int] = None,
+    page: int = 1,
+    limit: int = 100,
+) -> dict:
+    fills, total = exchange.db.user_deals(market or None, start_time=start_time, page=page, limit=limit)
+    return {
+        "code": 0,
+        "data": fills,
+        "pagination": {"total": total, "has_next": page * limit < total},
+        "message": "OK",
+    }
+
+
+def create_order(
+    exchange: CoinexFakeExchange,
+    market: str,
+    market_type: str,
+    side: str,
+    type: str,
+    amount: Decimal,
+    price: Optional[Decimal] = None,
+) -> dict:
+    match type:
+        case "market":
+            price = exchange.get_current_price().price
+        case "limit":
+            pass
+        case _:
+            raise RuntimeError(f"Error creating order: type={type}")
+
+    order = Order(
+        order_id=exchange.db.next_order_id,
+        created=exchange._get_current_date(),
+        executed=None,
+        type=side,
+        buy_price=Decimal(price) if side == OrderType.BUY.value else None,
+        sell_price=Decimal(price) if side == OrderType.SELL.value else None,
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal(amount),
+        fills=[],
+        benefit=None,
+        market=market,
+        market_type=market_type,
+    )
+    match type:
+        case "market":
+            return exchange.add_market_order(order).model_dump()
+        case _:
+            match order.type:
+                case OrderType.BUY:
+                    return exchange.add_buy_order(order).model_dump()
+                case OrderType.SELL:
+                    return exchange.add_sell_order(order).model_dump()
+                case _:
+                    raise RuntimeError(f"Error creating limit order: Invalid order type: {order.type}")
+
+
+def cancel_order(exchange: CoinexFakeExchange, order_id: str) -> dict:
+    return exchange.cancel_order(order_id).model_dump()
+
+
+class FakeExchangeTransport:
+    # the `transport` of `CoinexClient`, answers the `_v2` calls with the handlers (decimals are left as `Decimal`)
+    def __init__(self, exchange: CoinexFakeExchange):
+        self.exchange = exchange
+        self.routes = {
+            ("get", "spot/deals"): lambda params: market_deals(self.exchange),
+            ("get", "assets/spot/balance"): lambda params: balance_info(self.exchange),
+            ("get", "spot/pending-order"): lambda params: pending_orders(
+                self.exchange,
+                market=params.get("market"),
+                page=int(params.get("page") or 1),
+                limit=int(params.get("limit") or 100),
+            ),
+            ("get", "spot/user-deals"): lambda params: user_deals(
+                self.exchange,
+                market=params.get("market"),
+                start_time=int(params["start_time"]) if params.get("start_time") else None,
+                page=int(params.get("page") or 1),
+                limit=int(params.get("limit") or 100),
+            ),
+            ("post", "spot/order"): lambda params: create_order(
+                self.exchange,
+                market=params["market"],
+                market_type=params["market_type"],
+                side=params["side"],
+                type=params["type"],
+                amount=Decimal(str(params["amount"])),
+                price=Decimal(str(params["price"])) if params.get("price") is not None else None,
+            ),
+            ("post", "spot/cancel-order"): lambda params: cancel_order(self.exchange, str(params["order_id"])),
+        }
+
+    def __call__(self, method: str, path: str, params: dict) -> dict:
+        route = self.routes.get((method, path))
+        if route is None:
+            raise RuntimeError(f"Unknown fake exchange endpoint: {method.upper()} {path}")
+        return route(params)
@@ -0,0 +1,140 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from dotenv import load_dotenv
+
+from app.models.balance import Balance
+from app.models.enums import OrderStatus, OrderType
+from app.models.filled import Fill
+from app.models.ledger import BalanceLedger
+from app.models.order import Order
+from tests.conftest import create_config, get_exchange
+
+load_dotenv("configurations/test/.env-tests")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def exchange_balances():
+    return {
+        "ADA": Balance(currency="ADA", available=Decimal("100")),
+        "USDT": Balance(currency="USDT", available=Decimal("1000")),
+    }
+
+
+@pytest.fixture
+def ledger(exchange_balances):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {currency: balance.model_copy() for currency, balance in exchange_balances.items()}
+
+    ledger = BalanceLedger(create_config(), fetch, reconcile_interval=60, clock=FakeClock())
+    ledger.calls = calls
+    return ledger
+
+
+def _order(order_id: str, order_type: OrderType, amount: str, price: str) -> Order:
+    return Order(
+        order_id=order_id,
+        created=datetime.datetime(2024, 1, 1),
+        type=order_type,
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal(amount),
+        buy_price=Decimal(price) if order_type == OrderType.BUY else None,
+        sell_price=Decimal(price) if order_type == OrderType.SELL else None,
+        executed=None,
+        market="ADAUSDT",
+    )
+
+
+def _fill(fill_id: str, order_id: str, side: OrderType, amount: str, price: str) -> Fill:
+    return Fill(fill_id=fill_id, order_id=order_id, side=side, amount=Decimal(amount), price=Decimal(price))
+
+
+class TestBalanceLedger:
+    def test_orders_and_fills_without_fetching(self, ledger):
+        assert ledger.get("USDT").available == Decimal("1000")
+        ledger.order_placed(_order("1", OrderType.BUY, "10", "0.5"))
+        ledger.order_placed(_order("2", OrderType.SELL, "20", "0.7"))
+        assert ledger.get("USDT").locked_amount == Decimal("5")
+        assert ledger.get("ADA").available == Decimal("80")
+
+        fills = [_fill("1", "1", OrderType.BUY, "4", "0.5"), _fill("2", "1", OrderType.BUY, "6", "0.5")]
+        ledger.apply_fills(fills)
+        ledger.apply_fills(fills)  # polled again, applied once
+        assert ledger.get("USDT").available == Decimal("995")
+        assert ledger.get("USDT").locked_amount == Decimal("0")
+        assert ledger.get("ADA").available == Decimal("90")
+
+        ledger.order_cancelled("2")
+        assert ledger.get("ADA").available == Decimal("110")
+        assert ledger.get("ADA").locked_amount == Decimal("0")
+        assert len(ledger.calls) == 1
+
+    def test_periodic_reconcile_reports_drift(self, ledger, exchange_balances):
+        ledger.balances()
+        exchange_balances["USDT"].available = Decimal("999.5")  # a fee the ledger doesn't know
+        ledger.clock.now = 30
+        assert ledger.get("USDT").available == Decimal("1000")
+        ledger.clock.now = 60
+        assert ledger.get("USDT").available == Decimal("999.5")
+        assert len(ledger.calls) == 2
+        [drift] = ledger.last_drift
+        assert (drift.currency, drift.available, drift.locked, drift.size) == (
+            "USDT",
+            Decimal("-0.5"),
+            0,
+            Decimal("0.5"),
+        )
+
+    def test_reconcile_when_it_cant_follow(self, ledger, exchange_balances):
+        ledger.balances()
+        ledger.order_cancelled("unknown")
+        ledger.balances()
+        assert len(ledger.calls) == 2
+        assert ledger.last_drift == []
+
+        ledger.order_placed(_order("1", OrderType.BUY, "10000", "0.5"))  # more than we have
+        ledger.balances()
+        assert len(ledger.calls) == 3
+        [drift] = ledger.last_drift
+        assert drift.locked == Decimal("-5000")
+
+    def test_balances_are_copies(self, ledger):
+        ledger.balances()["USDT"].lock(Decimal("100"))
+        ledger.get("ADA").dec(Decimal("10"))
+        assert ledger.get("USDT").available == Decimal("1000")
+        assert ledger.get("ADA").available == Decimal("100")
+        assert ledger.reconcile() == []
+
+
+class TestCoinexApiLedger:
+    def test_matches_exchange(self, coinex_api, fake_exchange, new_tables):
+        fake_exchange = get_exchange(reset=True, upload_basic_prices=True)
+        fake_exchange.add_balance("USDT", Decimal(1000))
+        fake_exchange.add_balance("ADA", Decimal(100))
+        assert coinex_api.get_balances()["USDT"].available == Decimal(1000)
+
+        coinex_api.create_buy_order("ADAUSDT", "2", "101")
+        coinex_api.create_sell_order("ADAUSDT", "10", buy_price="90", sell_price="200")
+        coinex_api.create_sell_order("ADAUSDT", "5", buy_price="90", sell_price="300")
+        coinex_api.cancel_order("ADAUSDT", "3")
+        for _ in range(2):
+            fake_exchange.get_current_price()
+        coinex_api.get_filled(OrderType.BUY, coinex_api.last_fill)
+
+        balances = coinex_api.get_balances()
+        assert balances["USDT"].available == Decimal(798)
+        assert balances["ADA"].available == Decimal(92)
+        assert balances["ADA"].locked_amount == Decimal(10)
+        assert coinex_api.ledger.reconcile() == []
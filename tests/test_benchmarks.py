@@ -0,0 +1,28 @@
+from dotenv import load_dotenv
+
+from benchmarks import cases  # noqa: F401
+from benchmarks.suite import BENCHMARKS, Timing, compare, load, measure, save
+
+load_dotenv("configurations/test/.env-tests")
+
+
+def test_every_benchmark_runs():
+    assert len(BENCHMARKS) >= 10
+    for name, setup in BENCHMARKS.items():
+        setup()()
+
+
+def test_measure_and_compare(tmp_path):
+    timing = measure("common.rnd", repeat=2, number=10)
+    assert timing.number == 10 and timing.best <= timing.median
+
+    path = str(tmp_path / "results" / "baseline.json")
+    save(path, {"common.rnd": timing})
+    baseline = load(path)
+    assert baseline == {"common.rnd": timing}
+    assert load(str(tmp_path / "missing.json")) == {}
+
+    slower = Timing(best=timing.best * 1.5, median=timing.median * 1.5, number=10, repeat=2)
+    regressions = compare({"common.rnd": slower, "other": slower}, baseline, threshold=0.2)
+    assert [regression.name for regression in regressions] == ["common.rnd"]
+    assert compare({"common.rnd": slower}, baseline, threshold=0.6) == []
@@ -0,0 +1,100 @@
+import datetime
+import time
+
+import pytest
+import requests
+from dotenv import load_dotenv
+
+from app.api.base import retry_request
+from app.api.binance import BinanceApi
+from app.common.clock import Clock, SimulatedClock, SystemClock, get_clock, use_clock
+from app.models.order_book import OpenOrderBook
+from app.models.price import Price
+
+load_dotenv("configurations/test/.env-tests")
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def test_simulated_clock():
+    clock = SimulatedClock(datetime.datetime(2024, 1, 1))
+    assert clock.now() == START
+    clock.sleep(90)
+    assert clock.now() == START + datetime.timedelta(seconds=90)
+    assert clock.slept == 90
+    # ticks never move it backwards
+    clock.advance_to(datetime.datetime(2024, 1, 1, 0, 1))
+    assert clock.now() == START + datetime.timedelta(seconds=90)
+    clock.advance_to(datetime.datetime(2024, 1, 1, 1))
+    assert clock.time() == clock.monotonic() == (START + datetime.timedelta(hours=1)).timestamp()
+
+
+def test_clock_is_abstract():
+    with pytest.raises(TypeError):
+        Clock()
+
+
+def test_use_clock():
+    clock = SimulatedClock(START)
+    with use_clock(clock):
+        assert get_clock() is clock
+        assert Price(price=1).date == START
+    assert isinstance(get_clock(), SystemClock)
+    # the default date is read on every new price
+    assert Price(price=1).date > START
+
+
+def test_binance_price_reads_the_clock():
+    api = BinanceApi.__new__(BinanceApi)
+    with use_clock(SimulatedClock(START)):
+        assert api.fetch_price().date == START
+    with use_clock(SimulatedClock(START + datetime.timedelta(days=1))):
+        assert api.fetch_price().date == START + datetime.timedelta(days=1)
+
+
+def test_retries_sleep_in_virtual_time():
+    calls = []
+
+    def fail():
+        calls.append(get_clock().now())
+        raise requests.exceptions.ConnectionError("down")
+
+    clock = SimulatedClock(START)
+    started = time.monotonic()
+    with use_clock(clock), pytest.raises(requests.exceptions.ConnectionError):
+        retry_request(fail, retries=3, backoff_factor=10)
+    assert time.monotonic() - started < 1
+    assert clock.slept == 10 + 100 + 1000
+    assert [(date - START).total_seconds() for date in calls] == [0, 10, 110, 1110]
+
+
+def test_caches_expire_in_virtual_time():
+    clock = SimulatedClock(START)
+    with use_clock(clock):
+        book = OpenOrderBook(resync_interval=600)
+        book.replace([])
+        assert not book.due
+        clock.sleep(600)
+        assert book.due
+
+
+def test_fake_exchange_moves_the_clock(fake_exchange, in_process_coinex_api):
+    clock = SimulatedClock(datetime.datetime(2020, 1, 1))
+    fake_exchange.reset()
+    fake_exchange.upload_manual_prices(
+        [
+            ["2021-01-01T00:00:00", "101"],
+            ["2021-01-01T00:00:01", "100"],
+            ["2021-01-01T00:01:00", "99"],
+            ["2021-01-01T00:02:00", "98"],
+        ]
+    )
+    fake_exchange.clock = clock
+    try:
+        with use_clock(clock):
+            price = in_process_coinex_api.fetch_price()
+            assert price.date == datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+            price = in_process_coinex_api.fetch_price()
+            assert price.date == datetime.datetime(2021, 1, 1, 0, 0, 1, tzinfo=datetime.timezone.utc)
+    finally:
+        fake_exchange.clock = None
@@ -1,15 +1,34 @@
 import datetime
+import os
 from decimal import Decimal
+from typing import Optional
+from unittest import mock
 
+import pytest
 from dotenv import load_dotenv
+from pydantic import PrivateAttr
 
 from app.config import dynamodb
 from app.models.enums import OrderStatus, OrderType
+from app.models.filled import Fill
 from app.models.order import Order
+from app.models.schema import get_schema_manager
 
 load_dotenv("configurations/test/.env-tests")
 
 
+class VersionedOrder(Order):
+    _VERSION_FIELD: Optional[str] = PrivateAttr(default="version")
+
+    version: int = 0
+
+    @classmethod
+    def create_from_db(cls, db_order: dict) -> "VersionedOrder":
+        order = super().create_from_db(db_order)
+        order.version = int(db_order.get("version", 0))
+        return order
+
+
 class TestDynamoDb:
     def test_create_table(self, new_tables):
         assert "ADA1_orders" in dynamodb.get_dynamodb().meta.client.list_tables().get("TableNames")
@@ -93,3 +112,133 @@ class TestDynamoDb:
             limit=1,
         )
         assert len(missing_orders) == 0
+
+    @pytest.fixture
+    def sharded_orders(self, new_tables):
+        with mock.patch.dict(os.environ, {"ORDER_STATUS_SHARDS": "4"}):
+            get_schema_manager().apply_index_changes(Order, "ADA1")
+            yield
+
+    def test_fetch_sharded_orders(self, sharded_orders):
+        self._add_orders(10, [OrderStatus.INITIAL, OrderStatus.EXECUTED])
+        items = Order._get_table("ADA1").scan()["Items"]
+        shards = {item["orderStatusShard"] for item in items}
+        assert shards <= {f"{status}#{shard}" for status in ("initial", "executed") for shard in range(4)}
+        assert len(shards) > 2
+
+        from_date = datetime.datetime(2024, 1, 5, 0, 0, tzinfo=datetime.timezone.utc)
+        to_date = datetime.datetime(2024, 1, 9, 0, 0, tzinfo=datetime.timezone.utc)
+        table = Order._get_table("ADA1")
+        with mock.patch.object(table, "query", wraps=table.query) as query:
+            orders = Order.query_by_status("ADA1", OrderStatus.INITIAL, from_date, to_date)
+        assert query.call_count == 4
+        assert all(call.kwargs["IndexName"] == "orderStatusShard_executed_index" for call in query.call_args_list)
+        assert [order.created.day for order in orders] == [5, 6, 7, 8, 9]
+
+        orders = Order.query_by_status("ADA1", OrderStatus.EXECUTED, from_date, to_date, ascending=False, limit=2)
+        assert [order.created.day for order in orders] == [9, 8]
+        assert Order.query_first_by_status("ADA1", OrderStatus.EXECUTED).created.day == 1
+
+        order = Order.get("ADA1", "1")
+        order.orderStatus = OrderStatus.EXECUTED
+        Order.update("ADA1", order)
+        assert len(Order.query_by_status("ADA1", OrderStatus.INITIAL)) == 9
+        assert len(Order.query_by_status("ADA1", OrderStatus.EXECUTED)) == 11
+
+    def test_backfill_sharded_orders(self, new_tables):
+        self._add_orders(3, [OrderStatus.INITIAL])
+        with mock.patch.dict(os.environ, {"ORDER_STATUS_SHARDS": "4"}):
+            get_schema_manager().apply_index_changes(Order, "ADA1")
+            assert Order.query_by_status("ADA1", OrderStatus.INITIAL) == []
+            assert Order.backfill_status_shards("ADA1") == 3
+            assert Order.backfill_status_shards("ADA1") == 0
+            assert len(Order.query_by_status("ADA1", OrderStatus.INITIAL)) == 3
+
+            # only the sharded index is kept
+            assert get_schema_manager().apply_index_changes(Order, "ADA1", prune=True).to_delete == [
+                "orderStatus_executed_index"
+            ]
+            table = Order._get_table("ADA1")
+            assert [index["IndexName"] for index in table.global_secondary_indexes] == [
+                "orderStatusShard_executed_index"
+            ]
+            assert len(Order.query_by_status("ADA1", OrderStatus.INITIAL)) == 3
+
+    def _new_order(self, cls=Order):
+        return cls(
+            order_id="1",
+            created=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+            type=OrderType.BUY,
+            orderStatus=OrderStatus.INITIAL,
+            amount=Decimal("0.1"),
+            buy_price=Decimal("1000"),
+            market="BTCUSDT",
+        )
+
+    def test_update_only_dirty_fields(self, new_tables):
+        Order.save("ADA1", self._new_order())
+        order = Order.get("ADA1", "1")
+        assert order.dirty_fields() == set()
+
+        order.orderStatus = OrderStatus.EXECUTED
+        order.buy_price = None
+        assert order.dirty_fields() == {"orderStatus", "buy_price"}
+
+        table = Order._get_table("ADA1")
+        with mock.patch.object(table, "update_item", wraps=table.update_item) as update_item:
+            Order.update("ADA1", order)
+        arguments = update_item.call_args.kwargs
+        assert arguments["UpdateExpression"] == "SET #orderStatus = :orderStatus REMOVE #buy_price"
+        assert arguments["ExpressionAttributeNames"] == {"#orderStatus": "orderStatus", "#buy_price": "buy_price"}
+        assert order.dirty_fields() == set()
+
+        updated = Order.get("ADA1", "1")
+        assert updated.orderStatus == OrderStatus.EXECUTED
+        assert updated.buy_price is None
+        assert updated.amount == Decimal("0.1")
+
+        # nothing changed, nothing to send
+        with mock.patch.object(table, "update_item") as update_item:
+            Order.update("ADA1", updated)
+        update_item.assert_not_called()
+
+    def test_update_containers_changed_in_place(self, new_tables):
+        Order.save("ADA1", self._new_order())
+        order = Order.get("ADA1", "1")
+        order.fills.append(Fill(fill_id="10", amount=Decimal("0.1"), price=Decimal("1000"), side=OrderType.BUY))
+        assert order.dirty_fields() == {"fills"}
+
+        table = Order._get_table("ADA1")
+        with mock.patch.object(table, "update_item", wraps=table.update_item) as update_item:
+            Order.update("ADA1", order)
+        assert update_item.call_args.kwargs["UpdateExpression"] == "SET #fills = :fills"
+        assert order.dirty_fields() == set()
+        assert [fill["fill_id"] for fill in table.get_item(Key={"order_id": "1"})["Item"]["fills"]] == ["10"]
+
+    def test_update_only_removing_fields(self, new_tables):
+        Order.save("ADA1", self._new_order())
+        order = Order.get("ADA1", "1")
+        order.buy_price = None
+
+        table = Order._get_table("ADA1")
+        with mock.patch.object(table, "update_item", wraps=table.update_item) as update_item:
+            Order.update("ADA1", order)
+        arguments = update_item.call_args.kwargs
+        assert arguments["UpdateExpression"] == "REMOVE #buy_price"
+        assert "ExpressionAttributeValues" not in arguments
+        assert Order.get("ADA1", "1").buy_price is None
+
+    def test_update_with_version(self, new_tables):
+        VersionedOrder.save("ADA1", self._new_order(VersionedOrder))
+        order1 = VersionedOrder.get("ADA1", "1")
+        order2 = VersionedOrder.get("ADA1", "1")
+
+        order1.orderStatus = OrderStatus.EXECUTED
+        VersionedOrder.update("ADA1", order1)
+        assert order1.version == 1
+        assert VersionedOrder.get("ADA1", "1").version == 1
+
+        order2.amount = Decimal("0.2")
+        with pytest.raises(VersionedOrder.ConflictError):
+            VersionedOrder.update("ADA1", order2)
+        assert VersionedOrder.get("ADA1", "1").amount == Decimal("0.1")
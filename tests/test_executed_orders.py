@@ -1,10 +1,13 @@
 import datetime
 from decimal import Decimal
+from unittest import mock
 
+import pytest
 from dotenv import load_dotenv
+from freezegun import freeze_time
 
 from app.models.enums import MarketOrderType, OrderStatus, OrderType
-from app.models.order import Executed, Order
+from app.models.order import DbExecuted, DbExecutedOrder, Executed, ExecutedCache, Order
 
 load_dotenv("configurations/test/.env-tests")
 
@@ -22,17 +25,132 @@ class TestExecutedOrders:
         )
 
     def test_add_executing_orders(self, new_tables):
-        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1), pages=[], _page_size=10)
+        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
         for i in range(12):
             ex.add_executed_order(self._create_order(i + 1), MarketOrderType.BUY)
-        assert len(ex.pages[0].orders) == 10
-        assert len(ex.pages[1].orders) == 2
+        assert len(ex.orders) == 12
+        assert len(ex.pending) == 12
         ex.save()
+        assert len(ex.pending) == 0
         all_orders = Executed.query_by_day("ADA1", datetime.datetime(2024, 1, 1))
         assert len(all_orders) == 12
+        assert [order.order_id for order in all_orders] == [f"{i + 1:03}" for i in range(12)]
+
+    def test_append_only(self, new_tables):
+        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+        for i in range(5):
+            ex.add_executed_order(self._create_order(i), MarketOrderType.BUY)
+        ex.save()
+
+        # a new market order only writes itself, whatever the size of the day
+        table = DbExecutedOrder._get_table("ADA1")
+        with mock.patch.object(table, "batch_writer", wraps=table.batch_writer) as batch_writer:
+            ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+            ex.add_executed_order(self._create_order(5), MarketOrderType.SELL_BENEFIT)
+            ex.save()
+        assert batch_writer.call_count == 1
+
+        ex = Executed.load_day("ADA1", datetime.datetime(2024, 1, 1))
+        assert len(ex.orders) == 6
+        assert ex.orders[-1].type == MarketOrderType.SELL_BENEFIT
+
+    @pytest.fixture
+    def legacy_table(self):
+        DbExecuted.create_table("ADA1")
+        yield
+        DbExecuted.delete_table("ADA1")
+
+    def test_read_legacy_pages(self, new_tables, legacy_table):
+        page = DbExecuted(date=datetime.datetime(2024, 1, 1), day=datetime.datetime(2024, 1, 1), orders=[])
+        page.add_order(self._create_order(1), MarketOrderType.BUY)
+        DbExecuted.save("ADA1", page)
+
+        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+        ex.add_executed_order(self._create_order(2), MarketOrderType.BUY)
+        ex.save()
+        all_orders = Executed.query_by_day("ADA1", datetime.datetime(2024, 1, 1))
+        assert [order.order_id for order in all_orders] == ["001", "002"]
+
+    def _create_executed_order(self, order_id, executed):
+        order = self._create_order(order_id)
+        order.executed = executed
+        return order
+
+    @freeze_time("2024-01-01 12:00:00")
+    def test_cache_keeps_the_day_in_memory(self, new_tables):
+        cache = ExecutedCache("ADA1", refresh_interval=0)
+        with mock.patch.object(DbExecutedOrder, "query_by_day", wraps=DbExecutedOrder.query_by_day) as query:
+            for i in range(10):
+                cache.add_executed_order(
+                    self._create_executed_order(i, datetime.datetime(2024, 1, 1, 10, i)), MarketOrderType.BUY
+                )
+            assert query.call_count == 0
+            assert len(cache.orders()) == 10
+            assert len(cache.orders()) == 10
+        # one full read, then only the orders executed since shortly before the last known one
+        assert query.call_count == 2
+        assert query.call_args.kwargs["from_date"] == datetime.datetime(2024, 1, 1, 10, 4)
+        assert len(Executed.query_by_day("ADA1", datetime.datetime(2024, 1, 1))) == 10
+
+    @freeze_time("2024-01-01 12:00:00")
+    def test_cache_sees_other_writers(self, new_tables):
+        cache = ExecutedCache("ADA1", refresh_interval=0)
+        cache.add_executed_order(self._create_executed_order(1, datetime.datetime(2024, 1, 1, 10)), MarketOrderType.BUY)
+        assert len(cache.orders()) == 1
+
+        other = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+        other.add_executed_order(self._create_executed_order(2, datetime.datetime(2024, 1, 1, 11)), MarketOrderType.BUY)
+        other.save()
+        assert [order.order_id for order in cache.orders()] == ["001", "002"]
+
+    @freeze_time("2024-01-01 12:00:00")
+    def test_cache_sees_late_orders_of_other_writers(self, new_tables, legacy_table):
+        cache = ExecutedCache("ADA1", refresh_interval=0)
+        cache.add_executed_order(self._create_executed_order(1, datetime.datetime(2024, 1, 1, 11)), MarketOrderType.BUY)
+        assert len(cache.orders()) == 1
+
+        # recorded after the cache's newest order but executed before it
+        other = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+        other.add_executed_order(
+            self._create_executed_order(2, datetime.datetime(2024, 1, 1, 10, 58)), MarketOrderType.BUY
+        )
+        other.save()
+        page = DbExecuted(date=datetime.datetime(2024, 1, 1, 9), day=datetime.datetime(2024, 1, 1), orders=[])
+        page.add_order(self._create_executed_order(3, datetime.datetime(2024, 1, 1, 9)), MarketOrderType.BUY)
+        DbExecuted.save("ADA1", page)
+        assert [order.order_id for order in cache.orders()] == ["003", "002", "001"]
+
+    @freeze_time("2024-01-02 00:01:00")
+    def test_late_order_of_the_previous_day_keeps_the_cache(self, new_tables):
+        cache = ExecutedCache("ADA1", refresh_interval=0)
+        cache.add_executed_order(
+            self._create_executed_order(1, datetime.datetime(2024, 1, 2, 0, 1)), MarketOrderType.BUY
+        )
+        assert len(cache.orders()) == 1
+        today = cache._executed
+        cache.add_executed_order(
+            self._create_executed_order(2, datetime.datetime(2024, 1, 1, 23, 59)), MarketOrderType.BUY
+        )
+        assert cache._executed is today
+        assert [order.order_id for order in cache.orders()] == ["001"]
+        assert [order.order_id for order in Executed.query_by_day("ADA1", datetime.datetime(2024, 1, 1))] == ["002"]
+
+    def test_cache_rolls_over_at_midnight(self, new_tables):
+        cache = ExecutedCache("ADA1")
+        with freeze_time("2024-01-01 23:59:00"):
+            cache.add_executed_order(
+                self._create_executed_order(1, datetime.datetime(2024, 1, 1, 23, 59)), MarketOrderType.BUY
+            )
+            assert len(cache.orders()) == 1
+        with freeze_time("2024-01-02 00:01:00"):
+            assert cache.orders() == []
+            cache.add_executed_order(
+                self._create_executed_order(2, datetime.datetime(2024, 1, 2, 0, 1)), MarketOrderType.BUY
+            )
+            assert [order.order_id for order in cache.orders()] == ["002"]
 
     def test_add_a_lot_of_executed_orders(self, new_tables):
-        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1), pages=[], _page_size=10)
+        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
 
         start = datetime.datetime.now()
         for i in range(1000):
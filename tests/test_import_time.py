@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+# generous for slow CI machines, importing boto3 alone takes about half of it
+IMPORT_BUDGET_SECONDS = 1.0
+
+IMPORT_APP = """
+import importlib
+import pkgutil
+import sys
+import time
+
+start = time.perf_counter()
+import app
+
+for module in pkgutil.walk_packages(app.__path__, "app."):
+    if not module.name.startswith("app.workers"):
+        importlib.import_module(module.name)
+importlib.import_module("app.bots.bot")
+print(time.perf_counter() - start)
+print("boto3" in sys.modules)
+"""
+
+
+def test_import_app_is_lazy():
+    result = subprocess.run([sys.executable, "-c", IMPORT_APP], capture_output=True, text=True, check=True)
+    elapsed, boto3_imported = result.stdout.split()
+    assert boto3_imported == "False"
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,61 @@
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from dotenv import load_dotenv
+
+from app.api.client.coinex import CoinexClient
+from app.models.enums import MarketOrderType, OrderType
+from tests.conftest import get_exchange
+from tests.fake_exchange.transport import FakeExchangeTransport
+
+load_dotenv("configurations/test/.env-tests")
+
+
+def _run(api) -> dict:
+    exchange = get_exchange(reset=True, upload_basic_prices=True)
+    exchange.add_balance("USDT", Decimal(100000))
+    exchange.add_balance("ADA", Decimal(100))
+    api.create_buy_order("ADAUSDT", "2", "101")
+    api.create_sell_order("ADAUSDT", "10", buy_price="90", sell_price="200")
+    api.create_sell_order("ADAUSDT", "5", buy_price="90", sell_price="300")
+    api.cancel_order("ADAUSDT", "3")
+    api.fetch_price()
+    api.create_market_order("ADAUSDT", "1", MarketOrderType.BUY)
+    return {
+        "open": [(order.order_id, order.type, order.amount) for order in api.sync_open_orders()],
+        "fills": [(fill.order_id, fill.side) for fill in api.get_filled(OrderType.BUY, None)],
+        "balances": {currency: balance.model_dump() for currency, balance in api.fetch_balances().items()},
+    }
+
+
+class TestInProcessTransport:
+    def test_same_results_as_http(self, coinex_api, in_process_coinex_api, fake_exchange, new_tables):
+        expected = _run(coinex_api)
+        with mock.patch("requests.get") as get, mock.patch("requests.post") as post:
+            result = _run(in_process_coinex_api)
+        assert get.call_count == 0 and post.call_count == 0
+        assert result["open"] == expected["open"]
+        assert sorted(set(result["fills"])) == sorted(set(expected["fills"]))
+        assert result["balances"] == expected["balances"]
+
+    def test_errors(self, fake_exchange):
+        client = CoinexClient(transport=FakeExchangeTransport(fake_exchange))
+        with pytest.raises(RuntimeError):
+            client.order_status("ADAUSDT", "1")
+
+    def test_user_deals_pages(self, fake_exchange):
+        exchange = get_exchange(reset=True, upload_basic_prices=True)
+        exchange.add_balance("USDT", Decimal(100000))
+        exchange.add_balance("ADA", Decimal(0))
+        client = CoinexClient(transport=FakeExchangeTransport(exchange))
+        for _ in range(7):
+            client.order_limit("ADAUSDT", "buy", "1", "101")
+        exchange.get_current_price()
+
+        deals = client.order_user_deals("ADAUSDT", limit=2)
+        assert len({deal["deal_id"] for deal in deals}) == len(deals) >= 7
+        assert sorted({deal["order_id"] for deal in deals}) == list(range(1, 8))
+        assert client.order_user_deals("ADAUSDT", limit=2) == deals
+        later = deals[-1]["created_at"] + 1
+        assert client.order_user_deals("ADAUSDT", start_time=later) == []
@@ -0,0 +1,113 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from dotenv import load_dotenv
+
+from app.models.enums import OrderStatus, OrderType
+from app.models.filled import Fill
+from app.models.order import Order
+from app.models.order_book import OpenOrderBook
+from tests.conftest import get_exchange
+
+load_dotenv("configurations/test/.env-tests")
+
+
+def _order(order_id: str, order_type: OrderType, price: str, amount: str = "1") -> Order:
+    return Order(
+        order_id=order_id,
+        created=datetime.datetime(2024, 1, 1),
+        type=order_type,
+        orderStatus=OrderStatus.INITIAL,
+        amount=Decimal(amount),
+        buy_price=Decimal(price) if order_type == OrderType.BUY else None,
+        sell_price=Decimal(price) if order_type == OrderType.SELL else None,
+        executed=None,
+        market="ADAUSDT",
+    )
+
+
+def _ids(orders: list[Order]) -> list[str]:
+    return [order.order_id for order in orders]
+
+
+class TestOpenOrderBook:
+    def test_sorted_by_side_and_price(self):
+        book = OpenOrderBook()
+        book.replace([_order("1", OrderType.SELL, "1.2"), _order("2", OrderType.BUY, "0.9")])
+        book.add(_order("3", OrderType.SELL, "1.1"))
+        book.add(_order("4", OrderType.SELL, "1.3"))
+        book.add(_order("5", OrderType.BUY, "0.8"))
+        assert _ids(book.orders()) == ["5", "2", "3", "1", "4"]
+        assert _ids(book.orders(OrderType.SELL)) == ["3", "1", "4"]
+        assert _ids(book.between(OrderType.SELL, Decimal("1.1"), Decimal("1.2"))) == ["3", "1"]
+        assert _ids(book.between(OrderType.BUY, Decimal("1"), Decimal("2"))) == []
+        assert _ids(book.nearest(OrderType.SELL, Decimal("1.24"), count=2)) == ["1", "4"]
+        assert _ids(book.nearest(OrderType.BUY, Decimal("1"), count=5)) == ["2", "5"]
+
+        book.remove("1")
+        assert _ids(book.orders(OrderType.SELL)) == ["3", "4"]
+        assert book.remove("1") is None
+
+    def test_fills(self):
+        book = OpenOrderBook()
+        book.replace([_order("1", OrderType.BUY, "0.9", amount="10"), _order("2", OrderType.BUY, "0.8")])
+        fills = [
+            Fill(fill_id="1", order_id="1", amount=Decimal("4"), price=Decimal("0.9"), side=OrderType.BUY),
+            Fill(fill_id="2", order_id="9", amount=Decimal("4"), price=Decimal("0.9"), side=OrderType.BUY),
+        ]
+        assert book.apply_fills(fills) == []
+        assert "1" in book
+        fills = [Fill(fill_id="3", order_id="1", amount=Decimal("6"), price=Decimal("0.9"), side=OrderType.BUY)]
+        assert _ids(book.apply_fills(fills)) == ["1"]
+        assert _ids(book.orders()) == ["2"]
+
+    def test_fills_applied_once(self):
+        book = OpenOrderBook()
+        book.replace([_order("1", OrderType.BUY, "0.9", amount="1")])
+        fills = [Fill(fill_id="1", order_id="1", amount=Decimal("0.4"), price=Decimal("0.9"), side=OrderType.BUY)]
+        for _ in range(3):
+            assert book.apply_fills(fills) == []
+        assert "1" in book
+        fills.append(Fill(fill_id="2", order_id="1", amount=Decimal("0.6"), price=Decimal("0.9"), side=OrderType.BUY))
+        assert _ids(book.apply_fills(fills)) == ["1"]
+
+    def test_resync_schedule(self):
+        now = [0.0]
+        book = OpenOrderBook(resync_interval=60, clock=lambda: now[0])
+        assert book.due
+        book.replace([])
+        assert not book.due
+        now[0] = 60
+        assert book.due
+        book.replace([])
+        book.invalidate()
+        assert book.due
+
+
+class TestCoinexApiOpenOrders:
+    def test_pagination(self, coinex_api, fake_exchange, new_tables):
+        exchange = get_exchange(reset=True, upload_basic_prices=True)
+        exchange.add_balance("USDT", Decimal(100000))
+        for i in range(5):
+            coinex_api.create_buy_order("ADAUSDT", "1", str(90 + i))
+        assert len(coinex_api.client.order_pending("ADAUSDT", limit=2)) == 5
+
+    def test_local_lookups(self, coinex_api, fake_exchange, new_tables):
+        exchange = get_exchange(reset=True, upload_basic_prices=True)
+        exchange.add_balance("USDT", Decimal(100000))
+        exchange.add_balance("ADA", Decimal(100))
+        with mock.patch.object(coinex_api.client, "order_pending", wraps=coinex_api.client.order_pending) as pending:
+            coinex_api.create_buy_order("ADAUSDT", "1", "90")
+            assert len(coinex_api.order_pending("ADAUSDT")) == 1
+            coinex_api.create_buy_order("ADAUSDT", "1", "95")
+            coinex_api.create_sell_order("ADAUSDT", "1", buy_price="90", sell_price="120")
+            coinex_api.cancel_order("ADAUSDT", "1")
+            assert _ids(coinex_api.order_pending("ADAUSDT")) == ["2", "3"]
+            assert _ids(coinex_api.orders_near(OrderType.BUY, Decimal("99"))) == ["2"]
+            assert coinex_api.open_orders.get("3").buy_price == Decimal(90)
+            assert pending.call_count == 1
+
+            coinex_api.open_orders.invalidate()
+            assert _ids(coinex_api.order_pending("ADAUSDT")) == ["2", "3"]
+            assert pending.call_count == 2
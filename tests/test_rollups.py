@@ -0,0 +1,116 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from dotenv import load_dotenv
+
+from app.models.enums import MarketOrderType, OrderStatus, OrderType
+from app.models.order import Executed, Order
+from app.models.rollup import DbRollup, RollupGranularity
+
+load_dotenv("configurations/test/.env-tests")
+
+
+class TestRollups:
+    def _create_order(self, order_id, executed, sell_price=None, benefit=None):
+        return Order(
+            order_id=f"{order_id:03}",
+            created=executed,
+            executed=executed,
+            amount=Decimal("10"),
+            buy_price=Decimal("0.5"),
+            sell_price=sell_price,
+            benefit=benefit,
+            market="ADAUSDT",
+            type=OrderType.BUY,
+            orderStatus=OrderStatus.EXECUTED,
+        )
+
+    def test_rollups_are_incremented(self, new_tables):
+        ex = Executed(
+            bot="ADA1",
+            date=datetime.datetime(2024, 1, 1),
+            rollup_granularities=[RollupGranularity.DAY, RollupGranularity.HOUR],
+        )
+        ex.add_executed_order(self._create_order(1, datetime.datetime(2024, 1, 1, 10)), MarketOrderType.BUY)
+        ex.add_executed_order(
+            self._create_order(2, datetime.datetime(2024, 1, 1, 11), Decimal("0.6"), Decimal("1")),
+            MarketOrderType.SELL_BENEFIT,
+        )
+        ex.save()
+        ex.add_executed_order(
+            self._create_order(3, datetime.datetime(2024, 1, 1, 11, 30), Decimal("0.7"), Decimal("2")),
+            MarketOrderType.SELL_BENEFIT,
+        )
+        ex.save()
+
+        [day] = DbRollup.query_range("ADA1", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1))
+        assert day.orders == 3
+        assert day.benefit == Decimal("3")
+        assert day.bought_volume == Decimal("5")
+        assert day.sold_volume == Decimal("13")
+        assert day.get_counter(MarketOrderType.SELL_BENEFIT, "orders") == 2
+        assert day.get_counter(MarketOrderType.SELL_LIQUIDITY, "orders") == 0
+
+        hours = DbRollup.query_range(
+            "ADA1", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1, 23), RollupGranularity.HOUR
+        )
+        assert [(hour.period.hour, hour.orders) for hour in hours] == [(10, 1), (11, 2)]
+
+    def test_one_update_per_bucket(self, new_tables):
+        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+        for i in range(10):
+            ex.add_executed_order(self._create_order(i, datetime.datetime(2024, 1, 1, 10, i)), MarketOrderType.BUY)
+        table = DbRollup._get_table("ADA1")
+        with mock.patch.object(table, "update_item", wraps=table.update_item) as update_item:
+            ex.save()
+        assert update_item.call_count == 1
+
+    def test_query_range(self, new_tables):
+        for day in range(1, 6):
+            ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, day))
+            for i in range(day):
+                ex.add_executed_order(
+                    self._create_order(10 * day + i, datetime.datetime(2024, 1, day, 12)), MarketOrderType.BUY
+                )
+            ex.save()
+
+        rollups = DbRollup.query_range("ADA1", datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 4, 18))
+        assert [(rollup.period.day, rollup.orders) for rollup in rollups] == [(2, 2), (3, 3), (4, 4)]
+
+    def test_retried_save_counts_orders_once(self, new_tables):
+        ex = Executed(
+            bot="ADA1",
+            date=datetime.datetime(2024, 1, 1),
+            rollup_granularities=[RollupGranularity.DAY, RollupGranularity.HOUR],
+        )
+        for i in range(3):
+            ex.add_executed_order(self._create_order(i, datetime.datetime(2024, 1, 1, 10, i)), MarketOrderType.BUY)
+        table = DbRollup._get_table("ADA1")
+        update_item = table.update_item
+        calls = []
+
+        def fail_after_first_bucket(**kwargs):
+            calls.append(kwargs["Key"])
+            if len(calls) == 2:
+                raise RuntimeError("throttled")
+            return update_item(**kwargs)
+
+        with mock.patch.object(table, "update_item", side_effect=fail_after_first_bucket):
+            with pytest.raises(RuntimeError):
+                ex.save()
+        assert len(ex.pending) == 3
+
+        # the retry also carries an order added after the failure
+        ex.add_executed_order(self._create_order(3, datetime.datetime(2024, 1, 1, 10, 30)), MarketOrderType.BUY)
+        ex.save()
+        ex.save()
+        [day] = DbRollup.query_range("ADA1", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1))
+        assert day.orders == 4
+        assert day.bought_volume == Decimal("20")
+        [hour] = DbRollup.query_range(
+            "ADA1", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1, 23), RollupGranularity.HOUR
+        )
+        assert hour.orders == 4
+        assert "counted" not in day.counters
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from dotenv import load_dotenv
+from pydantic import PrivateAttr
+
+from app.config import dynamodb
+from app.config.storage import list_table_names
+from app.models.common import Index, IndexField
+from app.models.filled import DbFill
+from app.models.schema import SchemaManager, bot_models, get_schema_manager
+
+load_dotenv("configurations/test/.env-tests")
+
+
+class IndexedFill(DbFill):
+    _indexes: list[Index] = PrivateAttr(
+        default=[
+            Index(
+                partition_key=IndexField(field_name="buy_fill_id", key_type="HASH"),
+                sort_key=IndexField(field_name="buy_date", key_type="RANGE"),
+            )
+        ]
+    )
+
+
+class KeysOnlyFill(DbFill):
+    _indexes: list[Index] = PrivateAttr(
+        default=[
+            Index(
+                partition_key=IndexField(field_name="buy_fill_id", key_type="HASH"),
+                sort_key=IndexField(field_name="buy_date", key_type="RANGE"),
+                projection="KEYS_ONLY",
+            )
+        ]
+    )
+
+
+class TestSchemaManager:
+    def test_list_tables_is_paginated(self):
+        storage = mock.Mock()
+        storage.meta.client.get_paginator.return_value.paginate.return_value = [
+            {"TableNames": ["a", "b"]},
+            {"TableNames": ["c"]},
+        ]
+        assert list_table_names(storage) == ["a", "b", "c"]
+        assert SchemaManager(storage).table_names() == {"a", "b", "c"}
+
+    def test_provision_bot(self, new_tables):
+        schema = get_schema_manager()
+        table_names = [model.get_full_table_name("ADA2") for model in bot_models()]
+        bot_tables = [model for model in bot_models() if model is not DbFill]
+        schema.delete_tables(bot_tables, "ADA2")
+        with mock.patch.object(schema, "_wait", wraps=schema._wait) as wait:
+            created = schema.provision_bot("ADA2")
+        # fills is shared and already exists
+        assert sorted(created) == sorted(name for name in table_names if name != "fills")
+        wait.assert_called_once_with("table_exists", created)
+
+        existing = dynamodb.get_dynamodb().meta.client.list_tables()["TableNames"]
+        assert all(name in existing for name in table_names)
+        # cached: nothing to create, no request made
+        with mock.patch.object(schema.storage, "create_table") as create_table:
+            assert schema.provision_bot("ADA2") == []
+        create_table.assert_not_called()
+        schema.delete_tables(bot_tables, "ADA2")
+
+    def test_apply_index_changes(self, new_tables):
+        schema = get_schema_manager()
+        diff = schema.diff_indexes(IndexedFill, "ADA1")
+        assert [index["IndexName"] for index in diff.to_create] == ["buy_fill_id_buy_date_index"]
+        assert diff.to_delete == []
+
+        schema.apply_index_changes(IndexedFill, "ADA1")
+        assert schema.diff_indexes(IndexedFill, "ADA1").empty
+        assert schema.diff_indexes(DbFill, "ADA1").to_delete == ["buy_fill_id_buy_date_index"]
+
+        # deletions are opt-in
+        assert schema.apply_index_changes(DbFill, "ADA1").to_delete == ["buy_fill_id_buy_date_index"]
+        assert schema.diff_indexes(DbFill, "ADA1").to_delete == ["buy_fill_id_buy_date_index"]
+        schema.apply_index_changes(DbFill, "ADA1", prune=True)
+        assert schema.diff_indexes(DbFill, "ADA1").empty
+
+    def test_changed_indexes_are_replaced(self, new_tables):
+        schema = get_schema_manager()
+        schema.apply_index_changes(IndexedFill, "ADA1")
+        diff = schema.diff_indexes(KeysOnlyFill, "ADA1")
+        assert diff.to_create == [] and diff.to_delete == []
+        assert [index["IndexName"] for index in diff.to_replace] == ["buy_fill_id_buy_date_index"]
+
+        schema.apply_index_changes(KeysOnlyFill, "ADA1")
+        assert schema.diff_indexes(KeysOnlyFill, "ADA1").to_replace == diff.to_replace
+        schema.apply_index_changes(KeysOnlyFill, "ADA1", prune=True)
+        assert schema.diff_indexes(KeysOnlyFill, "ADA1").empty
+        assert schema.diff_indexes(IndexedFill, "ADA1").to_replace != []
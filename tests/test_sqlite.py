@@ -0,0 +1,243 @@
+import datetime
+import os
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+from dotenv import load_dotenv
+
+from app.config.config import DbConfig
+from app.config.dynamodb import get_dynamodb
+from app.config.sqlite import SqliteConditionalCheckFailed, SqliteResource
+from app.config.storage import copy_table, get_storage
+from app.models.enums import MarketOrderType, OrderStatus, OrderType
+from app.models.filled import DbFill
+from app.models.order import DbExecuted, DbExecutedOrder, Executed, Order
+from app.models.rollup import DbRollup
+
+load_dotenv("configurations/test/.env-tests")
+
+MODELS = [Order, DbFill, DbExecuted, DbExecutedOrder, DbRollup, DbConfig]
+
+
+def _reset_tables():
+    for _cls in MODELS:
+        _cls._table = None
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    storage = SqliteResource(str(tmp_path / "sbot.db"))
+    _reset_tables()
+    with (
+        mock.patch("app.config.storage.get_sqlite", return_value=storage),
+        mock.patch.dict(os.environ, {"STORAGE_BACKEND": "sqlite"}),
+    ):
+        for _cls in MODELS:
+            _cls.create_table("ADA1")
+        yield storage
+    storage.close()
+    _reset_tables()
+
+
+def _create_order(order_id, status, date):
+    return Order(
+        order_id=str(order_id),
+        created=date,
+        type=OrderType.BUY,
+        orderStatus=status,
+        amount=Decimal("0.1"),
+        buy_price=Decimal("1000"),
+        executed=None,
+        market="BTCUSDT",
+    )
+
+
+class TestSqliteStorage:
+    def test_wal_mode(self, sqlite_storage):
+        assert get_storage() is sqlite_storage
+        assert sqlite_storage.connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_indexes_mirror_gsis(self, sqlite_storage):
+        indexes = [
+            row[0] for row in sqlite_storage.connection().execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        ]
+        assert "ADA1_orders.orderStatus_executed_index" in indexes
+        assert "ADA1_executed.day_date_index" in indexes
+        assert "ADA1_executed_orders.day_sequence_index" in indexes
+
+        plan = sqlite_storage.connection().execute(
+            'EXPLAIN QUERY PLAN SELECT item FROM "ADA1_orders" WHERE "orderStatus" = ? ORDER BY "executed"',
+            ("initial",),
+        )
+        assert "orderStatus_executed_index" in " ".join(row[-1] for row in plan)
+
+    def test_orders(self, sqlite_storage):
+        date = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for i in range(10):
+            Order.save("ADA1", _create_order(2 * i, OrderStatus.INITIAL, date))
+            Order.save("ADA1", _create_order(2 * i + 1, OrderStatus.EXECUTED, date))
+            date += datetime.timedelta(days=1)
+
+        assert Order.get("ADA1", "1").orderStatus == OrderStatus.EXECUTED
+        assert len(Order.query_by_status("ADA1", OrderStatus.INITIAL)) == 10
+
+        from_date = datetime.datetime(2024, 1, 5, tzinfo=datetime.timezone.utc)
+        to_date = datetime.datetime(2024, 1, 9, tzinfo=datetime.timezone.utc)
+        orders = Order.query_by_status("ADA1", OrderStatus.EXECUTED, from_date, to_date, ascending=False)
+        assert len(orders) == 5
+        assert orders[0].created.day == 9
+        first = Order.query_first_by_status("ADA1", OrderStatus.EXECUTED, from_date, to_date)
+        assert first.created.day == 5
+
+        Order.delete("ADA1", "1")
+        assert Order.get("ADA1", "1") is None
+
+    def test_query_pages(self, sqlite_storage):
+        # same executed date for all of them, the table key keeps the pages apart
+        date = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for i in range(7):
+            Order.save("ADA1", _create_order(i, OrderStatus.INITIAL, date))
+        table = Order._get_table("ADA1")
+        query_params = {
+            "IndexName": "orderStatus_executed_index",
+            "KeyConditionExpression": Key("orderStatus").eq(OrderStatus.INITIAL.value),
+            "Limit": 3,
+        }
+        pages = []
+        while True:
+            response = table.query(**query_params)
+            pages.append([item["order_id"] for item in response["Items"]])
+            if "LastEvaluatedKey" not in response:
+                break
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        assert pages == [["0", "1", "2"], ["3", "4", "5"], ["6"]]
+
+    def test_numeric_index_keys(self, sqlite_storage):
+        table = sqlite_storage.create_table(
+            TableName="prices",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "id", "AttributeType": "S"},
+                {"AttributeName": "market", "AttributeType": "S"},
+                {"AttributeName": "price", "AttributeType": "N"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "market_price_index",
+                    "KeySchema": [
+                        {"AttributeName": "market", "KeyType": "HASH"},
+                        {"AttributeName": "price", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+        )
+        for i, price in enumerate(["9", "10", "100.5", "9.5"]):
+            table.put_item(Item={"id": str(i), "market": "ADAUSDT", "price": Decimal(price)})
+
+        response = table.query(
+            IndexName="market_price_index",
+            KeyConditionExpression=Key("market").eq("ADAUSDT") & Key("price").gt(Decimal("9.25")),
+        )
+        assert [item["price"] for item in response["Items"]] == [Decimal("9.5"), Decimal("10"), Decimal("100.5")]
+        columns = {row[1]: row[2] for row in sqlite_storage.connection().execute("PRAGMA table_xinfo(prices)")}
+        assert columns["price"] == "NUMERIC"
+        plan = sqlite_storage.connection().execute(
+            'EXPLAIN QUERY PLAN SELECT item FROM "prices" WHERE "market" = ? AND "price" > ?', ("ADAUSDT", "9.25")
+        )
+        assert "market_price_index" in " ".join(row[-1] for row in plan)
+
+    def test_executed_orders(self, sqlite_storage):
+        ex = Executed(bot="ADA1", date=datetime.datetime(2024, 1, 1))
+        for i in range(12):
+            ex.add_executed_order(
+                _create_order(i, OrderStatus.EXECUTED, datetime.datetime(2024, 1, 1)), MarketOrderType.BUY
+            )
+        ex.save()
+        assert len(Executed.query_by_day("ADA1", datetime.datetime(2024, 1, 1))) == 12
+        [rollup] = DbRollup.query_range("ADA1", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1))
+        assert rollup.orders == 12
+        # a retried save doesn't count the orders again
+        DbRollup.add_orders("ADA1", ex.orders)
+        [rollup] = DbRollup.query_range("ADA1", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1))
+        assert rollup.orders == 12
+
+    def test_update(self, sqlite_storage):
+        Order.save("ADA1", _create_order(1, OrderStatus.INITIAL, datetime.datetime(2024, 1, 1)))
+        order = Order.get("ADA1", "1")
+        order.orderStatus = OrderStatus.EXECUTED
+        order.buy_price = None
+        Order.update("ADA1", order)
+        updated = Order.get("ADA1", "1")
+        assert updated.orderStatus == OrderStatus.EXECUTED
+        assert updated.buy_price is None
+
+        with pytest.raises(SqliteConditionalCheckFailed):
+            Order._get_table("ADA1").update_item(
+                Key={"order_id": "1"},
+                UpdateExpression="SET #amount = :amount",
+                ExpressionAttributeNames={"#amount": "amount"},
+                ExpressionAttributeValues={":amount": "1"},
+                ConditionExpression=Attr("version").eq(1),
+            )
+
+    def test_decimals_keep_their_digits(self, sqlite_storage):
+        table = DbRollup._get_table("ADA1")
+        value = Decimal("12345678901234567890.123456789012345678")
+        table.put_item(Item={"bucket": "day#2024-01-01T00:00:00", "total_volume": value, "counters": [Decimal("0.1")]})
+        table.update_item(
+            Key={"bucket": "day#2024-01-01T00:00:00"},
+            UpdateExpression="ADD #total_volume :total_volume",
+            ExpressionAttributeNames={"#total_volume": "total_volume"},
+            ExpressionAttributeValues={":total_volume": Decimal("0.000000000000000001")},
+        )
+        item = table.get_item(Key={"bucket": "day#2024-01-01T00:00:00"})["Item"]
+        assert item["total_volume"] == Decimal("12345678901234567890.123456789012345679")
+        assert item["counters"] == [Decimal("0.1")]
+
+        assert table.scan(FilterExpression=Attr("total_volume").gt(Decimal("9E+18")))["Count"] == 1
+        assert table.scan(FilterExpression=Attr("total_volume").lt(100))["Count"] == 0
+
+    def test_update_in_batch_writer(self, sqlite_storage):
+        table = Order._get_table("ADA1")
+        Order.save("ADA1", _create_order(1, OrderStatus.INITIAL, datetime.datetime(2024, 1, 1)))
+        update = dict(
+            Key={"order_id": "1"},
+            UpdateExpression="ADD #amount :amount",
+            ExpressionAttributeNames={"#amount": "amount"},
+            ExpressionAttributeValues={":amount": Decimal("0.1")},
+        )
+        with table.batch_writer() as batch:
+            batch.put_item(Item=Order.to_db_item(_create_order(2, OrderStatus.INITIAL, datetime.datetime(2024, 1, 2))))
+            table.update_item(**update)
+        assert Order.get("ADA1", "1").amount == Decimal("0.2")
+        assert Order.get("ADA1", "2") is not None
+
+        with pytest.raises(RuntimeError):
+            with table.batch_writer():
+                table.update_item(**update)
+                raise RuntimeError("failed batch")
+        assert Order.get("ADA1", "1").amount == Decimal("0.2")
+        assert not sqlite_storage.connection().in_transaction
+
+    def test_db_config(self, sqlite_storage):
+        DbConfig.add_bot("ADA1", pair="ADA/USDT", exchange="coinex", min_buy_amount_usdt=200)
+        DbConfig.add_secrets([{"key1": "value1"}])
+        config = DbConfig.from_db("bot_ADA1")
+        assert config.pair == "ADA/USDT"
+        assert config.min_buy_amount_usdt == 200
+        assert [bot.key for bot in DbConfig.get_all_bots()] == ["bot_ADA1"]
+
+    def test_copy_from_dynamodb(self, new_tables, tmp_path):
+        date = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for i in range(3):
+            Order.save("ADA1", _create_order(i, OrderStatus.INITIAL, date))
+
+        target = SqliteResource(str(tmp_path / "export.db"))
+        table_name = Order.get_full_table_name("ADA1")
+        copied = copy_table(get_dynamodb(), target, table_name, Order.build_create_table_arguments(table_name))
+        assert copied == 3
+        items = target.Table(table_name).scan()["Items"]
+        assert sorted(Order.create_from_db(item).order_id for item in items) == ["0", "1", "2"]
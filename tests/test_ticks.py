@@ -0,0 +1,139 @@
+import datetime
+import os
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.common.ticks import (
+    CHUNK_SIZE,
+    TickFile,
+    TickFileError,
+    change_points,
+    changes_path,
+    convert_text_file,
+    scale_price,
+    write_change_index,
+    write_tick_file,
+)
+from tests.conftest import create_config
+from tests.fake_exchange.coinex import CoinexFakeExchange, StopLongRun
+from tests.fake_exchange.db import Db
+
+load_dotenv("configurations/test/.env-tests")
+
+LINES = [
+    "2024-01-01T00:00:00,0.3512",
+    "2024-01-01T00:00:00.250000,0.3512",
+    "2024-01-01T00:00:01,0.35",
+    "2024-01-01T00:00:03.5,0.3601",
+    "2024-01-01T00:01:00, 0.3599",
+]
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / "2024_01_ADAUSDT.txt"
+    path.write_text("\n".join(LINES) + "\n")
+    return str(path)
+
+
+def test_scale_price():
+    assert scale_price("0.35", 4) == 3500
+    assert scale_price("50000.0", 2) == 5000000
+    assert scale_price("-1.5", 1) == -15
+    assert scale_price("-0.05", 2) == -5
+    with pytest.raises(TickFileError):
+        scale_price("0.123", 2)
+
+
+def test_convert_text_file(text_file):
+    ticks = TickFile(convert_text_file(text_file))
+    assert isinstance(ticks.prices, np.memmap)
+    assert len(ticks) == 5
+    assert ticks.decimals == 4
+    assert ticks.prices.tolist() == [3512, 3512, 3500, 3601, 3599]
+    assert [ticks.price(i) for i in range(len(ticks))] == [Decimal(line.split(",")[1]) for line in LINES]
+    assert ticks.date(1) == datetime.datetime(2024, 1, 1, 0, 0, 0, 250000)
+    assert ticks.date(3) == datetime.datetime(2024, 1, 1, 0, 0, 3, 500000)
+    assert ticks.search(datetime.datetime(2024, 1, 1, 0, 0, 2)) == 3
+    assert ticks.search(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)) == 0
+
+
+def test_change_index(text_file):
+    ticks = TickFile(convert_text_file(text_file))
+    assert isinstance(ticks.changes, np.memmap)
+    assert ticks.changes.tolist() == [0, 2, 3, 4]
+    assert ticks.next_change(0) == 2
+    assert ticks.next_change(2) == 3
+    assert ticks.next_change(4) is None
+
+
+def test_change_index_across_chunks(tmp_path):
+    prices = np.repeat(np.array([7, 7, 8, 5], dtype=np.int64), CHUNK_SIZE // 2 + 1)
+    path = str(tmp_path / "long.ticks")
+    write_tick_file(path, np.arange(len(prices), dtype=np.int64), prices, 0)
+    expected = np.flatnonzero(np.r_[True, prices[1:] != prices[:-1]])
+    assert TickFile(path).changes.tolist() == expected.tolist() == change_points(prices).tolist()
+
+
+def test_stale_change_index_is_ignored(tmp_path):
+    path = str(tmp_path / "ticks.ticks")
+    write_tick_file(path, np.arange(3, dtype=np.int64), np.array([1, 1, 2], dtype=np.int64), 0)
+    write_tick_file(str(tmp_path / "other.ticks"), np.arange(2, dtype=np.int64), np.array([1, 2], dtype=np.int64), 0)
+    # the index of another tick file
+    os.replace(str(tmp_path / "other.changes"), changes_path(path))
+    ticks = TickFile(path)
+    assert not isinstance(ticks.changes, np.memmap)
+    assert ticks.changes.tolist() == [0, 2]
+    write_change_index(path)
+    assert TickFile(path).changes.tolist() == [0, 2]
+
+
+def test_write_and_reject(tmp_path):
+    path = str(tmp_path / "empty.ticks")
+    write_tick_file(path, np.array([], dtype=np.int64), np.array([], dtype=np.int64), 2)
+    assert len(TickFile(path)) == 0
+    (tmp_path / "bad.ticks").write_bytes(b"not ticks at all")
+    with pytest.raises(TickFileError):
+        TickFile(str(tmp_path / "bad.ticks"))
+
+
+def test_fake_exchange_reads_tick_files(fake_exchange, text_file):
+    expected = []
+    fake_exchange.reset()
+    fake_exchange.upload_manual_prices([line.split(",") for line in LINES])
+    expected.append(fake_exchange.get_previous_price())
+    for _ in range(2):
+        expected.append(fake_exchange.get_current_price())
+
+    fake_exchange.reset()
+    fake_exchange.upload_manual_prices(TickFile(convert_text_file(text_file)))
+    prices = [fake_exchange.get_previous_price()] + [fake_exchange.get_current_price() for _ in range(2)]
+    assert prices == expected
+    assert [price.price for price in prices] == [Decimal("0.3512"), Decimal("0.35"), Decimal("0.3601")]
+    assert fake_exchange._get_current_date() == datetime.datetime(2024, 1, 1, 0, 1)  # the tick after the last price
+
+
+def test_fake_exchange_moves_to_the_next_file_after_repeated_prices(tmp_path):
+    files = {
+        "2024_01_ADAUSDT.txt": ["2024-01-31T23:59:57,0.35", "2024-01-31T23:59:58,0.36", "2024-01-31T23:59:59,0.36"],
+        "2024_02_ADAUSDT.txt": ["2024-02-01T00:00:00,0.36", "2024-02-01T00:00:01,0.37"],
+    }
+    for name, lines in files.items():
+        path = tmp_path / name
+        path.write_text("\n".join(lines) + "\n")
+        convert_text_file(str(path))
+        os.remove(path)
+
+    exchange = CoinexFakeExchange(db=Db(), prices_folder=str(tmp_path))
+    exchange.set_config(create_config())
+    prices = [exchange.get_current_price() for _ in range(3)]
+    assert [(price.price, price.date.day) for price in prices] == [
+        (Decimal("0.35"), 31),
+        (Decimal("0.36"), 31),
+        (Decimal("0.37"), 1),
+    ]
+    with pytest.raises(StopLongRun):
+        exchange.get_current_price()